@@ -6,11 +6,27 @@ AgentCore Policy による Fine-grained access control のデモ:
 - delete_data_source, sync_data_source, get_query_log: 管理者（admin）のみ
 """
 
+import os
+import tempfile
+from functools import lru_cache
+
 from mcp.server.fastmcp import FastMCP
 from pydantic import Field
 
+from concurrency import offload
+from corpus import DocumentIndex, ensure_index
+from query_log import open_query_log, parse_datetime
+
 mcp = FastMCP(name="rag-operations-mcp-server", host="0.0.0.0", stateless_http=True)
 
+# ワーカープロセス数（1: 単一プロセス / 2 以上: uvicorn のマルチワーカー）
+MCP_WORKERS = int(os.getenv("MCP_WORKERS", "1"))
+# 検索対象のドキュメント（JSONL、1 行 1 ドキュメント）。指定した場合のみ retrieve_doc はインデックスを検索する
+# （未指定の場合は従来どおり SAMPLE_DOCS をそのまま返すダミー実装）
+MCP_CORPUS_PATH = os.getenv("MCP_CORPUS_PATH")
+# 検索インデックスの保存先（ワーカー間で mmap により共有する）
+MCP_INDEX_PATH = os.getenv("MCP_INDEX_PATH", os.path.join(tempfile.gettempdir(), "mcp_server_index.bin"))
+
 SAMPLE_DOCS = [
     {"id": "doc-001", "content": "経費精算の申請方法: 1. 社内ポータルにログイン 2. 経費精算メニューを選択 3. 領収書を添付して申請"},
     {"id": "doc-002", "content": "有給休暇の申請方法: 1. 勤怠システムにログイン 2. 申請→有給休暇を選択 3. 希望日を入力し上長承認へ提出"},
@@ -18,17 +34,35 @@ SAMPLE_DOCS = [
 ]
 
 
+@lru_cache(maxsize=1)
+def get_index() -> DocumentIndex:
+    """検索インデックスを読み込む（マルチワーカー構成では親プロセスが作成済み）"""
+    return DocumentIndex(ensure_index(SAMPLE_DOCS, MCP_CORPUS_PATH, MCP_INDEX_PATH))
+
+
+@offload("retrieve_doc", coalesce=True)
+def search_documents(query: str, top_k: int) -> dict:
+    if not MCP_CORPUS_PATH:
+        _ = (query, top_k)  # ダミー実装のため未使用
+        return {"documents": SAMPLE_DOCS, "total": 1}
+    documents, total = get_index().search(query, top_k)
+    return {"documents": documents, "total": total}
+
+
 @mcp.tool()
-def retrieve_doc(
+async def retrieve_doc(
     query: str = Field(description="検索クエリ"),
     top_k: int = Field(default=5, description="取得件数"),
 ) -> dict:
     """一般ユーザー向けのドキュメントを検索します。"""
-    _ = (query, top_k)  # ダミー実装のため未使用
-    return {"documents": SAMPLE_DOCS, "total": 1}
+    result = await search_documents(query=query, top_k=top_k)
+    # 同じ検索にまとめられた呼び出しも 1 件ずつ記録する
+    open_query_log().submit(query, result["total"])
+    return result
 
 
 @mcp.tool()
+@offload("delete_data_source")
 def delete_data_source(
     data_source_id: str = Field(description="削除するデータソースID"),
     force: bool = Field(default=False, description="ベクトルデータを削除するか"),
@@ -38,6 +72,7 @@ def delete_data_source(
 
 
 @mcp.tool()
+@offload("sync_data_source")
 def sync_data_source(
     data_source_id: str = Field(description="データソースID"),
     full_sync: bool = Field(default=False, description="完全同期するか"),
@@ -47,16 +82,35 @@ def sync_data_source(
 
 
 @mcp.tool()
+@offload("get_query_log", coalesce=True)
 def get_query_log(
     start_date: str = Field(description="開始日時（ISO 8601形式）"),
     end_date: str = Field(description="終了日時（ISO 8601形式）"),
 ) -> dict:
     """クエリログを取得します。"""
-    return {
-        "logs": [{"query": "success", "timestamp": "2025-12-20T10:00:00Z"}],
-        "period": {"start": start_date, "end": end_date},
-    }
+    summary = open_query_log().summarize(parse_datetime(start_date), parse_datetime(end_date))
+    return {**summary, "period": {"start": start_date, "end": end_date}}
+
+
+def create_app():
+    """各ワーカーが読み込む ASGI アプリ（stateless_http のため、ワーカー間で共有する状態はない）"""
+    return mcp.streamable_http_app()
 
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
+    # インデックスは起動時（マルチワーカー構成では親プロセス）に 1 度だけ作成し、各ワーカーは同じファイルをマップする
+    if MCP_CORPUS_PATH:
+        ensure_index(SAMPLE_DOCS, MCP_CORPUS_PATH, MCP_INDEX_PATH)
+    if MCP_WORKERS > 1:
+        import uvicorn
+
+        uvicorn.run(
+            "mcp_server:create_app",
+            factory=True,
+            host=mcp.settings.host,
+            port=mcp.settings.port,
+            log_level=mcp.settings.log_level.lower(),
+            workers=MCP_WORKERS,
+        )
+    else:
+        mcp.run(transport="streamable-http")
@@ -0,0 +1,222 @@
+"""
+認可の判断の監査ログ
+
+認可の判断（許可・拒否・フィルタリング等）毎に構造化したレコード（sub・ロール・ツール・判断・理由・処理時間）を作成し、
+バッファーに入れてバックグラウンドのスレッドがまとめて出力先（シンク）に書き込む。
+ハンドラーはバッファーに入れるだけで、書き込みを待たない。
+
+- バッファーは AUDIT_BUFFER_SIZE 件で上限とし、溢れたレコードは破棄して件数を数える（書き込みが遅れてもハンドラーを待たせない）
+- 書き込みは AUDIT_BATCH_SIZE 件、または最初のレコードから AUDIT_FLUSH_INTERVAL 秒でまとめて行う
+- プロセスの終了時（atexit）に残りのレコードを書き込む。Lambda の実行環境が凍結されている間は書き込まれず、
+  次の呼び出しで再開する（実行環境の破棄時に残っていたレコードは失われる）
+
+出力先は AUDIT_SINK で指定する:
+    "stdout"       : "[AUDIT] " 付きの JSON 行（CloudWatch Logs。デバッグ出力とはプレフィックスで区別できる）
+    "file:<path>"  : JSONL ファイルに追記
+    "memory"       : プロセス内のキュー（ローカルの検証用。MemorySink.records で参照する）
+    "sqs:<url>"    : Amazon SQS のキューに送信（10 件毎の SendMessageBatch）
+"""
+
+import atexit
+import collections
+import json
+import os
+import queue
+import threading
+import time
+
+AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "true").lower() == "true"
+AUDIT_SINK = os.getenv("AUDIT_SINK", "stdout")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+
+AUDIT_PREFIX = "[AUDIT] "
+
+
+# ============================================
+# シンク（write(records) でまとめて書き込む）
+# ============================================
+class StdoutSink:
+    def write(self, records: list[dict]):
+        print("\n".join(AUDIT_PREFIX + json.dumps(record, ensure_ascii=False) for record in records), flush=True)
+
+
+class JsonlFileSink:
+    def __init__(self, path: str):
+        self.path = path
+
+    def write(self, records: list[dict]):
+        data = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode()
+        # O_APPEND で 1 度に書き込み、複数のプロセス・Interceptor が同じファイルに書いても行が混ざらないようにする
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            while data:
+                data = data[os.write(fd, data) :]
+        finally:
+            os.close(fd)
+
+
+class MemorySink:
+    """プロセス内のキュー（直近 maxlen 件を保持する）"""
+
+    def __init__(self, maxlen: int = 100_000):
+        self.records: collections.deque = collections.deque(maxlen=maxlen)
+
+    def write(self, records: list[dict]):
+        self.records.extend(records)
+
+
+class SqsSink:
+    BATCH_LIMIT = 10  # SendMessageBatch の最大件数
+
+    def __init__(self, queue_url: str):
+        import boto3
+
+        self.queue_url = queue_url
+        self.client = boto3.client("sqs")
+
+    def write(self, records: list[dict]):
+        failed = 0
+        for start in range(0, len(records), self.BATCH_LIMIT):
+            entries = [
+                {"Id": str(i), "MessageBody": json.dumps(record, ensure_ascii=False)}
+                for i, record in enumerate(records[start : start + self.BATCH_LIMIT])
+            ]
+            response = self.client.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            failed += len(response.get("Failed", []))
+        if failed:
+            raise RuntimeError(f"{failed} audit records were not accepted by SQS")
+
+
+def create_sink(spec: str):
+    kind, _, target = spec.partition(":")
+    if kind == "stdout":
+        return StdoutSink()
+    if kind == "file" and target:
+        return JsonlFileSink(target)
+    if kind == "memory":
+        return MemorySink()
+    if kind == "sqs" and target:
+        return SqsSink(target)
+    raise ValueError(f"Unknown AUDIT_SINK: {spec}")
+
+
+# ============================================
+# バッファーと書き込みスレッド
+# ============================================
+class AuditLog:
+    def __init__(self, sink, batch_size: int = AUDIT_BATCH_SIZE, flush_interval: float = AUDIT_FLUSH_INTERVAL):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=AUDIT_BUFFER_SIZE)
+        # 書き込み中（バッチの作成中を含む）は保持し、flush が書き込みの完了を待てるようにする
+        self._writing = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0  # バッファーが溢れた、または書き込みに失敗したレコード数
+        self._reported_dropped = 0
+
+    def record(self, record: dict):
+        """レコードをバッファーに入れる（書き込みを待たない。バッファーが一杯なら破棄する）"""
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_thread(self):
+        # import 時ではなく最初の記録時に開始する
+        if self._thread is None:
+            with self._thread_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            with self._writing:
+                batch = [first]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                self._write(batch)
+
+    def _write(self, batch: list[dict]):
+        try:
+            self.sink.write(batch)
+            self.written += len(batch)
+        except Exception as e:
+            # 監査ログの書き込みの失敗でハンドラーを止めない（件数を数えて報告する）
+            self.dropped += len(batch)
+            print(f"{AUDIT_PREFIX}Write failed ({len(batch)} records): {e}")
+        if self.dropped != self._reported_dropped:
+            print(f"{AUDIT_PREFIX}Dropped records: {self.dropped} (total)")
+            self._reported_dropped = self.dropped
+
+    def flush(self):
+        """バッファーに残っているレコードを呼び出し元のスレッドで書き込む（書き込みスレッドの書き込み中はその完了を待つ）"""
+        with self._writing:
+            batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+                if len(batch) >= self.batch_size:
+                    self._write(batch)
+                    batch = []
+            if batch:
+                self._write(batch)
+
+
+audit_log = AuditLog(create_sink(AUDIT_SINK)) if AUDIT_ENABLED else None
+if audit_log is not None:
+    atexit.register(audit_log.flush)
+
+
+def audit(
+    interceptor: str,
+    decision: str,
+    reason: str,
+    claims: dict = None,
+    method: str = "",
+    tool: str = "",
+    latency_ms: float = 0.0,
+    **extra,
+):
+    """認可の判断を監査ログに記録する
+
+    Args:
+        interceptor: "request" / "response"
+        decision: 判断（allow / deny / filter 等）
+        reason: 判断の理由
+        claims: 検証済みのクレーム（トークンが無効な場合は None）
+        latency_ms: ハンドラーの開始から判断までの時間
+    """
+    if audit_log is None:
+        return
+    claims = claims or {}
+    audit_log.record(
+        {
+            "timestamp": time.time(),
+            "interceptor": interceptor,
+            "sub": claims.get("sub"),
+            "role": claims.get("role", "guest") if claims else None,
+            "method": method,
+            "tool": tool,
+            "decision": decision,
+            "reason": reason,
+            "latency_ms": round(latency_ms, 3),
+            **extra,
+        }
+    )
@@ -0,0 +1,368 @@
+"""
+Cedar ポリシーのローカル評価
+
+AgentCore Policy（cdk-agentcore-policy）と同じ Cedar ポリシーを Interceptor 内で評価する。
+コールドスタート時にポリシーを 1 度だけ解析して Python のクロージャにコンパイルし、
+判定結果は (参照されるタグの値, アクション, リソース) 毎にメモ化する。
+
+対応する構文（agentcore-policy.ts で使用している範囲）:
+- permit / forbid
+- スコープ: principal [is T] [== T::"id"] / action [== T::"id" | in [T::"id", ...]] / resource [is T] [== T::"id"]
+- 条件: when { ... } / unless { ... }
+- 式: &&, ||, !, (), ==, !=, 文字列・真偽値リテラル, principal.hasTag("k"), principal.getTag("k")
+
+評価は Cedar と同じく、forbid が 1 つでも一致すれば拒否、permit が 1 つ以上一致すれば許可、
+いずれにも一致しなければ拒否。評価中にエラー（存在しないタグの取得等）となったポリシーは一致しないものとする。
+"""
+
+import re
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+PRINCIPAL_TYPE = "AgentCore::OAuthUser"
+ACTION_TYPE = "AgentCore::Action"
+RESOURCE_TYPE = "AgentCore::Gateway"
+
+# Interceptor が評価するポリシー（AgentCore Policy と同じ内容）
+POLICY_FILE = Path(__file__).parent / "policies.cedar"
+
+
+class CedarSyntaxError(ValueError):
+    pass
+
+
+class CedarEvaluationError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Entity:
+    type: str
+    id: str
+
+
+@dataclass(frozen=True)
+class Request:
+    principal: Entity
+    tags: dict
+    action: Entity
+    resource: Entity
+
+
+# ============================================
+# 字句解析
+# ============================================
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<space>\s+|//[^\n]*)
+    |(?P<string>"(?:[^"\\]|\\.)*")
+    |(?P<op>::|==|!=|&&|\|\||[(){}\[\],;.!])
+    |(?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+    """,
+    re.VERBOSE,
+)
+
+
+# 文字列リテラルのエスケープシーケンス（Cedar と同じ。\u{...} は別に扱う）
+STRING_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "0": "\0", "\\": "\\", "'": "'", '"': '"'}
+ESCAPE_PATTERN = re.compile(r"\\(?:u\{([0-9A-Fa-f]{1,6})\}|(.))", re.DOTALL)
+
+
+def unescape_string(literal: str) -> str:
+    """文字列リテラルの中身（前後の " を除いたもの）のエスケープシーケンスを解釈する
+
+    エスケープ以外の文字（日本語等の非 ASCII 文字を含む）はそのまま残す。
+    """
+
+    def replace(match: re.Match) -> str:
+        code, char = match.groups()
+        if code is not None:
+            value = int(code, 16)
+            if value > 0x10FFFF or 0xD800 <= value <= 0xDFFF:
+                raise CedarSyntaxError(f"invalid unicode escape: \\u{{{code}}}")
+            return chr(value)
+        if char not in STRING_ESCAPES:
+            raise CedarSyntaxError(f"invalid escape sequence: \\{char}")
+        return STRING_ESCAPES[char]
+
+    return ESCAPE_PATTERN.sub(replace, literal)
+
+
+def tokenize(source: str) -> list[tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(source):
+        match = TOKEN_PATTERN.match(source, position)
+        if not match:
+            raise CedarSyntaxError(f"unexpected character at {position}: {source[position:position + 20]!r}")
+        position = match.end()
+        kind = match.lastgroup
+        if kind == "space":
+            continue
+        value = match.group()
+        if kind == "string":
+            value = unescape_string(value[1:-1])
+        tokens.append((kind, value))
+    return tokens
+
+
+# ============================================
+# 構文解析 + コンパイル（式はクロージャに変換する）
+# ============================================
+class Parser:
+    def __init__(self, source: str):
+        self.tokens = tokenize(source)
+        self.position = 0
+        self.referenced_tags: set[str] = set()
+
+    def peek(self, offset: int = 0) -> tuple[str, str] | None:
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def accept(self, value: str) -> bool:
+        token = self.peek()
+        if token and token[0] in ("op", "ident") and token[1] == value:
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, value: str):
+        if not self.accept(value):
+            raise CedarSyntaxError(f"expected {value!r}, got {self.peek()!r}")
+
+    def expect_kind(self, kind: str) -> str:
+        token = self.peek()
+        if not token or token[0] != kind:
+            raise CedarSyntaxError(f"expected {kind}, got {token!r}")
+        self.position += 1
+        return token[1]
+
+    # --- ポリシー ---
+    def parse_policies(self) -> list["Policy"]:
+        policies = []
+        while self.peek():
+            policies.append(self.parse_policy(len(policies)))
+        return policies
+
+    def parse_policy(self, index: int) -> "Policy":
+        effect = self.expect_kind("ident")
+        if effect not in ("permit", "forbid"):
+            raise CedarSyntaxError(f"expected permit or forbid, got {effect!r}")
+        self.expect("(")
+        self.expect("principal")
+        principal = self.parse_entity_scope()
+        self.expect(",")
+        self.expect("action")
+        action = self.parse_action_scope()
+        self.expect(",")
+        self.expect("resource")
+        resource = self.parse_entity_scope()
+        self.expect(")")
+
+        conditions = []
+        while (token := self.peek()) and token[1] in ("when", "unless"):
+            self.position += 1
+            self.expect("{")
+            expression = self.parse_or()
+            self.expect("}")
+            conditions.append(expression if token[1] == "when" else _negate(expression))
+        self.expect(";")
+        return Policy(index, effect, principal, action, resource, tuple(conditions))
+
+    def parse_entity_scope(self):
+        """principal / resource の制約（is T、== T::"id"）"""
+        checks = []
+        if self.accept("is"):
+            entity_type = self.parse_path()
+            checks.append(lambda entity: entity.type == entity_type)
+        if self.accept("=="):
+            expected = self.parse_entity()
+            checks.append(lambda entity: entity == expected)
+        return tuple(checks)
+
+    def parse_action_scope(self):
+        """action の制約（== T::"id"、in [T::"id", ...]）"""
+        if self.accept("=="):
+            expected = self.parse_entity()
+            return (lambda entity: entity == expected,)
+        if self.accept("in"):
+            if self.accept("["):
+                allowed = {self.parse_entity()}
+                while self.accept(","):
+                    allowed.add(self.parse_entity())
+                self.expect("]")
+            else:
+                allowed = {self.parse_entity()}
+            allowed = frozenset(allowed)
+            return (lambda entity: entity in allowed,)
+        return ()
+
+    def parse_path(self) -> str:
+        parts = [self.expect_kind("ident")]
+        while self.peek() == ("op", "::") and (self.peek(1) or ("", ""))[0] == "ident":
+            self.position += 1
+            parts.append(self.expect_kind("ident"))
+        return "::".join(parts)
+
+    def parse_entity(self) -> Entity:
+        entity_type = self.parse_path()
+        self.expect("::")
+        return Entity(entity_type, self.expect_kind("string"))
+
+    # --- 式 ---
+    def parse_or(self):
+        operands = [self.parse_and()]
+        while self.accept("||"):
+            operands.append(self.parse_and())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda request: any(_as_bool(operand(request)) for operand in operands)
+
+    def parse_and(self):
+        operands = [self.parse_unary()]
+        while self.accept("&&"):
+            operands.append(self.parse_unary())
+        if len(operands) == 1:
+            return operands[0]
+        return lambda request: all(_as_bool(operand(request)) for operand in operands)
+
+    def parse_unary(self):
+        if self.accept("!"):
+            return _negate(self.parse_unary())
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        left = self.parse_primary()
+        if self.accept("=="):
+            right = self.parse_primary()
+            return lambda request: left(request) == right(request)
+        if self.accept("!="):
+            right = self.parse_primary()
+            return lambda request: left(request) != right(request)
+        return left
+
+    def parse_primary(self):
+        if self.accept("("):
+            expression = self.parse_or()
+            self.expect(")")
+            return expression
+        token = self.peek()
+        if token is None:
+            raise CedarSyntaxError("unexpected end of policy")
+        kind, value = token
+        if kind == "string":
+            self.position += 1
+            return lambda request: value
+        if value in ("true", "false"):
+            self.position += 1
+            literal = value == "true"
+            return lambda request: literal
+        if value == "principal":
+            self.position += 1
+            return self.parse_principal_method()
+        if kind == "ident" and (self.peek(1) or ("", ""))[1] == "::":
+            entity = self.parse_entity()
+            return lambda request: entity
+        if value in ("action", "resource"):
+            self.position += 1
+            return lambda request: getattr(request, value)
+        raise CedarSyntaxError(f"unsupported expression: {value!r}")
+
+    def parse_principal_method(self):
+        if not self.accept("."):
+            return lambda request: request.principal
+        method = self.expect_kind("ident")
+        self.expect("(")
+        tag = self.expect_kind("string")
+        self.expect(")")
+        self.referenced_tags.add(tag)
+        if method == "hasTag":
+            return lambda request: tag in request.tags
+        if method == "getTag":
+
+            def get_tag(request):
+                if tag not in request.tags:
+                    raise CedarEvaluationError(f"tag not found: {tag}")
+                return request.tags[tag]
+
+            return get_tag
+        raise CedarSyntaxError(f"unsupported method: principal.{method}")
+
+
+def _as_bool(value) -> bool:
+    if not isinstance(value, bool):
+        raise CedarEvaluationError(f"expected boolean, got {value!r}")
+    return value
+
+
+def _negate(expression):
+    return lambda request: not _as_bool(expression(request))
+
+
+@dataclass(frozen=True)
+class Policy:
+    index: int
+    effect: str
+    principal: tuple
+    action: tuple
+    resource: tuple
+    conditions: tuple
+
+    def matches(self, request: Request) -> bool:
+        try:
+            return (
+                all(check(request.principal) for check in self.principal)
+                and all(check(request.action) for check in self.action)
+                and all(check(request.resource) for check in self.resource)
+                and all(_as_bool(condition(request)) for condition in self.conditions)
+            )
+        except CedarEvaluationError:
+            # エラーとなったポリシーは一致しない（Cedar と同じ扱い）
+            return False
+
+
+# ============================================
+# ポリシーセット
+# ============================================
+class PolicySet:
+    def __init__(self, source: str):
+        parser = Parser(source)
+        self.policies = parser.parse_policies()
+        self.forbids = [p for p in self.policies if p.effect == "forbid"]
+        self.permits = [p for p in self.policies if p.effect == "permit"]
+        # メモ化のキーには、ポリシーが参照するタグのみを含める
+        self.referenced_tags = tuple(sorted(parser.referenced_tags))
+        self._decide = lru_cache(maxsize=4096)(self._evaluate)
+        self.evaluations = 0  # メモ化されていない評価の回数
+        self.evaluation_ns = 0  # その合計時間
+
+    @classmethod
+    def from_template(cls, path: Path, **variables) -> "PolicySet":
+        """{{name}} 形式のプレースホルダーを置換してポリシーファイルを読み込む"""
+        source = Path(path).read_text(encoding="utf-8")
+        for name, value in variables.items():
+            source = source.replace("{{" + name + "}}", value)
+        return cls(source)
+
+    def is_authorized(self, claims: dict, action: str, resource: str) -> bool:
+        """JWT クレーム（principal のタグ）とアクション名から許可・拒否を判定する"""
+        tags = tuple((tag, claims[tag]) for tag in self.referenced_tags if isinstance(claims.get(tag), str))
+        return self._decide(tags, action, resource)
+
+    def _evaluate(self, tags: tuple, action: str, resource: str) -> bool:
+        start = time.perf_counter_ns()
+        request = Request(
+            principal=Entity(PRINCIPAL_TYPE, ""),
+            tags=dict(tags),
+            action=Entity(ACTION_TYPE, action),
+            resource=Entity(RESOURCE_TYPE, resource),
+        )
+        if any(policy.matches(request) for policy in self.forbids):
+            decision = False
+        else:
+            decision = any(policy.matches(request) for policy in self.permits)
+        self.evaluations += 1
+        self.evaluation_ns += time.perf_counter_ns() - start
+        return decision
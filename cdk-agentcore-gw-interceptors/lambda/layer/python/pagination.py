@@ -0,0 +1,233 @@
+"""
+tools/list のページネーション（ロール毎のページの整形と補充）
+
+Gateway の tools/list はページ単位（nextCursor）で返り、Response Interceptor はページ毎にツールを絞り込むため、
+許可されたツールの少ないロールでは空に近いページが続き、クライアントの往復回数が増える。
+Response Interceptor はフィルタリング後のツールを TOOLS_PAGE_SIZE 件のページに整形し、
+UPSTREAM_TOOLS_LIST_URL（Gateway の URL）を指定した場合は、足りない分を次のページを取得して補充する。
+
+クライアントに返すカーソルは、上流（Gateway）のカーソルと、そのページのフィルタリング後のツールのうち返却済みの件数を
+1 つにまとめ、ロールとともにデプロイ毎の秘密鍵の HMAC で署名したもの。Request Interceptor が署名を検証して上流のカーソルに戻し、
+Gateway に転送する。ツールは常にフィルタリングするため、カーソルが漏れても許可されていないツールは返らないが、
+署名により別のロールのカーソルや改ざんしたカーソルは受け付けない。
+補充のための呼び出しも同じ鍵で署名したマーカーを付け、クライアントが付けたマーカーではページの整形を止められないようにする。
+
+秘密鍵は CURSOR_SIGNING_KEY（ローカル検証用）または CURSOR_SIGNING_SECRET_ARN（Secrets Manager のシークレット）で指定する。
+Request / Response Interceptor で同じ鍵を使う必要があり、指定がなければページの整形・補充は行わない。
+"""
+
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import os
+import time
+import urllib.request
+
+# ページあたりのツール数（既定の 0 ではページの整形・補充を行わず、上流のページをそのまま返す）
+TOOLS_PAGE_SIZE = int(os.getenv("TOOLS_PAGE_SIZE", "0"))
+# 補充時に次のページを取得する URL（Gateway の MCP エンドポイント。未指定の場合は補充しない）
+UPSTREAM_TOOLS_LIST_URL = os.getenv("UPSTREAM_TOOLS_LIST_URL", "")
+# 1 リクエストあたりの補充の最大回数と、1 回あたりのタイムアウト（秒）
+TOOLS_REFILL_MAX_CALLS = int(os.getenv("TOOLS_REFILL_MAX_CALLS", "5"))
+TOOLS_REFILL_TIMEOUT = float(os.getenv("TOOLS_REFILL_TIMEOUT", "3"))
+# カーソル・補充のマーカーの署名に使う秘密鍵（Request / Response Interceptor で同じ値）
+CURSOR_SIGNING_KEY = os.getenv("CURSOR_SIGNING_KEY", "")
+CURSOR_SIGNING_SECRET_ARN = os.getenv("CURSOR_SIGNING_SECRET_ARN", "")
+# 補充のマーカーの有効期間（秒）
+REFILL_MARKER_TTL = 60
+
+CURSOR_PREFIX = "p1."
+SIGNATURE_BYTES = 16
+# 転送するリクエストの params._meta のキー
+OFFSET_META_KEY = "fgacPageOffset"  # 上流のページのうち返却済みの件数
+REFILL_META_KEY = "fgacRefill"  # 補充のための呼び出しの署名付きマーカー（Response Interceptor はページを整形しない）
+
+
+@functools.cache
+def signing_key() -> bytes | None:
+    """署名の秘密鍵（未設定の場合は None。Secrets Manager の取得に失敗した場合は例外を送出し、次回に再取得する）"""
+    if CURSOR_SIGNING_KEY:
+        return CURSOR_SIGNING_KEY.encode()
+    if CURSOR_SIGNING_SECRET_ARN:
+        import boto3
+
+        secret = boto3.client("secretsmanager").get_secret_value(SecretId=CURSOR_SIGNING_SECRET_ARN)
+        return secret["SecretString"].encode()
+    return None
+
+
+def pagination_enabled() -> bool:
+    """ページの整形・補充を行うか（鍵を取得できない場合は上流のページをそのまま返す）"""
+    if not TOOLS_PAGE_SIZE:
+        return False
+    try:
+        key = signing_key()
+    except Exception as e:
+        print(f"[PAGINATION] Signing key unavailable: {e}")
+        return False
+    if key is None:
+        _warn_missing_key()
+    return key is not None
+
+
+@functools.cache
+def _warn_missing_key():
+    print("[PAGINATION] TOOLS_PAGE_SIZE is set but no signing key is configured; pagination disabled")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign(*fields) -> bytes:
+    """フィールドの組の HMAC-SHA256（先頭 SIGNATURE_BYTES バイト）"""
+    key = signing_key()
+    if key is None:
+        raise ValueError("cursor signing key is not configured")
+    message = json.dumps(fields, separators=(",", ":")).encode()
+    return hmac.new(key, message, hashlib.sha256).digest()[:SIGNATURE_BYTES]
+
+
+def encode_cursor(upstream: str | None, offset: int, role: str) -> str:
+    """(上流のカーソル, 返却済みの件数) をロールに紐付けて署名し、クライアントに返すカーソルにする"""
+    payload = f"{offset}:{upstream or ''}"
+    signature = sign("cursor", role, offset, upstream or "")
+    return f"{CURSOR_PREFIX}{_b64encode(payload.encode())}.{_b64encode(signature)}"
+
+
+def decode_cursor(cursor, role: str) -> tuple[str | None, int] | None:
+    """クライアントのカーソルを (上流のカーソル, 返却済みの件数) に戻す
+
+    Returns:
+        Interceptor が発行したカーソルでなければ None（上流のカーソルとしてそのまま転送する）
+
+    Raises:
+        ValueError: Interceptor が発行したカーソルとして解釈できない、または署名が一致しない
+            （改ざんされた、別のロールのカーソル）場合
+    """
+    if not isinstance(cursor, str) or not cursor.startswith(CURSOR_PREFIX):
+        return None
+    try:
+        encoded, encoded_signature = cursor[len(CURSOR_PREFIX) :].split(".")
+        offset, upstream = _b64decode(encoded).decode().split(":", 1)
+        offset = int(offset)
+        signature = _b64decode(encoded_signature)
+    except ValueError:
+        raise ValueError("malformed cursor") from None
+    if offset < 0 or not hmac.compare_digest(signature, sign("cursor", role, offset, upstream)):
+        raise ValueError("invalid cursor signature")
+    return upstream or None, offset
+
+
+def rewrite_list_request(body: dict, role: str) -> dict:
+    """tools/list のリクエストのカーソルを上流のカーソルに戻す（返却済みの件数は params._meta に入れる）"""
+    params = body.get("params") or {}
+    decoded = decode_cursor(params.get("cursor"), role)
+    if decoded is None:
+        return body
+    upstream, offset = decoded
+    params = {key: value for key, value in params.items() if key != "cursor"}
+    if upstream:
+        params["cursor"] = upstream
+    params["_meta"] = {**(params.get("_meta") or {}), OFFSET_META_KEY: offset}
+    return {**body, "params": params}
+
+
+def requested_position(request_body: dict, role: str) -> tuple[str | None, int]:
+    """tools/list のリクエストの (上流のカーソル, 返却済みの件数)
+
+    Response Interceptor のイベントにクライアントのリクエストがそのまま入っている場合はカーソルを戻し、
+    Request Interceptor が書き換えたリクエストの場合は params._meta の件数を使う。
+    """
+    params = request_body.get("params") or {}
+    try:
+        decoded = decode_cursor(params.get("cursor"), role)
+    except ValueError:
+        decoded = None
+    if decoded is not None:
+        return decoded
+    offset = (params.get("_meta") or {}).get(OFFSET_META_KEY, 0)
+    return params.get("cursor"), offset if isinstance(offset, int) and offset > 0 else 0
+
+
+def refill_marker(cursor: str, role: str) -> str:
+    """補充のための呼び出しに付けるマーカー（有効期限、上流のカーソル、ロールの署名）"""
+    expires = int(time.time()) + REFILL_MARKER_TTL
+    return f"{expires}.{_b64encode(sign('refill', role, expires, cursor))}"
+
+
+def is_refill_request(request_body: dict, role: str) -> bool:
+    """Response Interceptor が発行した補充のための呼び出しか（マーカーの署名と有効期限を検証する）"""
+    params = request_body.get("params") or {}
+    marker = (params.get("_meta") or {}).get(REFILL_META_KEY)
+    if not isinstance(marker, str):
+        return False
+    try:
+        expires, encoded_signature = marker.split(".")
+        expires = int(expires)
+        signature = _b64decode(encoded_signature)
+        expected = sign("refill", role, expires, params.get("cursor") or "")
+    except ValueError:
+        return False
+    return expires >= time.time() and hmac.compare_digest(signature, expected)
+
+
+def fetch_upstream_page(auth: str, cursor: str, role: str) -> tuple[list, str | None]:
+    """補充のために上流の次のページを取得する（呼び出し元のトークンで Gateway を呼び出す）"""
+    request = urllib.request.Request(
+        UPSTREAM_TOOLS_LIST_URL,
+        data=json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "id": "tools-refill",
+                "method": "tools/list",
+                "params": {"cursor": cursor, "_meta": {REFILL_META_KEY: refill_marker(cursor, role)}},
+            }
+        ).encode(),
+        headers={"Authorization": auth, "Content-Type": "application/json", "Accept": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=TOOLS_REFILL_TIMEOUT) as response:
+        result = json.loads(response.read()).get("result") or {}
+    return result.get("tools", []), result.get("nextCursor")
+
+
+def shape_page(tools: list, next_upstream: str | None, position: tuple[str | None, int], role: str, fetch_page):
+    """フィルタリング後のツールを TOOLS_PAGE_SIZE 件のページに整形する
+
+    Args:
+        tools: position[0] のカーソルで取得した上流のページのフィルタリング後のツール
+        next_upstream: 上流の次のページのカーソル
+        position: (上流のカーソル, そのページで返却済みの件数)
+        fetch_page: 上流のカーソルを受け取り、(フィルタリング後のツール, 次のカーソル) を返す関数（None の場合は補充しない）
+
+    Returns:
+        (ページのツール, クライアントに返す nextCursor, 補充した回数)
+    """
+    current, offset = position
+    tools = tools[offset:]
+    page = []
+    calls = 0
+    while True:
+        room = TOOLS_PAGE_SIZE - len(page)
+        if len(tools) > room:
+            # 上流のページの途中で区切り、残りは次のリクエストで返す
+            return page + tools[:room], encode_cursor(current, offset + room, role), calls
+        page += tools
+        if not next_upstream:
+            return page, None, calls
+        if len(page) >= TOOLS_PAGE_SIZE or fetch_page is None or calls >= TOOLS_REFILL_MAX_CALLS:
+            return page, encode_cursor(next_upstream, 0, role), calls
+        try:
+            tools, following = fetch_page(next_upstream)
+        except Exception as e:
+            # 補充に失敗してもそこまでのページは返す（続きはクライアントが次のリクエストで取得する）
+            print(f"[PAGINATION] Refill failed: {e}")
+            return page, encode_cursor(next_upstream, 0, role), calls
+        calls += 1
+        current, offset, next_upstream = next_upstream, 0, following
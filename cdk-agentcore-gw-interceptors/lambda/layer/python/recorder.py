@@ -0,0 +1,147 @@
+"""
+Interceptor イベントの記録（トレース）
+
+受信した gatewayRequest / gatewayResponse イベントを TRACE_SAMPLE_RATE の割合でサンプリングし、
+機密情報を除去した上で 1 行 1 イベントの JSONL として出力する。
+出力したトレースは scripts/replay_trace.py でローカルの Interceptor に再生できる。
+
+- Bearer トークン: "Bearer {{token}}" に置き換え、再署名用にクレーム（ユーザー識別子はハッシュ化）を保存
+- ヘッダー: Authorization / Content-Type 以外は保存しない
+- ツールの arguments: TRACE_KEEP_ARGUMENTS 以外の文字列はハッシュに置換（同じ値は同じハッシュになる）
+- ツールの実行結果: テキストは同じ長さのダミー文字列に置換（ツール一覧はそのまま保存）
+
+出力先は TRACE_OUTPUT で指定する（"stdout": CloudWatch Logs に "[TRACE] " 付きで出力 / それ以外: ファイルパス）
+"""
+
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+# 記録する割合（0 で無効）
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0"))
+TRACE_OUTPUT = os.getenv("TRACE_OUTPUT", "stdout")
+# 値をそのまま残す引数（認可・検証の結果に影響するもの）
+TRACE_KEEP_ARGUMENTS = frozenset(
+    os.getenv("TRACE_KEEP_ARGUMENTS", "top_k,data_source_id,start_date,end_date,force,full_sync").split(",")
+)
+
+TOKEN_PLACEHOLDER = "Bearer {{token}}"
+TRACE_PREFIX = "[TRACE] "
+
+# 再生時に発行し直すため保存しないクレーム
+DROPPED_CLAIMS = frozenset(
+    ["iss", "exp", "iat", "auth_time", "jti", "origin_jti", "event_id", "client_id", "version"]
+)
+# ユーザーを識別できるクレーム（ハッシュ化して保存）
+HASHED_CLAIMS = frozenset(["sub", "username", "email"])
+KEPT_HEADERS = ("Content-Type",)
+
+_lock = threading.Lock()
+
+
+def _hash(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:12]
+
+
+def extract_claims(auth: str) -> dict | None:
+    """トークンのクレームを取得する（署名は検証しない。記録専用）"""
+    if not auth.startswith("Bearer "):
+        return None
+    try:
+        payload = auth[len("Bearer ") :].split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, ValueError):
+        return None
+    return {
+        key: f"redacted-{_hash(str(value))}" if key in HASHED_CLAIMS else value
+        for key, value in claims.items()
+        if key not in DROPPED_CLAIMS
+    }
+
+
+def redact_arguments(arguments) -> dict:
+    if not isinstance(arguments, dict):
+        return arguments
+    return {
+        key: value if key in TRACE_KEEP_ARGUMENTS or not isinstance(value, str) else f"redacted-{_hash(value)}"
+        for key, value in arguments.items()
+    }
+
+
+def mask(value):
+    """文字列を同じ長さのダミー文字列に置換する（サイズを保ったまま内容を除去）"""
+    if isinstance(value, str):
+        return "x" * len(value)
+    if isinstance(value, list):
+        return [mask(item) for item in value]
+    if isinstance(value, dict):
+        return {key: mask(item) for key, item in value.items()}
+    return value
+
+
+def redact_body(body):
+    if not isinstance(body, dict):
+        return body
+    redacted = dict(body)
+    params = body.get("params")
+    if isinstance(params, dict) and "arguments" in params:
+        redacted["params"] = {**params, "arguments": redact_arguments(params["arguments"])}
+    result = body.get("result")
+    if isinstance(result, dict):
+        # ツール一覧（tools/list、セマンティック検索）はフィルタリングの入力のため、そのまま保存する
+        structured = result.get("structuredContent")
+        if "tools" not in result and not (isinstance(structured, dict) and "tools" in structured):
+            redacted["result"] = {
+                key: mask(value) if key in ("content", "structuredContent") else value
+                for key, value in result.items()
+            }
+    return redacted
+
+
+def redact_message(message: dict) -> tuple[dict, dict | None]:
+    """gatewayRequest / gatewayResponse の機密情報を除去し、(除去後, トークンのクレーム) を返す"""
+    headers = message.get("headers") or {}
+    claims = extract_claims(headers.get("Authorization", ""))
+    kept = {key: headers[key] for key in KEPT_HEADERS if key in headers}
+    if "Authorization" in headers:
+        kept["Authorization"] = TOKEN_PLACEHOLDER
+    redacted = {**message, "headers": kept}
+    if "body" in message:
+        redacted["body"] = redact_body(message["body"])
+    return redacted, claims
+
+
+def build_record(stage: str, event: dict) -> dict:
+    mcp = event.get("mcp", {})
+    record_mcp = {}
+    claims = None
+    for name in ("gatewayRequest", "gatewayResponse"):
+        if name in mcp:
+            record_mcp[name], message_claims = redact_message(mcp[name])
+            claims = claims or message_claims
+    return {
+        "ts": round(time.time(), 3),
+        "stage": stage,
+        "claims": claims,
+        "event": {**event, "mcp": record_mcp},
+    }
+
+
+def record_event(stage: str, event: dict):
+    """イベントをサンプリングして記録する（記録しない場合は乱数 1 回のみ）"""
+    if TRACE_SAMPLE_RATE <= 0 or random.random() >= TRACE_SAMPLE_RATE:
+        return
+    try:
+        line = json.dumps(build_record(stage, event), ensure_ascii=False, separators=(",", ":"))
+        if TRACE_OUTPUT == "stdout":
+            print(TRACE_PREFIX + line)
+        else:
+            with _lock, open(TRACE_OUTPUT, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        # 記録の失敗でリクエストを失敗させない
+        print(f"[TRACE] Record failed: {e}")
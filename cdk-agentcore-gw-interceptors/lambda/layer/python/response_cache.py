@@ -0,0 +1,154 @@
+"""
+冪等なツールのレスポンスキャッシュ
+
+Response Interceptor がツールの実行結果を保存し、Request Interceptor が同じリクエストに対して
+ターゲットを呼び出さずにキャッシュから直接応答する。
+
+- キー: (ロール, ターゲット, ツール, 正規化した arguments) のハッシュ
+  （ロールを含めるため、権限の異なるユーザー間で結果が共有されることはない）
+- キャッシュ対象と TTL はツール毎に CACHEABLE_TOOLS で指定（指定のないツールはキャッシュしない）
+- 実行環境内の LRU キャッシュ + 共有バックエンド（RESPONSE_CACHE_TABLE_NAME 指定時は DynamoDB）
+  Request / Response Interceptor は別の Lambda のため、デプロイ環境では共有バックエンドが必要
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# {tool: TTL 秒}
+CACHEABLE_TOOLS = {
+    "retrieve_doc": 300,
+}
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TABLE_NAME = os.getenv("RESPONSE_CACHE_TABLE_NAME")
+RESPONSE_CACHE_DYNAMODB_ENDPOINT = os.getenv("RESPONSE_CACHE_DYNAMODB_ENDPOINT")
+# 実行環境内に保持するエントリ数
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+# これより大きい結果はキャッシュしない（DynamoDB の項目サイズ上限 400KB 未満）
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(256 * 1024)))
+
+
+def is_cacheable(tool: str) -> bool:
+    return RESPONSE_CACHE_ENABLED and tool in CACHEABLE_TOOLS
+
+
+def cache_key(role: str, target: str, tool: str, arguments: dict) -> str | None:
+    """キャッシュキーを作成する（キャッシュ対象外のツールは None）"""
+    if not is_cacheable(tool):
+        return None
+    canonical = json.dumps(
+        {"role": role, "target": target, "tool": tool, "arguments": arguments},
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class LRUCache:
+    """TTL 付きの LRU キャッシュ（実行環境内）"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class DynamoDBCacheBackend:
+    """DynamoDB の共有キャッシュ（パーティションキー "pk"、TTL 属性 "expires_at"）"""
+
+    def __init__(self, table_name: str, endpoint_url: str = None):
+        import boto3
+
+        self.table_name = table_name
+        self.client = boto3.client("dynamodb", endpoint_url=endpoint_url)
+
+    def get(self, key: str) -> tuple[float, str] | None:
+        item = self.client.get_item(TableName=self.table_name, Key={"pk": {"S": key}}).get("Item")
+        if not item:
+            return None
+        # TTL による削除は遅延するため、期限切れは自前で判定する
+        expires_at = float(item["expires_at"]["N"])
+        if expires_at <= time.time():
+            return None
+        return expires_at, item["value"]["S"]
+
+    def put(self, key: str, value: str, expires_at: float):
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={
+                "pk": {"S": key},
+                "value": {"S": value},
+                "expires_at": {"N": str(int(expires_at))},
+            },
+        )
+
+
+class ResponseCache:
+    def __init__(self, shared=None):
+        self.local = LRUCache()
+        self.shared = shared
+
+    def get(self, key: str) -> dict | None:
+        """キャッシュされた JSON-RPC result を返す（なければ None）"""
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except Exception as e:
+                # 共有キャッシュの障害時はキャッシュなしとして扱う
+                print(f"[RESPONSE_CACHE] Shared get failed: {e}")
+                entry = None
+            if entry is not None:
+                expires_at, value = entry
+                self.local.put(key, value, expires_at)
+        return json.loads(value) if value is not None else None
+
+    def put(self, key: str, tool: str, result: dict) -> bool:
+        """JSON-RPC result を保存する（サイズ超過時は保存せず False）"""
+        value = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+        if len(value.encode()) > RESPONSE_CACHE_MAX_BYTES:
+            return False
+        expires_at = time.time() + CACHEABLE_TOOLS[tool]
+        self.local.put(key, value, expires_at)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, value, expires_at)
+            except Exception as e:
+                print(f"[RESPONSE_CACHE] Shared put failed: {e}")
+                return False
+        return True
+
+
+def create_response_cache() -> ResponseCache:
+    shared = None
+    if RESPONSE_CACHE_TABLE_NAME:
+        shared = DynamoDBCacheBackend(RESPONSE_CACHE_TABLE_NAME, RESPONSE_CACHE_DYNAMODB_ENDPOINT)
+    return ResponseCache(shared)
+
+
+# Lambda 実行環境内で共有する
+response_cache = create_response_cache()
@@ -0,0 +1,94 @@
+"""
+ハンドラーのステージ毎の処理時間の計測（Server-Timing）
+
+JWKS の取得・JWT の検証・認可・シリアライズ等のステージ毎の処理時間を計測し、
+CloudWatch Embedded Metric Format のメトリクスと、transformedGatewayResponse の Server-Timing ヘッダーで出力する。
+
+計測はステージの終了時に lap(name) を呼び出すだけで、前回の lap からの経過時間をそのステージの時間として記録する
+（perf_counter の呼び出しとリストへの追加のみ）。
+
+Server-Timing のメトリクス名は "<Interceptor の接頭辞>-<ステージ>"（例: req-jwt, resp-filter）。
+Request Interceptor はターゲットに転送するリクエスト（transformedGatewayRequest）にも付与し、
+Gateway がそのヘッダーを Response Interceptor のイベントに引き継いだ場合は、Response Interceptor の値の前に並べる。
+"""
+
+import json
+import os
+import time
+
+# ステージ毎の処理時間のメトリクス（CloudWatch Embedded Metric Format）
+STAGE_METRICS_ENABLED = os.getenv("STAGE_METRICS_ENABLED", "true").lower() == "true"
+# transformedGatewayResponse に Server-Timing ヘッダーを付与する
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "AgentCoreGateway/Interceptors")
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+class StageTimer:
+    """ハンドラーのステージ毎の処理時間 (ms) を記録する"""
+
+    __slots__ = ("prefix", "stages", "_started", "_last")
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self.stages: list[tuple[str, float]] = []
+        self._started = self._last = time.perf_counter()
+
+    def lap(self, name: str):
+        """前回の lap（初回はハンドラーの開始）からの経過時間を name のステージとして記録する"""
+        now = time.perf_counter()
+        self.stages.append((name, (now - self._last) * 1000))
+        self._last = now
+
+    @property
+    def total(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def server_timing(self, upstream: str = "") -> str:
+        """Server-Timing ヘッダーの値（upstream には先行する Interceptor の値を指定する）"""
+        entries = [f"{self.prefix}-{name};dur={ms:.3f}" for name, ms in self.stages]
+        entries.append(f"{self.prefix}-total;dur={self.total:.3f}")
+        return ", ".join([upstream, *entries] if upstream else entries)
+
+    def add_header(self, output: dict, upstream: str = "") -> dict:
+        """transformedGatewayResponse / transformedGatewayRequest のヘッダーに Server-Timing を追加する"""
+        if SERVER_TIMING_ENABLED:
+            for key in ("transformedGatewayResponse", "transformedGatewayRequest"):
+                if key in output["mcp"]:
+                    headers = output["mcp"][key].setdefault("headers", {})
+                    headers[SERVER_TIMING_HEADER] = self.server_timing(upstream)
+        return output
+
+    def emit_metrics(self, method: str, outcome: str):
+        """ステージ毎の処理時間を CloudWatch Embedded Metric Format で出力する"""
+        if not STAGE_METRICS_ENABLED:
+            return
+        values = {metric_name(name): round(ms, 3) for name, ms in self.stages}
+        values["TotalTime"] = round(self.total, 3)
+        print(
+            json.dumps(
+                {
+                    "_aws": {
+                        "Timestamp": int(time.time() * 1000),
+                        "CloudWatchMetrics": [
+                            {
+                                "Namespace": METRICS_NAMESPACE,
+                                "Dimensions": [["Interceptor", "Method"]],
+                                "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in values],
+                            }
+                        ],
+                    },
+                    "Interceptor": self.prefix,
+                    "Method": method or "unknown",
+                    "Outcome": outcome,
+                    **values,
+                }
+            )
+        )
+
+
+def metric_name(stage: str) -> str:
+    """ステージ名をメトリクス名に変換する（例: rate_limit → RateLimitTime）"""
+    return "".join(part.capitalize() for part in stage.split("_")) + "Time"
+
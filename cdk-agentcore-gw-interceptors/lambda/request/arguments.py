@@ -0,0 +1,147 @@
+"""
+引数レベルの認可（ロール・ツール毎の引数制約）
+
+ツール名だけでなく、tools/call の arguments の値もロールに応じて制限する。
+制約は ARGUMENT_CONSTRAINTS に宣言し、(role, tool) 毎に 1 度だけ検証関数へまとめてキャッシュする。
+検証関数は arguments を受け取り、違反があればエラーメッセージ、なければ None を返す。
+"""
+
+import os
+from datetime import datetime
+from functools import lru_cache
+
+# 同期・削除を許可するデータソース ID（カンマ区切り）
+ALLOWED_DATA_SOURCE_IDS = frozenset(
+    s.strip() for s in os.getenv("ALLOWED_DATA_SOURCE_IDS", "test-data-source-001").split(",") if s.strip()
+)
+# get_query_log で取得できる最大期間（日）
+MAX_QUERY_LOG_SPAN_DAYS = int(os.getenv("MAX_QUERY_LOG_SPAN_DAYS", "366"))
+
+
+# ============================================
+# 制約（引数 dict を受け取り、違反時にメッセージを返す関数を作成する）
+# ============================================
+def int_range(name: str, minimum: int, maximum: int):
+    """整数の引数の下限・上限"""
+
+    def check(arguments: dict):
+        value = arguments.get(name)
+        if value is None:
+            return None
+        if not isinstance(value, int) or isinstance(value, bool):
+            return f"{name} must be an integer"
+        if not minimum <= value <= maximum:
+            return f"{name} must be between {minimum} and {maximum}"
+        return None
+
+    return check
+
+
+def max_length(name: str, limit: int):
+    """文字列の引数の最大長"""
+
+    def check(arguments: dict):
+        value = arguments.get(name)
+        if isinstance(value, str) and len(value) > limit:
+            return f"{name} must be at most {limit} characters"
+        return None
+
+    return check
+
+
+def one_of(name: str, allowed: frozenset):
+    """許可リストに含まれる値のみ許可"""
+
+    def check(arguments: dict):
+        if arguments.get(name) not in allowed:
+            return f"{name} is not allowed: {arguments.get(name)}"
+        return None
+
+    return check
+
+
+def not_true(name: str):
+    """True を指定できない真偽値の引数"""
+
+    def check(arguments: dict):
+        if arguments.get(name) is True:
+            return f"{name}=true is not allowed"
+        return None
+
+    return check
+
+
+def max_date_span(start_name: str, end_name: str, days: int):
+    """ISO 8601 の開始・終了日時の間隔の上限"""
+
+    def check(arguments: dict):
+        try:
+            start = datetime.fromisoformat(arguments[start_name])
+            end = datetime.fromisoformat(arguments[end_name])
+        except (KeyError, TypeError, ValueError):
+            return f"{start_name} and {end_name} must be ISO 8601 datetimes"
+        try:
+            span = end - start
+        except TypeError:  # タイムゾーンの有無が混在
+            return f"{start_name} and {end_name} must both include (or omit) a timezone"
+        if span.total_seconds() < 0:
+            return f"{start_name} must be before {end_name}"
+        if span.days > days:
+            return f"{start_name}..{end_name} must be within {days} days"
+        return None
+
+    return check
+
+
+# ============================================
+# ロール・ツール毎の引数制約
+# 形式: {tool: {role: [制約, ...]}}（role "*" は個別指定のないロールに適用）
+# ============================================
+ARGUMENT_CONSTRAINTS = {
+    "retrieve_doc": {
+        "admin": [int_range("top_k", 1, 50), max_length("query", 1000)],
+        "*": [int_range("top_k", 1, 10), max_length("query", 1000)],
+    },
+    # ALLOWED_DATA_SOURCE_IDS は操作できるデータソースの一覧で、admin を含む全ロールに適用する
+    # （ロールによる違いは delete_data_source の force のみ）
+    "sync_data_source": {
+        "admin": [one_of("data_source_id", ALLOWED_DATA_SOURCE_IDS)],
+        "*": [one_of("data_source_id", ALLOWED_DATA_SOURCE_IDS)],
+    },
+    "delete_data_source": {
+        "admin": [one_of("data_source_id", ALLOWED_DATA_SOURCE_IDS)],
+        # force=True（ベクトルデータの削除）は admin のみ
+        "*": [one_of("data_source_id", ALLOWED_DATA_SOURCE_IDS), not_true("force")],
+    },
+    "get_query_log": {
+        "*": [max_date_span("start_date", "end_date", MAX_QUERY_LOG_SPAN_DAYS)],
+    },
+}
+
+
+def _no_constraints(arguments: dict):
+    return None
+
+
+@lru_cache(maxsize=1024)
+def get_validator(role: str, tool: str):
+    """(role, tool) の検証関数を返す（初回のみ作成し、以降はキャッシュを使用）"""
+    by_role = ARGUMENT_CONSTRAINTS.get(tool, {})
+    checks = tuple(by_role.get(role, by_role.get("*", ())))
+    if not checks:
+        return _no_constraints
+
+    def validate(arguments: dict):
+        for check in checks:
+            if message := check(arguments):
+                return message
+        return None
+
+    return validate
+
+
+def validate_arguments(role: str, tool: str, arguments) -> str | None:
+    """tools/call の arguments を検証する（違反時はエラーメッセージを返す）"""
+    if not isinstance(arguments, dict):
+        return "arguments must be an object"
+    return get_validator(role, tool)(arguments)
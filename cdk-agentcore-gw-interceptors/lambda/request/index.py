@@ -1,31 +1,121 @@
 import json
 import os
+from dataclasses import dataclass
+from functools import lru_cache
 
 import jwt
+from arguments import validate_arguments
+from audit import audit
+from cedar import POLICY_FILE, PolicySet
+from pagination import rewrite_list_request
+from rate_limit import RATE_LIMIT_FAIL_OPEN, rate_limiter
+from recorder import record_event
+from response_cache import cache_key, response_cache
+from timing import StageTimer
 
 TARGET_NAME = os.environ["TARGET_NAME"]
 JWKS_URL = os.environ["JWKS_URL"]
 CLIENT_ID = os.environ["CLIENT_ID"]
 
+# 認可方式（role: ROLE_PERMISSIONS で判定 / cedar: policies.cedar を評価）
+AUTHORIZATION_MODE = os.getenv("AUTHORIZATION_MODE", "role")
+# Cedar ポリシーの resource（Interceptor は自身の Gateway のリクエストのみ受け取るため、既定値のままでよい）
+GATEWAY_ARN = os.getenv("GATEWAY_ARN", "self")
+
 # JWKS クライアントを初期化（キーのキャッシュ機能付き）
 jwks_client = jwt.PyJWKClient(JWKS_URL)
 
 # ============================================
 # ロールベースのアクセス制御設定
 # agentcore-policy.ts の Cedar Policy と同等のロジック
+#
+# 許可するツールは以下の形式で指定する:
+#   "<tool>"            : 全ターゲットの <tool>
+#   "<target>___<tool>" : <target> の <tool> のみ
+#   "<target>___*"      : <target> の全ツール
+#   "*"                 : 全ターゲットの全ツール
 # ============================================
 ROLE_PERMISSIONS = {
     "admin": ["*"],  # 全ツール許可
-    "user": ["retrieve_doc"],  # retrieve_doc のみ許可
+    "user": [f"{TARGET_NAME}___retrieve_doc"],  # このターゲットの retrieve_doc のみ許可
     # guest やその他のロールは許可なし
 }
 
+WILDCARD = "*"
+TARGET_SEPARATOR = "___"
+
+
+@dataclass(frozen=True)
+class RolePermissions:
+    """ロール毎の許可設定を、(target, tool) の判定が O(1) になるよう集合に展開したもの"""
+
+    all_tools: bool = False  # "*"
+    any_target_tools: frozenset = frozenset()  # "<tool>"
+    all_tools_targets: frozenset = frozenset()  # "<target>___*"
+    target_tools: frozenset = frozenset()  # ("<target>", "<tool>")
+
+    def allows(self, target: str, tool: str) -> bool:
+        return (
+            self.all_tools
+            or tool in self.any_target_tools
+            or target in self.all_tools_targets
+            or (target, tool) in self.target_tools
+        )
 
-def decode_jwt_payload(token: str) -> dict:
+
+@lru_cache(maxsize=4096)
+def parse_tool_name(name: str) -> tuple[str, str]:
+    """Gateway のツール名 "<target>___<tool>" を (target, tool) に分解する
+
+    ターゲットの付かない名前（x_amz_bedrock_agentcore_search 等のシステムツール）は target を "" とする。
+    """
+    target, sep, tool = name.partition(TARGET_SEPARATOR)
+    return (target, tool) if sep else ("", name)
+
+
+def build_permission_index(role_permissions: dict) -> dict[str, RolePermissions]:
+    """ROLE_PERMISSIONS からロール毎の判定用インデックスを作成する"""
+    index = {}
+    for role, entries in role_permissions.items():
+        any_target_tools, all_tools_targets, target_tools = set(), set(), set()
+        for entry in entries:
+            if entry == WILDCARD:
+                index[role] = RolePermissions(all_tools=True)
+                break
+            target, tool = parse_tool_name(entry)
+            if not target:
+                any_target_tools.add(tool)
+            elif tool == WILDCARD:
+                all_tools_targets.add(target)
+            else:
+                target_tools.add((target, tool))
+        else:
+            index[role] = RolePermissions(
+                any_target_tools=frozenset(any_target_tools),
+                all_tools_targets=frozenset(all_tools_targets),
+                target_tools=frozenset(target_tools),
+            )
+    return index
+
+
+# モジュール読み込み時に 1 度だけ作成する
+PERMISSION_INDEX = build_permission_index(ROLE_PERMISSIONS)
+NO_PERMISSIONS = RolePermissions()
+
+# Cedar ポリシーはコールドスタート時に 1 度だけコンパイルする
+POLICY_SET = (
+    PolicySet.from_template(POLICY_FILE, targetName=TARGET_NAME, gatewayArn=GATEWAY_ARN)
+    if AUTHORIZATION_MODE == "cedar"
+    else None
+)
+
+
+def decode_jwt_payload(token: str, timer: StageTimer = None) -> dict:
     """JWT トークンを検証してペイロードを取得する。
 
     Args:
         token: Bearer トークンから抽出した JWT 文字列
+        timer: 指定時は JWKS の取得（jwks）と署名・クレームの検証（jwt）の処理時間を記録する
 
     Returns:
         検証済みの JWT クレーム
@@ -35,6 +125,8 @@ def decode_jwt_payload(token: str) -> dict:
     """
     # JWKS から署名キーを取得
     signing_key = jwks_client.get_signing_key_from_jwt(token)
+    if timer:
+        timer.lap("jwks")
 
     # トークンを検証してデコード
     claims = jwt.decode(
@@ -52,40 +144,74 @@ def decode_jwt_payload(token: str) -> dict:
     if claims.get("token_use") != "access":
         raise jwt.InvalidTokenError("Invalid token_use")
 
+    if timer:
+        timer.lap("jwt")
     return claims
 
 
 def check_authorization(role: str, tool_name: str) -> bool:
-    """ロールに基づいてツールの実行可否を判断"""
-    allowed_tools = ROLE_PERMISSIONS.get(role, [])
-    if not allowed_tools:
-        return False
-    # "*" は全ツールアクセス可能
-    if "*" in allowed_tools:
-        return True
-    # 特定のツールが許可されているかチェック
-    return tool_name in allowed_tools
+    """ロールに基づいてツールの実行可否を判断（tool_name は "<target>___<tool>" 形式）"""
+    target, tool = parse_tool_name(tool_name)
+    return PERMISSION_INDEX.get(role, NO_PERMISSIONS).allows(target, tool)
+
+
+def authorize(claims: dict, tool_name: str) -> bool:
+    """認可方式に応じてツールの実行可否を判断"""
+    if POLICY_SET is not None:
+        return POLICY_SET.is_authorized(claims, tool_name, GATEWAY_ARN)
+    return check_authorization(claims.get("role", "guest"), tool_name)
 
 
 def extract_tool_name(body):
-    params = body.get("params", {})
-    name = params.get("name", "")
-    # Tool names are of the form: <target>___<toolName>
-    return name.split("___")[-1] if "___" in name else name
+    params = body.get("params") or {}
+    # Tool names are of the form: <target>___<toolName> (target is kept for authorization)
+    return params.get("name", "")
 
 
-def build_error_response(message, body):
+def build_error_response(message, body, status_code=403, data=None, headers=None):
     """Return an MCP-style error response"""
+    error = {"code": -32000, "message": message}
+    if data is not None:
+        error["data"] = data
     return {
         "interceptorOutputVersion": "1.0",
         "mcp": {
             "transformedGatewayResponse": {
-                "statusCode": 403,
-                "headers": {"Content-Type": "application/json"},
+                "statusCode": status_code,
+                "headers": {"Content-Type": "application/json", **(headers or {})},
                 "body": {
                     "jsonrpc": "2.0",
                     "id": body.get("id"),
-                    "error": {"code": -32000, "message": message},
+                    "error": error,
+                },
+            }
+        },
+    }
+
+
+def build_rate_limit_response(exceeded, body):
+    """Return a 429 error response with a retry hint"""
+    return build_error_response(
+        exceeded.message,
+        body,
+        status_code=429,
+        data={"retryAfter": exceeded.retry_after},
+        headers={"Retry-After": str(exceeded.retry_after)},
+    )
+
+
+def build_cached_response(result, body):
+    """Return a cached tool result without calling the target"""
+    return {
+        "interceptorOutputVersion": "1.0",
+        "mcp": {
+            "transformedGatewayResponse": {
+                "statusCode": 200,
+                "headers": {"Content-Type": "application/json", "X-Cache": "HIT"},
+                "body": {
+                    "jsonrpc": "2.0",
+                    "id": body.get("id"),
+                    "result": result,
                 },
             }
         },
@@ -105,7 +231,39 @@ def build_pass_through(body):
     }
 
 
+def outcome_of(output: dict) -> str:
+    """ハンドラーの結果の種類（メトリクスのプロパティ）"""
+    response = output["mcp"].get("transformedGatewayResponse")
+    if response is None:
+        return "forwarded"
+    status_code = response.get("statusCode", 200)
+    if status_code >= 500:
+        return "error"
+    return {200: "cached", 429: "limited"}.get(status_code, "denied")
+
+
 def lambda_handler(event, context):
+    timer = StageTimer("req")
+    body = ((event.get("mcp") or {}).get("gatewayRequest") or {}).get("body") or {}
+    method = body.get("method", "")
+    try:
+        output = handle_request(event, timer)
+    except Exception as e:
+        # 想定外のエラー（認可・引数の検証の不具合等）は転送せずに拒否する（fail closed）
+        # 監査ログの記録に失敗しても 500 のレスポンスは必ず返す
+        print(f"[REQUEST_INTERCEPTOR] Internal error: {e!r}")
+        try:
+            audit("request", "deny", f"internal_error: {e!r}", None, method, extract_tool_name(body), timer.total)
+        except Exception as audit_error:
+            print(f"[REQUEST_INTERCEPTOR] Audit failed: {audit_error!r}")
+        output = build_error_response("Internal error", body, status_code=500)
+    timer.add_header(output)
+    timer.emit_metrics(method, outcome_of(output))
+    return output
+
+
+def handle_request(event, timer: StageTimer):
+    record_event("request", event)
     print(f"[REQUEST_INTERCEPTOR] Event: {json.dumps(event)}")
 
     mcp = event.get("mcp", {})
@@ -116,38 +274,105 @@ def lambda_handler(event, context):
 
     print(f"[REQUEST_INTERCEPTOR] Method: {body.get('method', '')}")
     print(f"[REQUEST_INTERCEPTOR] Has auth: {bool(auth)}")
+    timer.lap("parse")
 
     if not auth.startswith("Bearer "):
         print("[REQUEST_INTERCEPTOR] No Bearer token")
+        audit("request", "deny", "no_token", method=body.get("method", ""), latency_ms=timer.total)
         return build_error_response("No token", body)
 
+    method = body.get("method", "")
+    tool_name = extract_tool_name(body)
     try:
-        token = auth.replace("Bearer ", "")
-        claims = decode_jwt_payload(token)
-
-        # カスタムクレームから role を取得
-        role = claims.get("role", "guest")
-        method = body.get("method", "")
-        tool_name = extract_tool_name(body)
-
-        print(f"[REQUEST_INTERCEPTOR] Role: {role}")
-        print(f"[REQUEST_INTERCEPTOR] Tool name: {tool_name}")
-        print(f"[REQUEST_INTERCEPTOR] TARGET_NAME: {TARGET_NAME}")
-
-        # Allow MCP protocol methods and system tools without tool-level authorization
-        if method != "tools/call":
-            print(f"[REQUEST_INTERCEPTOR] Pass through (protocol method: {method} or system tool: {tool_name})")
-            return build_pass_through(body)
-
-        authorized = check_authorization(role, tool_name)
-        print(f"[REQUEST_INTERCEPTOR] Authorization check: {authorized}")
-
-        if not tool_name or not authorized:
-            print(f"[REQUEST_INTERCEPTOR] Denied: {tool_name} (role={role})")
-            return build_error_response(f"Insufficient permission: {tool_name}", body)
+        claims = decode_jwt_payload(auth.replace("Bearer ", ""), timer)
+    except jwt.PyJWKClientConnectionError as e:
+        # JWKS を取得できない場合はトークンを検証できないため拒否する（fail closed）
+        print(f"[REQUEST_INTERCEPTOR] JWKS unavailable: {e}")
+        audit("request", "deny", f"jwks_unavailable: {e}", None, method, tool_name, timer.total)
+        return build_error_response("Authorization service unavailable", body, status_code=503)
     except Exception as e:
-        print(f"[REQUEST_INTERCEPTOR] Error: {e}")
+        print(f"[REQUEST_INTERCEPTOR] Invalid token: {e}")
+        audit("request", "deny", f"invalid_token: {e}", None, method, tool_name, timer.total)
         return build_error_response(f"Invalid token: {e}", body)
 
+    # カスタムクレームから role を取得
+    role = claims.get("role", "guest")
+
+    print(f"[REQUEST_INTERCEPTOR] Role: {role}")
+    print(f"[REQUEST_INTERCEPTOR] Tool name: {tool_name}")
+    print(f"[REQUEST_INTERCEPTOR] TARGET_NAME: {TARGET_NAME}")
+
+    # Interceptor が発行した tools/list のカーソルを Gateway のカーソルに戻す
+    if method == "tools/list":
+        try:
+            body = rewrite_list_request(body, role)
+        except ValueError as e:
+            print(f"[REQUEST_INTERCEPTOR] Invalid cursor (role={role}): {e}")
+            audit("request", "deny", f"invalid_cursor: {e}", claims, method, latency_ms=timer.total)
+            return build_error_response(f"Invalid cursor: {e}", body, status_code=400)
+
+    # Allow MCP protocol methods and system tools without tool-level authorization
+    if method != "tools/call":
+        print(f"[REQUEST_INTERCEPTOR] Pass through (protocol method: {method} or system tool: {tool_name})")
+        audit("request", "allow", "protocol_method", claims, method, tool_name, timer.total)
+        return build_pass_through(body)
+
+    authorized = authorize(claims, tool_name)
+    timer.lap("authz")
+    elapsed_us = timer.stages[-1][1] * 1000
+    print(f"[REQUEST_INTERCEPTOR] Authorization check ({AUTHORIZATION_MODE}): {authorized} ({elapsed_us:.1f} us)")
+
+    if not tool_name or not authorized:
+        print(f"[REQUEST_INTERCEPTOR] Denied: {tool_name} (role={role})")
+        audit(
+            "request",
+            "deny",
+            f"insufficient_permission ({AUTHORIZATION_MODE})",
+            claims,
+            method,
+            tool_name,
+            timer.total,
+            authz_us=round(elapsed_us, 1),
+        )
+        return build_error_response(f"Insufficient permission: {tool_name}", body)
+
+    # 引数レベルの認可（上限超過等のリクエストはバックエンドに送らない）
+    target, tool = parse_tool_name(tool_name)
+    arguments = (body.get("params") or {}).get("arguments") or {}
+    violation = validate_arguments(role, tool, arguments)
+    timer.lap("arguments")
+    if violation:
+        print(f"[REQUEST_INTERCEPTOR] Denied arguments: {tool_name} (role={role}): {violation}")
+        audit("request", "deny", f"invalid_arguments: {violation}", claims, method, tool_name, timer.total)
+        return build_error_response(f"Invalid arguments: {violation}", body)
+
+    # ユーザー・ツール毎のレート制限と日次クォータ（キャッシュから応答するリクエストも対象とする）
+    degraded = {}
+    try:
+        exceeded = rate_limiter.check(claims.get("sub", ""), role, tool)
+    except Exception as e:
+        # クォータのバックエンド（DynamoDB）の障害時の扱いは RATE_LIMIT_FAIL_OPEN で選択する
+        print(f"[REQUEST_INTERCEPTOR] Rate limit backend error: {e}")
+        if not RATE_LIMIT_FAIL_OPEN:
+            audit("request", "deny", f"rate_limit_unavailable: {e}", claims, method, tool_name, timer.total)
+            return build_error_response("Rate limit service unavailable", body, status_code=503)
+        exceeded, degraded = None, {"degraded": f"rate_limit_unavailable: {e}"}
+    timer.lap("rate_limit")
+    if exceeded:
+        print(f"[REQUEST_INTERCEPTOR] Limited: {tool_name} (role={role}): {exceeded.message}")
+        audit("request", "deny", f"rate_limited: {exceeded.message}", claims, method, tool_name, timer.total)
+        return build_rate_limit_response(exceeded, body)
+
+    # キャッシュ済みの結果があればターゲットを呼び出さずに応答する
+    # 共有キャッシュの障害時はキャッシュなしとして扱う（fail open。ResponseCache.get）
+    key = cache_key(role, target, tool, arguments)
+    cached = response_cache.get(key) if key else None
+    timer.lap("cache")
+    if cached is not None:
+        print(f"[REQUEST_INTERCEPTOR] Cache hit: {tool_name} (role={role})")
+        audit("request", "allow", "cache_hit", claims, method, tool_name, timer.total, **degraded)
+        return build_cached_response(cached, body)
+
     print(f"[REQUEST_INTERCEPTOR] Allowed: {tool_name} (role={role})")
+    audit("request", "allow", f"authorized ({AUTHORIZATION_MODE})", claims, method, tool_name, timer.total, **degraded)
     return build_pass_through(body)
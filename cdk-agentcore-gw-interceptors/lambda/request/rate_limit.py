@@ -0,0 +1,208 @@
+"""
+ユーザー（sub）・ツール毎のレート制限と日次クォータ
+
+- レート制限: トークンバケット（Lambda 実行環境内で保持するため、上限は実行環境毎。
+  同じユーザーのリクエストが複数の実行環境に分散すると、全体では実行環境数倍まで通る）
+- 日次クォータ: カウンターバックエンドで集計（既定はプロセス内、QUOTA_TABLE_NAME 指定時は DynamoDB）
+  CDK のデプロイでは QuotaTable を作成して QUOTA_TABLE_NAME に設定するため、全実行環境で共有する。
+  未設定の場合は実行環境毎のカウンターになり、ユーザー毎の日次クォータとしては機能しない
+
+共有バックエンドへのアクセスを毎回行わないよう、クォータは QUOTA_LEASE_SIZE 件単位で
+まとめて確保（リース）し、確保済みの範囲内はプロセス内で消費する。
+
+DynamoDB テーブルはパーティションキー "pk"（文字列）、TTL 属性 "expires_at" で作成する。
+QUOTA_DYNAMODB_ENDPOINT を指定すると DynamoDB Local 等のローカル環境に接続する。
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+
+# ============================================
+# ロール・ツール毎の制限設定（"*" は個別指定のないロール / ツールに適用）
+# ============================================
+# {role: {tool: (1 秒あたりのリクエスト数, バースト)}}
+RATE_LIMITS = {
+    "admin": {"*": (20.0, 40)},
+    "*": {"*": (5.0, 10)},
+}
+
+# {role: {tool: 1 日あたりのリクエスト数}}（None は無制限）
+DAILY_QUOTAS = {
+    "admin": {"*": None},
+    "*": {"*": 1000, "retrieve_doc": 2000},
+}
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+QUOTA_TABLE_NAME = os.getenv("QUOTA_TABLE_NAME")
+QUOTA_DYNAMODB_ENDPOINT = os.getenv("QUOTA_DYNAMODB_ENDPOINT")
+QUOTA_LEASE_SIZE = int(os.getenv("QUOTA_LEASE_SIZE", "10"))
+# クォータのバックエンドの障害時に許可する（true: 制限せずに転送 / false: 503 で拒否）
+# 既定は許可（カウンターの障害で全ユーザーのツール呼び出しが止まらないようにする）
+RATE_LIMIT_FAIL_OPEN = os.getenv("RATE_LIMIT_FAIL_OPEN", "true").lower() == "true"
+
+# 保持するトークンバケット・リースの最大数（古いものから破棄）
+MAX_TRACKED_KEYS = 10000
+
+
+@dataclass(frozen=True)
+class LimitExceeded:
+    """制限超過（retry_after 秒後に再試行可能）"""
+
+    message: str
+    retry_after: int
+
+
+def lookup(config: dict, role: str, tool: str):
+    by_tool = config.get(role, config.get("*", {}))
+    return by_tool.get(tool, by_tool.get("*"))
+
+
+# ============================================
+# レート制限（トークンバケット）
+# ============================================
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def acquire(self) -> float:
+        """トークンを 1 つ消費する。不足時は消費せず、補充までの秒数を返す（成功時は 0）"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+# ============================================
+# 日次クォータのカウンターバックエンド
+# ============================================
+class InMemoryCounterBackend:
+    """プロセス内のカウンター（単一実行環境、およびローカル検証用）"""
+
+    def __init__(self):
+        self._counts: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, key: str, amount: int, expires_at: float) -> int:
+        with self._lock:
+            count, _ = self._counts.get(key, (0, expires_at))
+            count += amount
+            self._counts[key] = (count, expires_at)
+            # 期限切れのカウンターを破棄
+            now = time.time()
+            for expired in [k for k, (_, exp) in self._counts.items() if exp <= now]:
+                del self._counts[expired]
+            return count
+
+
+class DynamoDBCounterBackend:
+    """DynamoDB のアトミックカウンター（全実行環境で共有）"""
+
+    def __init__(self, table_name: str, endpoint_url: str = None):
+        import boto3
+
+        self.table_name = table_name
+        self.client = boto3.client("dynamodb", endpoint_url=endpoint_url)
+
+    def increment(self, key: str, amount: int, expires_at: float) -> int:
+        response = self.client.update_item(
+            TableName=self.table_name,
+            Key={"pk": {"S": key}},
+            UpdateExpression="ADD #count :amount SET expires_at = if_not_exists(expires_at, :expires_at)",
+            ExpressionAttributeNames={"#count": "count"},
+            ExpressionAttributeValues={
+                ":amount": {"N": str(amount)},
+                ":expires_at": {"N": str(int(expires_at))},
+            },
+            ReturnValues="UPDATED_NEW",
+        )
+        return int(response["Attributes"]["count"]["N"])
+
+
+def create_counter_backend():
+    if QUOTA_TABLE_NAME:
+        return DynamoDBCounterBackend(QUOTA_TABLE_NAME, QUOTA_DYNAMODB_ENDPOINT)
+    return InMemoryCounterBackend()
+
+
+# ============================================
+# 制限の判定
+# ============================================
+class RateLimiter:
+    def __init__(self, backend=None, lease_size: int = QUOTA_LEASE_SIZE):
+        self.backend = backend or create_counter_backend()
+        self.lease_size = lease_size
+        self._buckets: OrderedDict[tuple, TokenBucket] = OrderedDict()
+        # {クォータのキー: 確保済みで未消費の件数}（-1 は当日分を使い切った状態）
+        self._leases: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, sub: str, role: str, tool: str) -> LimitExceeded | None:
+        """リクエスト 1 件分の制限を確認・消費する（超過時は LimitExceeded を返す）"""
+        if not RATE_LIMIT_ENABLED:
+            return None
+        if rate := lookup(RATE_LIMITS, role, tool):
+            wait = self._acquire_token((sub, tool), *rate)
+            if wait:
+                return LimitExceeded(f"Rate limit exceeded: {tool}", retry_after=math.ceil(wait))
+
+        if quota := lookup(DAILY_QUOTAS, role, tool):
+            if not self._acquire_quota(sub, tool, quota):
+                return LimitExceeded(f"Daily quota exceeded: {tool}", retry_after=seconds_until_utc_midnight())
+
+        return None
+
+    def _acquire_token(self, key: tuple, rate: float, capacity: int) -> float:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(rate, capacity)
+                if len(self._buckets) > MAX_TRACKED_KEYS:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket.acquire()
+
+    def _acquire_quota(self, sub: str, tool: str, quota: int) -> bool:
+        key = f"quota:{sub}:{tool}:{datetime.now(timezone.utc):%Y-%m-%d}"
+        with self._lock:
+            remaining = self._leases.get(key, 0)
+            if remaining > 0:
+                self._leases[key] = remaining - 1
+                return True
+            if remaining < 0:
+                return False
+
+        # リースを使い切ったらバックエンドから次の分を確保する
+        lease = min(self.lease_size, quota)
+        total = self.backend.increment(key, lease, expires_at=time.time() + 2 * 24 * 3600)
+        granted = min(lease, quota - (total - lease))
+        with self._lock:
+            if granted <= 0:
+                # 以降はバックエンドに問い合わせずに拒否する
+                self._leases[key] = -1
+                return False
+            self._leases[key] = self._leases.get(key, 0) + granted - 1
+            if len(self._leases) > MAX_TRACKED_KEYS:
+                self._leases.popitem(last=False)
+        return True
+
+
+def seconds_until_utc_midnight() -> int:
+    now = datetime.now(timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return math.ceil((midnight - now).total_seconds())
+
+
+# Lambda 実行環境内で共有する
+rate_limiter = RateLimiter()
@@ -1,30 +1,144 @@
+import hashlib
 import json
 import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
 
 import jwt
+from audit import audit
+from cedar import POLICY_FILE, PolicySet
+from pagination import (
+    UPSTREAM_TOOLS_LIST_URL,
+    fetch_upstream_page,
+    is_refill_request,
+    pagination_enabled,
+    requested_position,
+    shape_page,
+)
+from projections import project_result
+from recorder import record_event
+from response_cache import cache_key, is_cacheable, response_cache
+from timing import SERVER_TIMING_HEADER, StageTimer
 
+TARGET_NAME = os.environ["TARGET_NAME"]
 JWKS_URL = os.environ["JWKS_URL"]
 CLIENT_ID = os.environ["CLIENT_ID"]
 
+# 認可方式（role: ROLE_PERMISSIONS で判定 / cedar: policies.cedar を評価）
+AUTHORIZATION_MODE = os.getenv("AUTHORIZATION_MODE", "role")
+# Cedar ポリシーの resource（Interceptor は自身の Gateway のリクエストのみ受け取るため、既定値のままでよい）
+GATEWAY_ARN = os.getenv("GATEWAY_ARN", "self")
+
+# イベント・出力全体をログに出力する（デバッグ用。大きなツール結果も json.dumps するため既定で無効）
+LOG_FULL_EVENTS = os.getenv("LOG_FULL_EVENTS", "false").lower() == "true"
+# tools/call の結果（content のテキスト等）の上限バイト数（0 で無制限）
+MAX_RESULT_BYTES = int(os.getenv("MAX_RESULT_BYTES", str(1024 * 1024)))
+# 上限を超えた結果の扱い（truncate: 上限まで切り詰める / reject: エラー結果を返す）
+OVERSIZED_RESULT_ACTION = os.getenv("OVERSIZED_RESULT_ACTION", "truncate")
+# ペイロードサイズのメトリクス（CloudWatch Embedded Metric Format）
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_NAMESPACE = os.getenv("METRICS_NAMESPACE", "AgentCoreGateway/Interceptors")
+# tools/list の条件付き取得（クライアントが送信した版とフィルタリング後のツール一覧の版が一致すれば一覧を省略する）
+CATALOG_ETAG_ENABLED = os.getenv("CATALOG_ETAG_ENABLED", "true").lower() == "true"
+# 版を受け渡す _meta のキー（リクエストの params._meta / レスポンスの result._meta）
+CATALOG_VERSION_KEY = "catalogVersion"
+NOT_MODIFIED_KEY = "notModified"
+
 # JWKS クライアントを初期化（キーのキャッシュ機能付き）
 jwks_client = jwt.PyJWKClient(JWKS_URL)
 
 # ============================================
 # ロールベースのアクセス制御設定
 # request/index.py と同じ設定
+#
+# 許可するツールは以下の形式で指定する:
+#   "<tool>"            : 全ターゲットの <tool>
+#   "<target>___<tool>" : <target> の <tool> のみ
+#   "<target>___*"      : <target> の全ツール
+#   "*"                 : 全ターゲットの全ツール
 # ============================================
 ROLE_PERMISSIONS = {
     "admin": ["*"],  # 全ツール許可
-    "user": ["retrieve_doc"],  # retrieve_doc のみ許可
+    "user": [f"{TARGET_NAME}___retrieve_doc"],  # このターゲットの retrieve_doc のみ許可
     # guest やその他のロールは許可なし
 }
 
+WILDCARD = "*"
+TARGET_SEPARATOR = "___"
+
+
+@dataclass(frozen=True)
+class RolePermissions:
+    """ロール毎の許可設定を、(target, tool) の判定が O(1) になるよう集合に展開したもの"""
+
+    all_tools: bool = False  # "*"
+    any_target_tools: frozenset = frozenset()  # "<tool>"
+    all_tools_targets: frozenset = frozenset()  # "<target>___*"
+    target_tools: frozenset = frozenset()  # ("<target>", "<tool>")
+
+    def allows(self, target: str, tool: str) -> bool:
+        return (
+            self.all_tools
+            or tool in self.any_target_tools
+            or target in self.all_tools_targets
+            or (target, tool) in self.target_tools
+        )
 
-def decode_jwt_payload(token: str) -> dict:
+
+@lru_cache(maxsize=4096)
+def parse_tool_name(name: str) -> tuple[str, str]:
+    """Gateway のツール名 "<target>___<tool>" を (target, tool) に分解する
+
+    ターゲットの付かない名前（x_amz_bedrock_agentcore_search 等のシステムツール）は target を "" とする。
+    """
+    target, sep, tool = name.partition(TARGET_SEPARATOR)
+    return (target, tool) if sep else ("", name)
+
+
+def build_permission_index(role_permissions: dict) -> dict[str, RolePermissions]:
+    """ROLE_PERMISSIONS からロール毎の判定用インデックスを作成する"""
+    index = {}
+    for role, entries in role_permissions.items():
+        any_target_tools, all_tools_targets, target_tools = set(), set(), set()
+        for entry in entries:
+            if entry == WILDCARD:
+                index[role] = RolePermissions(all_tools=True)
+                break
+            target, tool = parse_tool_name(entry)
+            if not target:
+                any_target_tools.add(tool)
+            elif tool == WILDCARD:
+                all_tools_targets.add(target)
+            else:
+                target_tools.add((target, tool))
+        else:
+            index[role] = RolePermissions(
+                any_target_tools=frozenset(any_target_tools),
+                all_tools_targets=frozenset(all_tools_targets),
+                target_tools=frozenset(target_tools),
+            )
+    return index
+
+
+# モジュール読み込み時に 1 度だけ作成する
+PERMISSION_INDEX = build_permission_index(ROLE_PERMISSIONS)
+NO_PERMISSIONS = RolePermissions()
+
+# Cedar ポリシーはコールドスタート時に 1 度だけコンパイルする
+POLICY_SET = (
+    PolicySet.from_template(POLICY_FILE, targetName=TARGET_NAME, gatewayArn=GATEWAY_ARN)
+    if AUTHORIZATION_MODE == "cedar"
+    else None
+)
+
+
+def decode_jwt_payload(token: str, timer: StageTimer = None) -> dict:
     """JWT トークンを検証してペイロードを取得する。
 
     Args:
         token: Bearer トークンから抽出した JWT 文字列
+        timer: 指定時は JWKS の取得（jwks）と署名・クレームの検証（jwt）の処理時間を記録する
 
     Returns:
         検証済みの JWT クレーム
@@ -34,6 +148,8 @@ def decode_jwt_payload(token: str) -> dict:
     """
     # JWKS から署名キーを取得
     signing_key = jwks_client.get_signing_key_from_jwt(token)
+    if timer:
+        timer.lap("jwks")
 
     # トークンを検証してデコード
     claims = jwt.decode(
@@ -51,72 +167,400 @@ def decode_jwt_payload(token: str) -> dict:
     if claims.get("token_use") != "access":
         raise jwt.InvalidTokenError("Invalid token_use")
 
+    if timer:
+        timer.lap("jwt")
     return claims
 
 
 def filter_tools(tools: list, role: str) -> list:
     """ロールに基づいてツールをフィルタリング"""
-    allowed_tools = ROLE_PERMISSIONS.get(role, [])
-    if not allowed_tools:
-        return []
+    permissions = PERMISSION_INDEX.get(role, NO_PERMISSIONS)
 
     # "*" は全ツール許可
-    if "*" in allowed_tools:
+    if permissions.all_tools:
         return tools
 
-    filtered = []
-    for tool in tools:
-        name = tool.get("name", "")
-        # Tool names are of the form: <target>___<toolName>
-        tool_name = name.split("___")[-1] if "___" in name else name
-        if tool_name in allowed_tools:
-            filtered.append(tool)
-    return filtered
+    # Tool names are of the form: <target>___<toolName>
+    return [tool for tool in tools if permissions.allows(*parse_tool_name(tool.get("name", "")))]
+
+
+def filter_authorized_tools(tools: list, claims: dict) -> list:
+    """認可方式に応じてツールをフィルタリング"""
+    if POLICY_SET is not None:
+        return [tool for tool in tools if POLICY_SET.is_authorized(claims, tool.get("name", ""), GATEWAY_ARN)]
+    return filter_tools(tools, claims.get("role", "guest"))
+
+
+def extract_tools(result) -> list:
+    """フィルタリング対象のツール一覧（tools/list、セマンティック検索の結果）を取得する
+
+    ツール一覧を含まないレスポンス（tools/call の結果等）は空リストを返す。
+    """
+    if not isinstance(result, dict):
+        return []
+    structured = result.get("structuredContent")
+    return result.get("tools", []) or (structured.get("tools", []) if isinstance(structured, dict) else [])
+
+
+def filter_response_tools(body: dict, tools: list, claims: dict | None, timer: StageTimer = None) -> dict:
+    """レスポンスのツール一覧をユーザーの権限でフィルタリングする"""
+    if claims is None:
+        return body
+    try:
+        role = claims.get("role", "guest")
+
+        print(f"[RESPONSE_INTERCEPTOR] Role: {role}")
+        print(f"[RESPONSE_INTERCEPTOR] Tools before filter: {[t.get('name') for t in tools]}")
+
+        started = time.perf_counter()
+        filtered = filter_authorized_tools(tools, claims)
+        elapsed_us = (time.perf_counter() - started) * 1_000_000
+        if timer:
+            timer.lap("filter")
+        print(f"[RESPONSE_INTERCEPTOR] Filter ({AUTHORIZATION_MODE}): {elapsed_us:.1f} us")
+        print(f"[RESPONSE_INTERCEPTOR] Tools after filter: {[t.get('name') for t in filtered]}")
+
+        filtered_body = body.copy()
+        if "structuredContent" in filtered_body["result"]:
+            # For semantic search results
+            filtered_body["result"]["structuredContent"]["tools"] = filtered
+            filtered_body["result"]["content"] = [{"type": "text", "text": json.dumps({"tools": filtered})}]
+        else:
+            # For list_tools results
+            filtered_body["result"]["tools"] = filtered
+        return filtered_body
+    except Exception as e:
+        print(f"[RESPONSE_INTERCEPTOR] Error: {e}")
+        return body
+
+
+def catalog_etag(result: dict) -> str:
+    """フィルタリング後のツール一覧（ページ）の版
+
+    ツール定義と次のページのカーソルのみから計算するため、同じ一覧になるロール・ユーザーは同じ版になる。
+    """
+    canonical = json.dumps(
+        [result.get("tools", []), result.get("nextCursor")], sort_keys=True, ensure_ascii=False, separators=(",", ":")
+    )
+    return f'"{hashlib.blake2b(canonical.encode(), digest_size=12).hexdigest()}"'
+
+
+def requested_catalog_version(request_body: dict) -> str | None:
+    """クライアントが保持しているツール一覧の版（params._meta.catalogVersion）
+
+    If-None-Match ヘッダーは参照しない。一覧を省略した結果（tools: []）は JSON-RPC の結果として返るため、
+    版を明示的に送信したクライアント以外（汎用の MCP クライアントや、ヘッダーを付与するプロキシ経由）には
+    「ツールがない」と解釈されてしまう。
+    """
+    meta = (request_body.get("params") or {}).get("_meta") or {}
+    return meta.get(CATALOG_VERSION_KEY)
+
+
+def apply_catalog_version(body: dict, requested: str | None) -> tuple[dict, str]:
+    """tools/list の結果に版を付与し、クライアントの版と一致する場合は一覧を省略した結果に置き換える
+
+    Returns:
+        (レスポンスボディ, 版)
+    """
+    result = body["result"]
+    etag = catalog_etag(result)
+    if requested == etag:
+        # tools は必須のため空のリストを返す（nextCursor はクライアントが次のページを辿れるように残す）
+        not_modified = {"tools": [], "_meta": {CATALOG_VERSION_KEY: etag, NOT_MODIFIED_KEY: True}}
+        if result.get("nextCursor"):
+            not_modified["nextCursor"] = result["nextCursor"]
+        return {**body, "result": not_modified}, etag
+    meta = {**(result.get("_meta") or {}), CATALOG_VERSION_KEY: etag}
+    return {**body, "result": {**result, "_meta": meta}}, etag
+
+
+def measure_result_bytes(result: dict) -> int:
+    """ツールの実行結果のサイズ（UTF-8 のバイト数）を計測する
+
+    structuredContent は content のテキストと同じ内容のため、content のみを計測する（結果全体は json.dumps しない）。
+    content がない場合のみ structuredContent をシリアライズして計測する。
+    """
+    size = 0
+    for item in result.get("content") or []:
+        if not isinstance(item, dict):
+            continue
+        if item.get("type") == "text":
+            size += len(item.get("text", "").encode())
+        elif "data" in item:
+            # image / audio（base64）
+            size += len(item["data"])
+        elif isinstance(item.get("resource"), dict):
+            resource = item["resource"]
+            size += len(resource.get("text", "").encode()) + len(resource.get("blob", ""))
+    if not size and result.get("structuredContent") is not None:
+        size = len(json.dumps(result["structuredContent"], ensure_ascii=False).encode())
+    return size
+
+
+def _truncation_notice(size: int) -> dict:
+    return {
+        "type": "text",
+        "text": f"[Result truncated: {size} bytes exceeds the limit of {MAX_RESULT_BYTES} bytes]",
+    }
+
+
+def truncate_structured_content(structured: dict, limit: int) -> dict | None:
+    """structuredContent の最も長い配列の末尾の要素を削り、limit バイトに収める
+
+    文字列を途中で切ると outputSchema の検証に失敗するため、配列の要素単位で削る。
+    収められない場合は None を返す。
+    """
+    lists = [key for key, value in structured.items() if isinstance(value, list) and value]
+    if not lists:
+        return None
+    key = max(lists, key=lambda k: len(structured[k]))
+    base = len(json.dumps({**structured, key: []}, ensure_ascii=False).encode())
+    budget = limit - base
+    if budget < 0:
+        return None
+    kept = []
+    for item in structured[key]:
+        # 要素間の "," を含める
+        budget -= len(json.dumps(item, ensure_ascii=False).encode()) + 1
+        if budget < 0:
+            break
+        kept.append(item)
+    return {**structured, key: kept}
+
+
+def truncate_text_content(content: list, limit: int) -> list:
+    """content のテキストを先頭から limit バイトまで残す（limit を超えた後の要素は削除する）"""
+    budget = limit
+    truncated = []
+    for item in content:
+        if budget <= 0:
+            break
+        if isinstance(item, dict) and item.get("type") == "text":
+            encoded = item.get("text", "").encode()
+            if len(encoded) > budget:
+                item = {**item, "text": encoded[:budget].decode(errors="ignore")}
+            budget -= len(encoded)
+        elif budget - len(json.dumps(item)) < 0:
+            # テキスト以外は切り詰められないため、収まらなければ削除する
+            budget = 0
+            break
+        else:
+            budget -= len(json.dumps(item))
+        truncated.append(item)
+    return truncated
+
+
+def limit_result_size(body: dict, size: int) -> tuple[dict, str]:
+    """上限を超えたツールの実行結果を切り詰める、またはエラー結果に置き換える
+
+    Returns:
+        (レスポンスボディ, "truncated" | "rejected")
+    """
+    result = body["result"]
+    if OVERSIZED_RESULT_ACTION == "truncate":
+        # 切り詰めた旨の通知も上限に含めるため、通知のサイズを除いた分に切り詰める
+        notice = _truncation_notice(size)
+        limit = MAX_RESULT_BYTES - len(notice["text"].encode())
+        structured = result.get("structuredContent")
+        truncated_result = None
+        if isinstance(structured, dict):
+            truncated = truncate_structured_content(structured, limit)
+            if truncated is not None:
+                content = [{"type": "text", "text": json.dumps(truncated, ensure_ascii=False)}, notice]
+                truncated_result = {**result, "structuredContent": truncated, "content": content}
+        elif structured is None:
+            content = truncate_text_content(result.get("content") or [], limit)
+            truncated_result = {**result, "content": [*content, notice]}
+        if truncated_result is not None and measure_result_bytes(truncated_result) <= MAX_RESULT_BYTES:
+            return {**body, "result": truncated_result}, "truncated"
+
+    # isError の結果はクライアントの outputSchema 検証の対象外で、エージェントが条件を変えて再試行できる
+    message = (
+        f"Tool result too large: {size} bytes exceeds the limit of {MAX_RESULT_BYTES} bytes. "
+        "Narrow the request (e.g. a smaller top_k or a shorter period)."
+    )
+    return {**body, "result": {"content": [{"type": "text", "text": message}], "isError": True}}, "rejected"
+
+
+def emit_result_metrics(tool_name: str, size: int, action: str):
+    """ツールの実行結果のサイズを CloudWatch Embedded Metric Format で出力する"""
+    if not METRICS_ENABLED:
+        return
+    print(
+        json.dumps(
+            {
+                "_aws": {
+                    "Timestamp": int(time.time() * 1000),
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": METRICS_NAMESPACE,
+                            "Dimensions": [["Tool"]],
+                            "Metrics": [
+                                {"Name": "ResultBytes", "Unit": "Bytes"},
+                                {"Name": "ResultTruncated", "Unit": "Count"},
+                                {"Name": "ResultRejected", "Unit": "Count"},
+                            ],
+                        }
+                    ],
+                },
+                "Tool": tool_name,
+                "ResultBytes": size,
+                "ResultTruncated": int(action == "truncated"),
+                "ResultRejected": int(action == "rejected"),
+            }
+        )
+    )
+
+
+def claims_from_auth(auth: str, timer: StageTimer = None) -> dict | None:
+    """Authorization ヘッダーのトークンを検証してクレームを取得する（トークンが無効な場合は None）"""
+    try:
+        token = auth.replace("Bearer ", "") if auth.startswith("Bearer ") else ""
+        return decode_jwt_payload(token, timer)
+    except Exception as e:
+        print(f"[RESPONSE_INTERCEPTOR] Invalid token: {e}")
+        return None
+
+
+def paginate_tools(body: dict, request_body: dict, claims: dict, auth: str) -> dict:
+    """フィルタリング後の tools/list のページを TOOLS_PAGE_SIZE 件に整形し、足りなければ上流から補充する"""
+    role = claims.get("role", "guest")
+    result = body["result"]
+    position = requested_position(request_body, role)
+
+    def fetch_page(cursor: str) -> tuple[list, str | None]:
+        tools, next_cursor = fetch_upstream_page(auth, cursor, role)
+        return filter_authorized_tools(tools, claims), next_cursor
+
+    tools, next_cursor, calls = shape_page(
+        result.get("tools", []),
+        result.get("nextCursor"),
+        position,
+        role,
+        fetch_page if UPSTREAM_TOOLS_LIST_URL else None,
+    )
+    print(
+        f"[RESPONSE_INTERCEPTOR] Page: {len(tools)} tools "
+        f"(offset={position[1]}, refills={calls}, more={bool(next_cursor)})"
+    )
+    page = {key: value for key, value in result.items() if key != "nextCursor"}
+    page["tools"] = tools
+    if next_cursor:
+        page["nextCursor"] = next_cursor
+    return {**body, "result": page}
+
+
+def cache_tool_result(request_body: dict, response_body: dict, role: str):
+    """冪等なツールの実行結果をキャッシュに保存する（Request Interceptor が次回以降に使用）"""
+    params = request_body.get("params") or {}
+    target, tool = parse_tool_name(params.get("name", ""))
+    result = response_body.get("result")
+    if not is_cacheable(tool) or not isinstance(result, dict) or result.get("isError"):
+        return
+    key = cache_key(role, target, tool, params.get("arguments") or {})
+    if response_cache.put(key, tool, result):
+        print(f"[RESPONSE_INTERCEPTOR] Cached: {params.get('name')} (role={role})")
 
 
 def lambda_handler(event, context):
-    print(f"[RESPONSE_INTERCEPTOR] Event: {json.dumps(event)}")
+    timer = StageTimer("resp")
+    mcp = event.get("mcp", {})
+    output = handle_response(event, timer)
+    # Gateway が Request Interceptor の Server-Timing を引き継いだ場合は、その後ろに追加する
+    request_headers = mcp.get("gatewayRequest", {}).get("headers") or {}
+    upstream = request_headers.get(SERVER_TIMING_HEADER) or request_headers.get(SERVER_TIMING_HEADER.lower(), "")
+    timer.add_header(output, upstream)
+    timer.emit_metrics((mcp.get("gatewayRequest", {}).get("body") or {}).get("method", ""), "returned")
+    return output
+
+
+def handle_response(event, timer: StageTimer):
+    record_event("response", event)
+    if LOG_FULL_EVENTS:
+        print(f"[RESPONSE_INTERCEPTOR] Event: {json.dumps(event)}")
 
     mcp = event.get("mcp", {})
     resp = mcp.get("gatewayResponse", {})
     headers = resp.get("headers", {})
     body = resp.get("body") or {}  # the body of notifications/initialized is null
     auth = headers.get("Authorization", "")
+    request_body = mcp.get("gatewayRequest", {}).get("body") or {}
+    method = request_body.get("method", "")
 
-    print(f"[RESPONSE_INTERCEPTOR] Has auth: {bool(auth)}")
-    print(f"[RESPONSE_INTERCEPTOR] Body keys: {list(body.keys()) if body else 'empty'}")
-
-    result = body.get("result", {})
-    tools = result.get("tools", []) or result.get("structuredContent", {}).get("tools", [])
+    print(f"[RESPONSE_INTERCEPTOR] Method: {method or 'unknown'}, Has auth: {bool(auth)}")
+    timer.lap("parse")
 
-    if not tools:
-        print("[RESPONSE_INTERCEPTOR] No tools in response, skipping filter")
-        filtered_body = body
+    tools = extract_tools(body.get("result"))
+    # トークンの検証はレスポンス毎に 1 度のみ行う
+    claims = claims_from_auth(auth, timer) if tools or method in ("tools/list", "tools/call") else None
+    if tools:
+        before = len(tools)
+        filtered_body = filter_response_tools(body, tools, claims, timer)
+        if claims is None:
+            audit("response", "unverified", "invalid_token", None, method, latency_ms=timer.total, tools_before=before)
+        else:
+            after = len(extract_tools(filtered_body.get("result")))
+            audit(
+                "response",
+                "filter",
+                f"tools_filtered ({AUTHORIZATION_MODE})",
+                claims,
+                method,
+                latency_ms=timer.total,
+                tools_before=before,
+                tools_after=after,
+            )
     else:
-        try:
-            token = auth.replace("Bearer ", "") if auth.startswith("Bearer ") else ""
-            claims = decode_jwt_payload(token)
-            role = claims.get("role", "guest")
-
-            print(f"[RESPONSE_INTERCEPTOR] Role: {role}")
-            print(f"[RESPONSE_INTERCEPTOR] Tools before filter: {[t.get('name') for t in tools]}")
-
-            filtered = filter_tools(tools, role)
-            print(f"[RESPONSE_INTERCEPTOR] Tools after filter: {[t.get('name') for t in filtered]}")
-
-            filtered_body = body.copy()
-            if "structuredContent" in filtered_body["result"]:
-                # For semantic search results
-                filtered_body["result"]["structuredContent"]["tools"] = filtered
-                filtered_body["result"]["content"] = [
-                    {"type": "text", "text": json.dumps({"tools": filtered})}
-                ]
-            else:
-                # For list_tools results
-                filtered_body["result"]["tools"] = filtered
-        except Exception as e:
-            print(f"[RESPONSE_INTERCEPTOR] Error: {e}")
-            filtered_body = body
+        # ツール一覧を含まないレスポンス（tools/call の結果等）はボディを変更せずにそのまま返す
+        filtered_body = body
+
+    # 補充のための呼び出し（Interceptor 自身が署名したマーカーを持つリクエスト）は、上流のカーソルのまま返す
+    if (
+        method == "tools/list"
+        and claims is not None
+        and isinstance(filtered_body.get("result"), dict)
+        and pagination_enabled()
+        and not is_refill_request(request_body, claims.get("role", "guest"))
+    ):
+        filtered_body = paginate_tools(filtered_body, request_body, claims, auth)
+        timer.lap("paginate")
+
+    etag = None
+    if CATALOG_ETAG_ENABLED and method == "tools/list" and isinstance(filtered_body.get("result"), dict):
+        requested = requested_catalog_version(request_body)
+        filtered_body, etag = apply_catalog_version(filtered_body, requested)
+        print(f"[RESPONSE_INTERCEPTOR] Catalog version: {etag} (not modified: {requested == etag})")
+        timer.lap("etag")
+
+    if method == "tools/call" and isinstance(body.get("result"), dict):
+        tool_name = (request_body.get("params") or {}).get("name", "")
+        role = claims.get("role", "guest") if claims is not None else None
+        # ロールに応じてフィールドを秘匿する（トークンが無効な場合は最も制限の強い guest として扱う）
+        result = project_result(role or "guest", parse_tool_name(tool_name)[1], body["result"])
+        if result is not body["result"]:
+            filtered_body = {**body, "result": result}
+        timer.lap("project")
+        size = measure_result_bytes(result)
+        action = "passed"
+        if MAX_RESULT_BYTES and size > MAX_RESULT_BYTES:
+            filtered_body, action = limit_result_size(filtered_body, size)
+        timer.lap("size_limit")
+        print(f"[RESPONSE_INTERCEPTOR] Result: {tool_name} {size} bytes ({action})")
+        audit(
+            "response",
+            "redact" if result is not body["result"] else "allow",
+            f"result_{action}",
+            claims,
+            method,
+            tool_name,
+            timer.total,
+            result_bytes=size,
+        )
+        emit_result_metrics(tool_name, size, action)
+        # 切り詰めた結果はキャッシュしない
+        if action == "passed" and role is not None:
+            cache_tool_result(request_body, filtered_body, role)
+        timer.lap("cache")
 
     output = {
         "interceptorOutputVersion": "1.0",
@@ -128,5 +572,9 @@ def lambda_handler(event, context):
             }
         },
     }
-    print(f"[RESPONSE_INTERCEPTOR] Output: {json.dumps(output)}")
+    if etag:
+        output["mcp"]["transformedGatewayResponse"]["headers"]["ETag"] = etag
+    if LOG_FULL_EVENTS:
+        print(f"[RESPONSE_INTERCEPTOR] Output: {json.dumps(output)}")
+        timer.lap("serialize")
     return output
@@ -0,0 +1,192 @@
+"""
+ツールの実行結果のフィールド単位の秘匿（ロール・ツール毎のプロジェクション）
+
+ツール単位のフィルタリングに加えて、ロールに応じて結果の一部のフィールドを秘匿・削除する。
+ルールは PROJECTION_RULES に宣言し、(role, tool) 毎に 1 度だけ、ルールのあるフィールドのみを
+辿る専用の関数にコンパイルしてキャッシュする（フィールド毎に結果全体を再帰的に走査しない）。
+
+パスの形式:
+    "data_source_id"        : トップレベルのフィールド
+    "period.start"          : ネストしたオブジェクトのフィールド
+    "documents[].content"   : 配列の各要素のフィールド
+"""
+
+import json
+import os
+from functools import lru_cache
+
+# 一般ユーザーに本文を見せないドキュメント ID（カンマ区切り）
+SENSITIVE_DOC_IDS = frozenset(
+    s.strip() for s in os.getenv("SENSITIVE_DOC_IDS", "doc-003").split(",") if s.strip()
+)
+
+REDACTED = "[REDACTED]"
+
+
+# ============================================
+# ルール（パスと、フィールドを含むオブジェクトに対する操作）
+# ============================================
+class Rule:
+    def __init__(self, path: str, apply):
+        self.path = path
+        # apply(obj, key): obj（コピー済み）の key を書き換える
+        self.apply = apply
+
+
+def redact(path: str, when=None, replacement=REDACTED) -> Rule:
+    """フィールドの値を置き換える（when を指定した場合は、フィールドを含むオブジェクトが条件を満たす場合のみ）"""
+
+    def apply(obj: dict, key: str):
+        if key in obj and (when is None or when(obj)):
+            obj[key] = replacement
+
+    return Rule(path, apply)
+
+
+def drop(path: str) -> Rule:
+    """フィールドを削除する"""
+
+    def apply(obj: dict, key: str):
+        obj.pop(key, None)
+
+    return Rule(path, apply)
+
+
+def mask(path: str, keep: int = 4) -> Rule:
+    """文字列の末尾 keep 文字以外を * に置き換える"""
+
+    def apply(obj: dict, key: str):
+        value = obj.get(key)
+        if isinstance(value, str):
+            obj[key] = "*" * max(len(value) - keep, 0) + value[-keep:] if keep else "*" * len(value)
+
+    return Rule(path, apply)
+
+
+def field_in(name: str, values: frozenset):
+    """オブジェクトのフィールドの値が values に含まれる（redact の when に指定する）"""
+    return lambda obj: obj.get(name) in values
+
+
+# ============================================
+# ロール・ツール毎のプロジェクション
+# 形式: {tool: {role: [ルール, ...]}}（role "*" は個別指定のないロールに適用、空リストはそのまま返す）
+# ============================================
+PROJECTION_RULES = {
+    "retrieve_doc": {
+        "admin": [],
+        "*": [redact("documents[].content", when=field_in("id", SENSITIVE_DOC_IDS))],
+    },
+    "sync_data_source": {
+        "admin": [],
+        "*": [mask("data_source_id")],
+    },
+    "delete_data_source": {
+        "admin": [],
+        "*": [mask("data_source_id")],
+    },
+    "get_query_log": {
+        "admin": [],
+        # 件数の集計のみ返し、クエリの文字列は返さない
+        "*": [drop("logs[].query"), drop("top_queries[].query"), drop("zero_result_queries[].query")],
+    },
+}
+
+
+# ============================================
+# コンパイル
+# ============================================
+def _build_tree(rules: list[Rule]) -> dict:
+    """ルールのパスを 1 つの木にまとめる
+
+    ノード: {"fields": {key: ノード}, "items": ノード（配列の要素）, "rules": [(key, apply), ...]}
+    同じオブジェクトに対するルールは同じノードにまとまるため、結果は 1 度の走査で変換できる。
+    """
+    root = {"fields": {}, "items": None, "rules": []}
+    for rule in rules:
+        node = root
+        *parents, leaf = rule.path.split(".")
+        for segment in parents:
+            name, is_list = (segment[:-2], True) if segment.endswith("[]") else (segment, False)
+            node = node["fields"].setdefault(name, {"fields": {}, "items": None, "rules": []})
+            if is_list:
+                if node["items"] is None:
+                    node["items"] = {"fields": {}, "items": None, "rules": []}
+                node = node["items"]
+        node["rules"].append((leaf, rule.apply))
+    return root
+
+
+def _compile_object(node: dict):
+    """オブジェクトのノードを変換関数にコンパイルする（ルールのあるフィールドのみコピー・変換する）"""
+    children = tuple((key, _compile_value(child)) for key, child in node["fields"].items())
+    rules = tuple(node["rules"])
+
+    def project(obj):
+        if not isinstance(obj, dict):
+            return obj
+        projected = dict(obj)
+        for key, child in children:
+            if key in projected:
+                projected[key] = child(projected[key])
+        for key, apply in rules:
+            apply(projected, key)
+        return projected
+
+    return project
+
+
+def _compile_value(node: dict):
+    if node["items"] is None:
+        return _compile_object(node)
+    project_item = _compile_object(node["items"])
+
+    def project_list(value):
+        if not isinstance(value, list):
+            return value
+        return [project_item(item) for item in value]
+
+    return project_list
+
+
+@lru_cache(maxsize=1024)
+def get_projector(role: str, tool: str):
+    """(role, tool) の変換関数を返す（ルールがなければ None。初回のみコンパイルし、以降はキャッシュを使用）"""
+    by_role = PROJECTION_RULES.get(tool, {})
+    rules = by_role.get(role, by_role.get("*", ()))
+    if not rules:
+        return None
+    return _compile_object(_build_tree(list(rules)))
+
+
+def project_result(role: str, tool: str, result: dict) -> dict:
+    """tools/call の結果にプロジェクションを適用する
+
+    structuredContent がある場合は変換後の値から text の content を作り直す（text の JSON を解析し直さない）。
+    structuredContent がない場合は text の content を JSON として解析して変換し、
+    JSON でないテキストはルールを適用できないため秘匿する。
+    """
+    projector = get_projector(role, tool)
+    if projector is None or not isinstance(result, dict) or result.get("isError"):
+        return result
+
+    structured = result.get("structuredContent")
+    if isinstance(structured, dict):
+        projected = projector(structured)
+        return {
+            **result,
+            "structuredContent": projected,
+            "content": [{"type": "text", "text": json.dumps(projected, ensure_ascii=False, indent=2)}],
+        }
+
+    content = []
+    for item in result.get("content") or []:
+        if isinstance(item, dict) and item.get("type") == "text":
+            try:
+                value = json.loads(item.get("text", ""))
+            except ValueError:
+                value = None
+            text = json.dumps(projector(value), ensure_ascii=False, indent=2) if isinstance(value, dict) else REDACTED
+            item = {**item, "text": text}
+        content.append(item)
+    return {**result, "content": content}
@@ -1,5 +1,7 @@
 import * as cdk from "aws-cdk-lib";
+import * as dynamodb from "aws-cdk-lib/aws-dynamodb";
 import * as lambda from "aws-cdk-lib/aws-lambda";
+import * as secretsmanager from "aws-cdk-lib/aws-secretsmanager";
 import { Construct } from "constructs";
 import * as path from "path";
 
@@ -8,7 +10,7 @@ import * as path from "path";
  */
 export interface InterceptorLambdaConstructProps {
   /**
-   * ターゲット名（Request Interceptor Lambda で使用）
+   * ターゲット名（Request/Response Interceptor Lambda の権限設定で使用）
    */
   readonly targetName: string;
 
@@ -21,18 +23,31 @@ export interface InterceptorLambdaConstructProps {
    * Cognito Client ID（Request/Response Interceptor Lambda で使用）
    */
   readonly clientId: string;
+
+  /**
+   * 認可方式（オプション、デフォルト: "role"）
+   * - "role": Lambda 内の ROLE_PERMISSIONS で判定
+   * - "cedar": Lambda レイヤーに同梱した Cedar ポリシー（policies.cedar）を評価
+   */
+  readonly authorizationMode?: "role" | "cedar";
 }
 
 /**
  * Interceptor Lambda Functions Construct
  *
  * 以下のリソースを作成:
- * - 共有の依存関係レイヤー
+ * - 共有の依存関係レイヤー（Request / Response Interceptor の共通モジュールを含む）
+ * - レスポンスキャッシュ用 DynamoDB テーブル（Request / Response Interceptor で共有）
+ * - 日次クォータのカウンター用 DynamoDB テーブル（Request Interceptor の全実行環境で共有）
+ * - tools/list のカーソルの署名鍵（Request / Response Interceptor で共有）
  * - Request Interceptor Lambda
  * - Response Interceptor Lambda
  */
 export class InterceptorLambdaConstruct extends Construct {
   public readonly depsLayer: lambda.LayerVersion;
+  public readonly responseCacheTable: dynamodb.Table;
+  public readonly quotaTable: dynamodb.Table;
+  public readonly cursorSigningSecret: secretsmanager.Secret;
   public readonly requestInterceptor: lambda.Function;
   public readonly responseInterceptor: lambda.Function;
 
@@ -43,9 +58,10 @@ export class InterceptorLambdaConstruct extends Construct {
   ) {
     super(scope, id);
 
-    const { targetName, jwksUrl, clientId } = props;
+    const { targetName, jwksUrl, clientId, authorizationMode = "role" } = props;
 
     // Lambda Layer for dependencies
+    // Request / Response Interceptor で共有するモジュール（lambda/layer/python）も同じレイヤーに含める
     this.depsLayer = new lambda.LayerVersion(this, "DepsLayer", {
       code: lambda.Code.fromAsset(path.join(__dirname, "../../lambda/layer"), {
         bundling: {
@@ -54,7 +70,7 @@ export class InterceptorLambdaConstruct extends Construct {
           command: [
             "bash",
             "-c",
-            "pip install -r requirements.txt -t /asset-output/python --platform manylinux2014_aarch64 --only-binary=:all:",
+            "pip install -r requirements.txt -t /asset-output/python --platform manylinux2014_aarch64 --only-binary=:all: && cp -r python/. /asset-output/python/",
           ],
         },
       }),
@@ -62,6 +78,31 @@ export class InterceptorLambdaConstruct extends Construct {
       compatibleArchitectures: [lambda.Architecture.ARM_64],
     });
 
+    // Response Cache Table
+    // Response Interceptor が冪等なツールの結果を保存し、Request Interceptor が参照する
+    this.responseCacheTable = new dynamodb.Table(this, "ResponseCacheTable", {
+      partitionKey: { name: "pk", type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: "expires_at",
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // Quota Table
+    // Request Interceptor がユーザー・ツール毎の日次クォータを集計する（全実行環境で共有するアトミックカウンター）
+    this.quotaTable = new dynamodb.Table(this, "QuotaTable", {
+      partitionKey: { name: "pk", type: dynamodb.AttributeType.STRING },
+      billingMode: dynamodb.BillingMode.PAY_PER_REQUEST,
+      timeToLiveAttribute: "expires_at",
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
+    // Cursor Signing Secret
+    // Response Interceptor が tools/list のカーソルと補充のマーカーに署名し、Request / Response Interceptor が検証する
+    this.cursorSigningSecret = new secretsmanager.Secret(this, "CursorSigningSecret", {
+      generateSecretString: { passwordLength: 64, excludePunctuation: true },
+      removalPolicy: cdk.RemovalPolicy.DESTROY,
+    });
+
     // Request Interceptor Lambda
     // Uses custom claims (role, allowed_tools) for authorization
     this.requestInterceptor = new lambda.Function(this, "RequestInterceptor", {
@@ -76,8 +117,16 @@ export class InterceptorLambdaConstruct extends Construct {
         TARGET_NAME: targetName,
         JWKS_URL: jwksUrl,
         CLIENT_ID: clientId,
+        AUTHORIZATION_MODE: authorizationMode,
+        RESPONSE_CACHE_TABLE_NAME: this.responseCacheTable.tableName,
+        QUOTA_TABLE_NAME: this.quotaTable.tableName,
+        CURSOR_SIGNING_SECRET_ARN: this.cursorSigningSecret.secretArn,
       },
     });
+    this.responseCacheTable.grantReadData(this.requestInterceptor);
+    // UpdateItem（ADD）でカウンターを加算する
+    this.quotaTable.grantReadWriteData(this.requestInterceptor);
+    this.cursorSigningSecret.grantRead(this.requestInterceptor);
 
     // Response Interceptor Lambda
     this.responseInterceptor = new lambda.Function(
@@ -94,10 +143,16 @@ export class InterceptorLambdaConstruct extends Construct {
         timeout: cdk.Duration.seconds(30),
         description: `[RESPONSE] AgentCore Gateway Interceptor for ${targetName}`,
         environment: {
+          TARGET_NAME: targetName,
           JWKS_URL: jwksUrl,
           CLIENT_ID: clientId,
+          AUTHORIZATION_MODE: authorizationMode,
+          RESPONSE_CACHE_TABLE_NAME: this.responseCacheTable.tableName,
+          CURSOR_SIGNING_SECRET_ARN: this.cursorSigningSecret.secretArn,
         },
       }
     );
+    this.responseCacheTable.grantWriteData(this.responseInterceptor);
+    this.cursorSigningSecret.grantRead(this.responseInterceptor);
   }
 }
@@ -0,0 +1,190 @@
+"""
+ドキュメントの検索インデックス（メモリマップ）
+
+文字バイグラムの転置インデックスとドキュメントを 1 つのバイナリファイルに書き出し、mmap で読み込む。
+マルチワーカー構成では親プロセスが起動前にインデックスを作成し、各ワーカーは同じファイルを
+読み取り専用でマップするため、ドキュメント・インデックスはワーカー毎に複製されず OS のページキャッシュを共有する。
+
+ファイル形式（リトルエンディアン）:
+    ヘッダー     : magic, コーパスのフィンガープリント, 文書数, 語数, 各セクションのオフセット
+    文書テーブル : (本文のオフセット u64, 長さ u32) x 文書数
+    語テーブル   : (バイグラムのハッシュ u64, ポスティングのオフセット u64, 文書頻度 u32) x 語数（ハッシュ順）
+    ポスティング : (文書番号 u32, BM25 のスコア f32) x ...
+    文書         : JSON（UTF-8）
+
+BM25 のスコア（idf・文書長の正規化を含む）は作成時に計算してポスティングに保存するため、
+検索時はクエリのバイグラム毎にポスティングのスコアを合計するだけでよい。
+"""
+
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+from collections import Counter, defaultdict
+from pathlib import Path
+
+# 形式を変更した場合は更新する（フィンガープリントにも含めるため、古いインデックスは作り直される）
+MAGIC = b"MCPIDX02"
+HEADER = struct.Struct("<8s32sIIQQQ")
+DOC_ENTRY = struct.Struct("<QI")
+TERM_ENTRY = struct.Struct("<QQI")
+POSTING = struct.Struct("<If")
+
+# BM25 のパラメーター
+K1 = 1.2
+B = 0.75
+
+
+def bigrams(text: str) -> Counter:
+    """文字バイグラムの出現回数（空白を除き、大文字・小文字を区別しない）"""
+    text = "".join(text.casefold().split())
+    if len(text) < 2:
+        return Counter([text] if text else [])
+    return Counter(text[i : i + 2] for i in range(len(text) - 1))
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+
+
+def load_corpus(default_documents: list[dict], corpus_path: str = None) -> tuple[list[dict], bytes]:
+    """コーパス（corpus_path の JSONL、なければ default_documents）とそのフィンガープリントを返す"""
+    if corpus_path:
+        raw = Path(corpus_path).read_bytes()
+        documents = [json.loads(line) for line in raw.splitlines() if line.strip()]
+    else:
+        documents = default_documents
+        raw = json.dumps(documents, ensure_ascii=False, sort_keys=True).encode()
+    return documents, hashlib.sha256(MAGIC + raw).digest()
+
+
+def build_index(documents: list[dict], fingerprint: bytes, path: str):
+    """インデックスファイルを作成する（一時ファイルに書き出してから置き換えるため、読み込み中のワーカーに影響しない）"""
+    counts: dict[int, list[tuple[int, int]]] = defaultdict(list)
+    lengths = []
+    doc_entries = []
+    blobs = []
+    offset = 0
+    for doc_id, document in enumerate(documents):
+        grams = bigrams(document.get("content", ""))
+        for term, count in grams.items():
+            counts[term_hash(term)].append((doc_id, count))
+        lengths.append(sum(grams.values()))
+        blob = json.dumps(document, ensure_ascii=False).encode()
+        doc_entries.append((offset, len(blob)))
+        blobs.append(blob)
+        offset += len(blob)
+
+    avg_length = (sum(lengths) / len(lengths) if lengths else 0.0) or 1.0
+    postings = {}
+    for term, entries in counts.items():
+        idf = math.log(1 + (len(documents) - len(entries) + 0.5) / (len(entries) + 0.5))
+        postings[term] = [
+            (doc_id, idf * count * (K1 + 1) / (count + K1 * (1 - B + B * lengths[doc_id] / avg_length)))
+            for doc_id, count in entries
+        ]
+    terms = sorted(postings)
+    term_table_offset = HEADER.size + DOC_ENTRY.size * len(doc_entries)
+    postings_offset = term_table_offset + TERM_ENTRY.size * len(terms)
+    docs_offset = postings_offset + POSTING.size * sum(len(p) for p in postings.values())
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                fingerprint,
+                len(doc_entries),
+                len(terms),
+                term_table_offset,
+                postings_offset,
+                docs_offset,
+            )
+        )
+        for entry in doc_entries:
+            f.write(DOC_ENTRY.pack(*entry))
+        position = 0
+        for term in terms:
+            f.write(TERM_ENTRY.pack(term, position, len(postings[term])))
+            position += POSTING.size * len(postings[term])
+        for term in terms:
+            f.write(b"".join(POSTING.pack(*posting) for posting in postings[term]))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(temporary, path)
+
+
+def read_fingerprint(path: str) -> bytes | None:
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(header) < HEADER.size or header[:8] != MAGIC:
+        return None
+    return HEADER.unpack(header)[1]
+
+
+def ensure_index(default_documents: list[dict], corpus_path: str, index_path: str) -> str:
+    """コーパスのインデックスを作成する（同じコーパスのインデックスがあれば再利用する）"""
+    documents, fingerprint = load_corpus(default_documents, corpus_path)
+    if read_fingerprint(index_path) != fingerprint:
+        build_index(documents, fingerprint, index_path)
+    return index_path
+
+
+class DocumentIndex:
+    """インデックスファイルを読み取り専用でマップし、BM25 でドキュメントを検索する"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        (
+            magic,
+            self.fingerprint,
+            self.size,
+            self.terms,
+            self._term_table,
+            self._postings,
+            self._docs,
+        ) = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a document index")
+
+    def _find_term(self, key: int) -> tuple[int, int] | None:
+        """語テーブルを二分探索し、(ポスティングのオフセット, 文書頻度) を返す"""
+        low, high = 0, self.terms
+        while low < high:
+            middle = (low + high) // 2
+            term, offset, frequency = TERM_ENTRY.unpack_from(self._map, self._term_table + middle * TERM_ENTRY.size)
+            if term == key:
+                return offset, frequency
+            if term < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def document(self, doc_id: int) -> dict:
+        offset, length = DOC_ENTRY.unpack_from(self._map, HEADER.size + doc_id * DOC_ENTRY.size)
+        start = self._docs + offset
+        return json.loads(bytes(self._view[start : start + length]))
+
+    def search(self, query: str, top_k: int) -> tuple[list[dict], int]:
+        """クエリのバイグラムで検索し、(スコア上位 top_k 件のドキュメント, 一致した件数) を返す"""
+        scores: dict[int, float] = defaultdict(float)
+        for term in bigrams(query):
+            found = self._find_term(term_hash(term))
+            if found is None:
+                continue
+            offset, frequency = found
+            start = self._postings + offset
+            for doc_id, score in POSTING.iter_unpack(self._view[start : start + frequency * POSTING.size]):
+                scores[doc_id] += score
+
+        top = heapq.nlargest(max(top_k, 0), scores.items(), key=lambda item: item[1])
+        return [{**self.document(doc_id), "score": round(score, 4)} for doc_id, score in top], len(scores)
@@ -0,0 +1,101 @@
+"""
+ツール呼び出しの並行制御
+
+- ツール毎の並行数の上限: ツールはスレッドプールで実行し（イベントループをブロックしない）、
+  ツール毎の CapacityLimiter でスレッド数を制限する。管理者向けの重いツールが集中しても、
+  retrieve_doc に割り当てたスレッドは使われない
+- シングルフライト: 読み取り専用のツールは、同じ引数で実行中の呼び出しがあれば新たに実行せず、その結果を共有する
+  （マルチワーカー構成ではワーカープロセス毎）
+"""
+
+import asyncio
+import functools
+import json
+import os
+import weakref
+
+import anyio.to_thread
+from anyio import CapacityLimiter
+
+# ツール毎の同時実行数の上限（指定のないツールは DEFAULT_TOOL_CONCURRENCY）
+TOOL_CONCURRENCY = {
+    "retrieve_doc": int(os.getenv("MCP_RETRIEVE_CONCURRENCY", "32")),
+    "sync_data_source": int(os.getenv("MCP_ADMIN_TOOL_CONCURRENCY", "2")),
+    "delete_data_source": int(os.getenv("MCP_ADMIN_TOOL_CONCURRENCY", "2")),
+    "get_query_log": 4,
+}
+DEFAULT_TOOL_CONCURRENCY = 4
+# シングルフライトの有効・無効
+MCP_COALESCE_ENABLED = os.getenv("MCP_COALESCE_ENABLED", "true").lower() == "true"
+
+# {イベントループ: {ツール: CapacityLimiter}}
+# CapacityLimiter は最初に使用したイベントループに紐付くため、同じプロセスで複数のイベントループを使う場合
+# （ローカルのハーネスやテスト等）に共有しないよう、イベントループ毎に作成する（ループの破棄時に削除される）
+_limiters: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, CapacityLimiter]] = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_limiter(tool: str) -> CapacityLimiter:
+    """実行中のイベントループのツール毎の CapacityLimiter（初回の呼び出し時に作成する）"""
+    limiters = _limiters.setdefault(asyncio.get_running_loop(), {})
+    if tool not in limiters:
+        limiters[tool] = CapacityLimiter(TOOL_CONCURRENCY.get(tool, DEFAULT_TOOL_CONCURRENCY))
+    return limiters[tool]
+
+
+class SingleFlight:
+    """同じキーで実行中の処理があれば、その結果を待って共有する"""
+
+    def __init__(self):
+        # タスクは作成したイベントループでしか待てないため、イベントループ毎に保持する
+        self._calls: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[str, asyncio.Task]] = (
+            weakref.WeakKeyDictionary()
+        )
+        self.executed = 0  # 実際に実行した回数
+        self.shared = 0  # 実行中の結果を共有した回数
+
+    async def do(self, key: str, func):
+        calls = self._calls.setdefault(asyncio.get_running_loop(), {})
+        task = calls.get(key)
+        if task is None:
+            self.executed += 1
+            # 呼び出し元とは別のタスクで実行し、最初の呼び出し元がキャンセルされても他の呼び出し元に結果を返す
+            task = asyncio.ensure_future(func())
+            calls[key] = task
+            task.add_done_callback(functools.partial(self._done, calls, key))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def _done(self, calls: dict, key: str, task: asyncio.Task):
+        if calls.get(key) is task:
+            del calls[key]
+        if not task.cancelled():
+            task.exception()  # 待つ呼び出し元がいない場合の "exception was never retrieved" を防ぐ
+
+
+single_flight = SingleFlight()
+
+
+def offload(tool: str, coalesce: bool = False):
+    """同期関数のツールを、ツール毎の並行数の上限付きでスレッドプールで実行する非同期関数にする
+
+    coalesce=True（読み取り専用のツールのみ指定する）の場合は、同じ引数の呼び出しをシングルフライトでまとめる。
+    FastMCP は functools.wraps の __wrapped__ から引数のスキーマを作成する。
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            def run():
+                return anyio.to_thread.run_sync(functools.partial(func, **kwargs), limiter=get_limiter(tool))
+
+            if coalesce and MCP_COALESCE_ENABLED:
+                key = json.dumps([tool, kwargs], sort_keys=True, ensure_ascii=False, default=str)
+                return await single_flight.do(key, run)
+            return await run()
+
+        return wrapper
+
+    return decorator
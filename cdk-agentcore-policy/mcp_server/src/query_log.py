@@ -0,0 +1,250 @@
+"""
+検索クエリのログと集計（ロールアップ）
+
+retrieve_doc の呼び出し毎に、生のログに加えて分・時・日単位の集計行を同じトランザクションで更新する。
+書き込みは専用のスレッドがまとめて行うため、ツールの呼び出し元は待たない。
+get_query_log の期間集計は、期間を日・時・分のバケットに分解して集計行を読み、分に満たない端の部分のみ生のログを読む。
+期間の長さによらず、読む範囲は高々 5 つの集計行の範囲と 2 つの生のログの範囲になる。
+クエリ毎の合算と上位の抽出は SQL（GROUP BY ... ORDER BY ... LIMIT）で行い、上位 TOP_N 件のみを読み出す。
+
+保存先は SQLite（WAL）で、マルチワーカー構成でも全ワーカーが同じファイルに記録する。
+
+デモ用の保存先: 既定の MCP_QUERY_LOG_PATH は AgentCore Runtime のコンテナ内の一時ディレクトリのため、
+セッション・コンテナが入れ替わるとログと集計は失われる。Runtime のインスタンスが複数ある場合は、
+get_query_log はそれを処理したインスタンスが記録した分のみを集計する（インスタンス間で共有しない）。
+本番環境で使う場合は、共有の永続ストアに置き換える必要がある。
+"""
+
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import UTC, datetime
+from functools import lru_cache
+
+# 既定はコンテナ内の一時ディレクトリ（デモ用。コンテナの入れ替えで失われ、インスタンス間で共有されない）
+MCP_QUERY_LOG_PATH = os.getenv("MCP_QUERY_LOG_PATH", os.path.join(tempfile.gettempdir(), "mcp_query_log.db"))
+# 保持期間（日）。期限を過ぎた行は書き込み時に定期的に削除する
+# 期間の端のうち、その粒度の保持期間を過ぎた部分は集計に含まれない（例: 30 日前の端は時単位の精度になる）
+RAW_RETENTION_DAYS = int(os.getenv("MCP_QUERY_LOG_RAW_RETENTION_DAYS", "7"))
+RETENTION_DAYS = {"minute": RAW_RETENTION_DAYS, "hour": 400, "day": 3650}
+PRUNE_INTERVAL = 1000  # 削除を行う書き込み回数の間隔
+WRITE_BATCH_SIZE = 500  # 1 トランザクションで書き込む最大件数
+
+# (名前, バケットの秒数)。大きい順
+GRANULARITIES = (("day", 86400), ("hour", 3600), ("minute", 60))
+TOP_N = 10
+RECENT_LOGS = 20
+
+# クエリ毎に合算し、合計と上位のクエリ・結果 0 件のクエリのみを返す（{rows} は集計行と生のログの UNION ALL）
+SUMMARIZE_QUERIES = """
+WITH per_query AS (
+    SELECT query, SUM(count) AS count, SUM(zero_results) AS zero_results FROM ({rows}) GROUP BY query
+)
+SELECT 'total', NULL, SUM(count), SUM(zero_results) FROM per_query
+UNION ALL
+SELECT * FROM (SELECT 'top', query, count, zero_results FROM per_query ORDER BY count DESC, query LIMIT ?)
+UNION ALL
+SELECT * FROM (
+    SELECT 'zero', query, count, zero_results FROM per_query
+    WHERE zero_results > 0 ORDER BY zero_results DESC, query LIMIT ?
+)
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_log (ts REAL NOT NULL, query TEXT NOT NULL, results INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS query_log_ts ON query_log (ts);
+CREATE TABLE IF NOT EXISTS query_rollup (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    zero_results INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, query)
+) WITHOUT ROWID;
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO query_rollup (granularity, bucket, query, count, zero_results) VALUES (?, ?, ?, 1, ?)
+ON CONFLICT (granularity, bucket, query) DO UPDATE SET
+    count = count + 1, zero_results = zero_results + excluded.zero_results
+"""
+
+
+def decompose(start: int, end: int, level: int = 0) -> tuple[list[tuple[str, int, int]], list[tuple[int, int]]]:
+    """[start, end) を集計行で読めるバケットの範囲と、生のログを読む範囲に分解する
+
+    粒度の大きい順に、境界の揃った内側の範囲を 1 つの範囲として取り、残りの両端を次の粒度で分解する。
+
+    Returns:
+        ([(粒度, 開始, 終了), ...], [(開始, 終了), ...])
+    """
+    if start >= end:
+        return [], []
+    if level == len(GRANULARITIES):
+        return [], [(start, end)]
+    name, size = GRANULARITIES[level]
+    inner_start = -(-start // size) * size
+    inner_end = end // size * size
+    if inner_start >= inner_end:
+        return decompose(start, end, level + 1)
+    left_rollups, left_raw = decompose(start, inner_start, level + 1)
+    right_rollups, right_raw = decompose(inner_end, end, level + 1)
+    return left_rollups + [(name, inner_start, inner_end)] + right_rollups, left_raw + right_raw
+
+
+class QueryLog:
+    def __init__(self, path: str = MCP_QUERY_LOG_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._connect().executescript(SCHEMA)
+        threading.Thread(target=self._writer, name="query-log-writer", daemon=True).start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 の接続はスレッド間で共有できないため、スレッド毎に作成する
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def submit(self, query: str, results: int):
+        """検索クエリの記録を書き込みスレッドに渡す（書き込みを待たない）"""
+        self._queue.put((time.time(), query, results))
+
+    def _writer(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.record(batch)
+            except Exception as e:
+                # ログの書き込みの失敗でサーバーを停止しない
+                print(f"[QUERY_LOG] Write failed: {e}")
+
+    def record(self, records: list[tuple[float, str, int]]):
+        """(時刻, クエリ, 結果の件数) を記録し、分・時・日の集計行を同じトランザクションで更新する"""
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.executemany("INSERT INTO query_log (ts, query, results) VALUES (?, ?, ?)", records)
+            connection.executemany(
+                UPSERT_ROLLUP,
+                [
+                    (name, int(ts) // size * size, query, int(results == 0))
+                    for ts, query, results in records
+                    for name, size in GRANULARITIES
+                ],
+            )
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        previous, self._writes = self._writes, self._writes + len(records)
+        if previous // PRUNE_INTERVAL != self._writes // PRUNE_INTERVAL:
+            self.prune(records[-1][0])
+
+    def prune(self, now: float):
+        connection = self._connect()
+        connection.execute("DELETE FROM query_log WHERE ts < ?", (now - RAW_RETENTION_DAYS * 86400,))
+        for name, days in RETENTION_DAYS.items():
+            connection.execute(
+                "DELETE FROM query_rollup WHERE granularity = ? AND bucket < ?", (name, now - days * 86400)
+            )
+
+    def summarize(self, start: float, end: float) -> dict:
+        """[start, end) の件数・上位のクエリ・結果 0 件のクエリ・推移・直近のログを集計する"""
+        rollups, raw = decompose(int(start), int(end))
+        selects, parameters = [], []
+        for name, bucket_start, bucket_end in rollups:
+            selects.append(
+                "SELECT query, count, zero_results FROM query_rollup"
+                " WHERE granularity = ? AND bucket >= ? AND bucket < ?"
+            )
+            parameters += [name, bucket_start, bucket_end]
+        for raw_start, raw_end in raw:
+            selects.append("SELECT query, 1 AS count, results = 0 AS zero_results FROM query_log WHERE ts >= ? AND ts < ?")
+            parameters += [raw_start, raw_end]
+
+        connection = self._connect()
+        total = zero_results = 0
+        top, zero = [], []
+        if selects:
+            rows = connection.execute(
+                SUMMARIZE_QUERIES.format(rows=" UNION ALL ".join(selects)), [*parameters, TOP_N, TOP_N]
+            ).fetchall()
+            for kind, query, count, zero_count in rows:
+                if kind == "total":
+                    total, zero_results = count or 0, zero_count or 0
+                else:
+                    (top if kind == "top" else zero).append((query, count, zero_count))
+
+        granularity, size = self._series_granularity(end - start)
+        series = connection.execute(
+            "SELECT bucket, SUM(count), SUM(zero_results) FROM query_rollup"
+            " WHERE granularity = ? AND bucket >= ? AND bucket < ? GROUP BY bucket ORDER BY bucket",
+            (granularity, int(start) // size * size, int(end)),
+        ).fetchall()
+        recent = connection.execute(
+            "SELECT ts, query, results FROM query_log WHERE ts >= ? AND ts < ? ORDER BY ts DESC LIMIT ?",
+            (start, end, RECENT_LOGS),
+        ).fetchall()
+
+        return {
+            "total": total,
+            "zero_results": zero_results,
+            # UNION ALL は各部分の順序を保証しないため、上位 TOP_N 件を並べ直す
+            "top_queries": [
+                {"query": query, "count": count} for query, count, _ in sorted(top, key=lambda row: (-row[1], row[0]))
+            ],
+            "zero_result_queries": [
+                {"query": query, "count": zero_count}
+                for query, _, zero_count in sorted(zero, key=lambda row: (-row[2], row[0]))
+            ],
+            "series": {
+                "granularity": granularity,
+                "buckets": [
+                    {"start": _isoformat(bucket), "count": count, "zero_results": zero}
+                    for bucket, count, zero in series
+                ],
+            },
+            "logs": [{"query": query, "timestamp": _isoformat(ts), "results": results} for ts, query, results in recent],
+            # 読んだ範囲（集計行の範囲数・生のログの範囲数）
+            "plan": {"rollup_ranges": len(rollups), "raw_ranges": len(raw)},
+        }
+
+    @staticmethod
+    def _series_granularity(span: float) -> tuple[str, int]:
+        """推移の粒度（バケット数が数十〜数百程度になるように選ぶ）"""
+        if span <= 3 * 3600:
+            return GRANULARITIES[2]
+        if span <= 7 * 86400:
+            return GRANULARITIES[1]
+        return GRANULARITIES[0]
+
+
+def _isoformat(ts: float) -> str:
+    return datetime.fromtimestamp(ts, UTC).isoformat().replace("+00:00", "Z")
+
+
+def parse_datetime(value: str) -> float:
+    """ISO 8601 の日時を UNIX 時刻に変換する（タイムゾーンの指定がなければ UTC）"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=UTC)
+    return parsed.timestamp()
+
+
+@lru_cache(maxsize=1)
+def open_query_log() -> QueryLog:
+    return QueryLog()
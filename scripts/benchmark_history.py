@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク結果の履歴管理と性能劣化の検出
+
+計測スクリプトの結果を、生のレイテンシーと実行環境のメタデータ付きで JSON として保存し、
+ベースラインとの比較（Mann-Whitney U 検定）と履歴の推移表示を行う。
+
+使い方:
+    uv run python benchmark_history.py list
+    uv run python benchmark_history.py promote <run-id>            # ベースラインに設定
+    uv run python benchmark_history.py compare latest               # 最新結果をベースラインと比較
+    uv run python benchmark_history.py compare <run-id> --baseline <run-id>
+    uv run python benchmark_history.py trend --name list_tools_sequential
+
+compare は有意な劣化を検出した場合に終了コード 1 を返すため、CI 等でも利用できる。
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from statistics import NormalDist
+
+from loadgen import summarize
+
+# 結果の保存先
+HISTORY_DIR = Path(os.getenv("BENCHMARK_HISTORY_DIR", Path(__file__).resolve().parent / "benchmark_results"))
+
+# 劣化判定の既定値: 有意水準と、中央値の最小悪化率 (%)
+DEFAULT_ALPHA = 0.01
+DEFAULT_MIN_EFFECT_PCT = 5.0
+
+SCHEMA_VERSION = 1
+
+
+# =============================================================================
+# Persistence
+# =============================================================================
+def git_revision() -> dict:
+    """リポジトリのコミットと未コミット変更の有無を取得する"""
+    cwd = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=cwd, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain"], cwd=cwd, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        )
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def collect_environment(extra: dict = None) -> dict:
+    """実行環境のメタデータを収集する"""
+    return {
+        "hostname": socket.gethostname(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "git": git_revision(),
+        **(extra or {}),
+    }
+
+
+def save_run(name: str, latencies_ms: list[float], config: dict = None, environment: dict = None) -> Path:
+    """計測結果を履歴として保存する
+
+    Args:
+        name: 計測の種類（比較・推移表示はこの単位で行う）
+        latencies_ms: 生のレイテンシー（統計検定に使用）
+        config: 計測設定
+        environment: 追加の環境情報（Gateway URL、リージョン等）
+
+    Returns:
+        保存したファイルのパス
+    """
+    created_at = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{name.replace('/', '_').replace(':', '_')}"
+    record = {
+        "schema": SCHEMA_VERSION,
+        "id": run_id,
+        "name": name,
+        "created_at": created_at,
+        "environment": collect_environment(environment),
+        "config": config or {},
+        "summary": summarize(latencies_ms),
+        "latencies_ms": latencies_ms,
+    }
+    HISTORY_DIR.mkdir(parents=True, exist_ok=True)
+    path = HISTORY_DIR / f"{run_id}.json"
+    path.write_text(json.dumps(record, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+def load_runs(name: str = None) -> list[dict]:
+    """保存済みの結果を古い順に読み込む"""
+    runs = []
+    for path in sorted(HISTORY_DIR.glob("*.json")):
+        record = json.loads(path.read_text(encoding="utf-8"))
+        if name is None or record["name"] == name:
+            runs.append(record)
+    return runs
+
+
+def baseline_path(name: str) -> Path:
+    return HISTORY_DIR / "baselines" / f"{name.replace('/', '_').replace(':', '_')}.json"
+
+
+def resolve_run(ref: str, name: str = None) -> dict:
+    """結果の参照（ファイルパス / run ID / "latest"）を読み込む"""
+    if ref == "latest":
+        runs = load_runs(name)
+        if not runs:
+            raise SystemExit(f"No runs found{f' for {name}' if name else ''}")
+        return runs[-1]
+    path = Path(ref)
+    if not path.exists():
+        path = HISTORY_DIR / f"{ref}.json"
+    if not path.exists():
+        raise SystemExit(f"Run not found: {ref}")
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+# =============================================================================
+# Statistics
+# =============================================================================
+def mann_whitney_u(baseline: list[float], candidate: list[float]) -> tuple[float, float]:
+    """Mann-Whitney U 検定（片側: candidate が baseline より大きい）
+
+    正規近似（同順位補正・連続性補正あり）で p 値を計算する。
+
+    Returns:
+        (candidate の U 統計量, p 値)
+    """
+    n1, n2 = len(baseline), len(candidate)
+    combined = sorted([(v, 0) for v in baseline] + [(v, 1) for v in candidate])
+
+    # 同順位は平均順位を割り当てる
+    rank_sum_candidate = 0.0
+    tie_term = 0.0
+    i = 0
+    while i < len(combined):
+        j = i
+        while j + 1 < len(combined) and combined[j + 1][0] == combined[i][0]:
+            j += 1
+        average_rank = (i + j) / 2 + 1
+        ties = j - i + 1
+        tie_term += ties**3 - ties
+        rank_sum_candidate += average_rank * sum(1 for k in range(i, j + 1) if combined[k][1] == 1)
+        i = j + 1
+
+    u = rank_sum_candidate - n2 * (n2 + 1) / 2
+    n = n1 + n2
+    mean_u = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0
+    z = (u - mean_u - 0.5) / math.sqrt(variance)
+    return u, 1 - NormalDist().cdf(z)
+
+
+def compare_runs(
+    baseline: dict, candidate: dict, alpha: float = DEFAULT_ALPHA, min_effect_pct: float = DEFAULT_MIN_EFFECT_PCT
+) -> dict:
+    """2 つの結果を比較し、劣化の有無を判定する
+
+    統計的に有意 (p < alpha) かつ中央値の悪化率が min_effect_pct 以上の場合を劣化とみなす。
+    （サンプル数が多いと僅かな差でも有意になるため、実用上の差の大きさも条件に含める）
+    """
+    base_latencies = baseline["latencies_ms"]
+    new_latencies = candidate["latencies_ms"]
+    if len(base_latencies) < 2 or len(new_latencies) < 2:
+        raise SystemExit("Both runs need at least 2 samples to compare")
+
+    u, p_value = mann_whitney_u(base_latencies, new_latencies)
+    base_summary = summarize(base_latencies)
+    new_summary = summarize(new_latencies)
+    median_change_pct = (new_summary["p50"] / base_summary["p50"] - 1) * 100
+    p99_change_pct = (new_summary["p99"] / base_summary["p99"] - 1) * 100
+
+    return {
+        "baseline": baseline["id"],
+        "candidate": candidate["id"],
+        "u_statistic": u,
+        "p_value": p_value,
+        "alpha": alpha,
+        "median_change_pct": median_change_pct,
+        "p99_change_pct": p99_change_pct,
+        "min_effect_pct": min_effect_pct,
+        "baseline_summary": base_summary,
+        "candidate_summary": new_summary,
+        "regression": p_value < alpha and median_change_pct >= min_effect_pct,
+    }
+
+
+# =============================================================================
+# Reports
+# =============================================================================
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+
+def sparkline(values: list[float]) -> str:
+    if not values:
+        return ""
+    low, high = min(values), max(values)
+    span = (high - low) or 1.0
+    return "".join(SPARK_CHARS[int((v - low) / span * (len(SPARK_CHARS) - 1))] for v in values)
+
+
+def format_comparison(result: dict) -> str:
+    base, new = result["baseline_summary"], result["candidate_summary"]
+    verdict = "✗ REGRESSION" if result["regression"] else "✓ OK"
+    return "\n".join(
+        [
+            "=" * 60,
+            f"=== ベースライン比較: {verdict} ===",
+            "=" * 60,
+            f"ベースライン: {result['baseline']} (n={base['count']})",
+            f"比較対象:     {result['candidate']} (n={new['count']})",
+            f"p50:          {base['p50']:.2f} ms → {new['p50']:.2f} ms ({result['median_change_pct']:+.2f}%)",
+            f"p99:          {base['p99']:.2f} ms → {new['p99']:.2f} ms ({result['p99_change_pct']:+.2f}%)",
+            f"平均:         {base['mean']:.2f} ms → {new['mean']:.2f} ms",
+            f"Mann-Whitney U: p = {result['p_value']:.4g} (alpha = {result['alpha']}, "
+            f"最小悪化率 {result['min_effect_pct']}%)",
+            "=" * 60,
+        ]
+    )
+
+
+def format_trend(runs: list[dict]) -> str:
+    lines = [
+        f"{'run':<44}{'commit':<10}{'n':>6}{'mean':>10}{'p50':>10}{'p99':>10}{'Δp50':>9}",
+    ]
+    previous_p50 = None
+    for run in runs:
+        summary = run["summary"]
+        commit = (run["environment"].get("git", {}).get("commit") or "-")[:8]
+        delta = f"{(summary['p50'] / previous_p50 - 1) * 100:+.1f}%" if previous_p50 else "-"
+        lines.append(
+            f"{run['id']:<44}{commit:<10}{summary['count']:>6}{summary['mean']:>10.2f}"
+            f"{summary['p50']:>10.2f}{summary['p99']:>10.2f}{delta:>9}"
+        )
+        previous_p50 = summary["p50"]
+    lines.append(f"p50 推移: {sparkline([run['summary']['p50'] for run in runs])}")
+    lines.append(f"p99 推移: {sparkline([run['summary']['p99'] for run in runs])}")
+    return "\n".join(lines)
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="ベンチマーク結果の履歴管理と劣化検出")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="保存済みの結果を一覧表示")
+    list_parser.add_argument("--name", help="計測の種類で絞り込む")
+
+    promote = subparsers.add_parser("promote", help="結果をベースラインに設定")
+    promote.add_argument("run", help="run ID / ファイルパス / latest")
+
+    compare = subparsers.add_parser("compare", help="結果をベースラインと比較（劣化時は終了コード 1）")
+    compare.add_argument("run", help="run ID / ファイルパス / latest")
+    compare.add_argument("--baseline", help="比較元（省略時は promote で設定したベースライン）")
+    compare.add_argument("--name", help="run に latest を指定した場合の計測の種類")
+    compare.add_argument("--alpha", type=float, default=DEFAULT_ALPHA, help="有意水準")
+    compare.add_argument("--min-effect", type=float, default=DEFAULT_MIN_EFFECT_PCT, help="中央値の最小悪化率 (%%)")
+    compare.add_argument("--json", action="store_true", help="結果を JSON で出力")
+
+    trend = subparsers.add_parser("trend", help="結果の推移を表示")
+    trend.add_argument("--name", help="計測の種類（省略時は全種類）")
+    trend.add_argument("--last", type=int, default=20, help="表示する件数")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "list":
+        for run in load_runs(args.name):
+            summary = run["summary"]
+            print(f"{run['id']:<44}{run['name']:<28}n={summary['count']:<6} p50={summary.get('p50', 0):.2f} ms")
+
+    elif args.command == "promote":
+        run = resolve_run(args.run)
+        path = baseline_path(run["name"])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(run, indent=2, ensure_ascii=False), encoding="utf-8")
+        print(f"ベースラインに設定しました: {run['id']} → {path}")
+
+    elif args.command == "compare":
+        candidate = resolve_run(args.run, args.name)
+        if args.baseline:
+            baseline = resolve_run(args.baseline)
+        else:
+            path = baseline_path(candidate["name"])
+            if not path.exists():
+                raise SystemExit(f"No baseline for {candidate['name']} (run 'promote' first)")
+            baseline = json.loads(path.read_text(encoding="utf-8"))
+        result = compare_runs(baseline, candidate, args.alpha, args.min_effect)
+        print(json.dumps(result, indent=2) if args.json else format_comparison(result))
+        sys.exit(1 if result["regression"] else 0)
+
+    elif args.command == "trend":
+        runs = load_runs(args.name)
+        names = sorted({run["name"] for run in runs})
+        for name in names:
+            print(f"\n=== {name} ===")
+            print(format_trend([run for run in runs if run["name"] == name][-args.last :]))
+
+
+if __name__ == "__main__":
+    main()
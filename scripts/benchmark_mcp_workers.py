@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+MCP サーバーのワーカー数毎のスループット計測
+
+合成したコーパス（JSONL）で MCP サーバー（mcp_server/src/mcp_server.py）を MCP_WORKERS を変えて起動し、
+retrieve_doc の tools/call を並行に送信して、ワーカー数に対するスループットのスケーリングを計測する。
+検索インデックスは親プロセスが 1 度だけ作成し、各ワーカーは同じファイルを mmap で共有する。
+
+使い方:
+    uv run python benchmark_mcp_workers.py
+    uv run python benchmark_mcp_workers.py --workers 1 2 4 8 --documents 50000 --duration 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmark_history import save_run
+from loadgen import LoadConfig, RequestResult, build_report, run_load
+
+SERVER_PATH = Path(__file__).resolve().parent.parent / "cdk-agentcore-gw-interceptors" / "mcp_server" / "src" / "mcp_server.py"
+
+# 合成コーパスの語彙
+VOCABULARY = (
+    "経費 精算 申請 有給 休暇 勤怠 システム 障害 連絡 承認 ポータル ログイン 領収書 ベンダー 当番 "
+    "部長 情シス 緊急 規程 出張 旅費 稟議 契約 更新 研修 評価 給与 手当 保険 年末 調整 備品 購入 "
+    "セキュリティ パスワード 変更 端末 貸与 返却 入社 退職 手続き 会議室 予約 社内 ネットワーク"
+).split()
+
+
+def generate_corpus(path: str, documents: int, words: int, seed: int = 0) -> list[str]:
+    """合成コーパスを JSONL で書き出し、検索クエリの候補を返す"""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(documents):
+            content = "".join(rng.choice(VOCABULARY) for _ in range(words))
+            f.write(json.dumps({"id": f"doc-{i:06d}", "content": content}, ensure_ascii=False) + "\n")
+    return [rng.choice(VOCABULARY) + rng.choice(VOCABULARY) for _ in range(256)]
+
+
+HEADERS = {"Content-Type": "application/json", "Accept": "application/json, text/event-stream"}
+
+
+def start_server(server: Path, workers: int, corpus_path: str, index_path: str) -> subprocess.Popen:
+    """MCP サーバーを起動する（ポートは AgentCore Runtime と同じ 8000 固定）"""
+    env = {
+        **os.environ,
+        "MCP_WORKERS": str(workers),
+        "MCP_CORPUS_PATH": corpus_path,
+        "MCP_INDEX_PATH": index_path,
+    }
+    return subprocess.Popen(
+        [sys.executable, str(server)],
+        env=env,
+        cwd=server.parent,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def stop_server(process: subprocess.Popen):
+    # マルチワーカー構成ではワーカーも含めて停止する
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def wait_until_ready(url: str, timeout_s: float = 120.0):
+    """サーバーが応答するまで待機する（インデックスの作成時間を含む）"""
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            httpx.post(url, json={"jsonrpc": "2.0", "id": 0, "method": "ping"}, headers=HEADERS, timeout=2.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise TimeoutError(f"MCP server did not start: {url}")
+
+
+def classify_mcp_response(response: httpx.Response) -> str | None:
+    """MCP サーバーのレスポンス（SSE または JSON）をエラー種別に変換する（成功なら None）"""
+    if response.status_code != 200:
+        return f"http_{response.status_code}"
+    text = response.text
+    if response.headers.get("content-type", "").startswith("text/event-stream"):
+        data = [line[len("data:") :] for line in text.splitlines() if line.startswith("data:")]
+        text = data[-1] if data else ""
+    try:
+        body = json.loads(text)
+    except ValueError:
+        return "invalid_json"
+    if "error" in body:
+        return f"jsonrpc_{body['error'].get('code')}"
+    if body.get("result", {}).get("isError"):
+        return "tool_error"
+    return None
+
+
+def make_send(url: str, queries: list[str], top_k: int):
+    async def send(client: httpx.AsyncClient, seq: int) -> RequestResult:
+        response = await client.post(
+            url,
+            headers=HEADERS,
+            json={
+                "jsonrpc": "2.0",
+                "id": seq,
+                "method": "tools/call",
+                "params": {"name": "retrieve_doc", "arguments": {"query": queries[seq % len(queries)], "top_k": top_k}},
+            },
+        )
+        return RequestResult(label="retrieve_doc", error=classify_mcp_response(response))
+
+    return send
+
+
+def format_results(rows: list[dict], documents: int, index_bytes: int) -> str:
+    baseline = rows[0]["throughput_rps"] if rows else 0.0
+    lines = [
+        "=" * 80,
+        f"=== MCP サーバーのワーカー数毎のスループット (文書数 {documents}, CPU {os.cpu_count()}) ===",
+        "=" * 80,
+        f"インデックス: {index_bytes / 1024 / 1024:.1f} MB（全ワーカーで mmap を共有）",
+        f"{'workers':>8}{'rps':>10}{'scaling':>10}{'p50':>10}{'p99':>10}{'errors':>8}",
+    ]
+    for row in rows:
+        latency = row["latency_ms"]
+        scaling = row["throughput_rps"] / baseline if baseline else 0.0
+        lines.append(
+            f"{row['workers']:>8}{row['throughput_rps']:>10.1f}{scaling:>9.2f}x"
+            f"{latency.get('p50', 0):>8.1f}ms{latency.get('p99', 0):>8.1f}ms{row['errors']:>8}"
+        )
+    lines.append("=" * 80)
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="MCP サーバーのワーカー数毎のスループット計測")
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="ワーカー数（既定: 1, 2, 4, ... CPU 数）")
+    parser.add_argument("--documents", type=int, default=20000, help="合成コーパスの文書数")
+    parser.add_argument("--words", type=int, default=40, help="1 文書あたりの語数")
+    parser.add_argument("--top-k", type=int, default=5, help="retrieve_doc の top_k")
+    parser.add_argument("--concurrency", type=int, default=32, help="並行数")
+    parser.add_argument("--duration", type=float, default=10.0, help="計測時間（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="ウォームアップ（秒）")
+    parser.add_argument("--server", type=Path, default=SERVER_PATH, help="mcp_server.py のパス")
+    parser.add_argument("--output", help="結果 JSON の保存先")
+    parser.add_argument("--no-history", action="store_true", help="計測結果を履歴に保存しない")
+    return parser.parse_args()
+
+
+def default_workers() -> list[int]:
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    return counts + [os.cpu_count() or 1]
+
+
+def main():
+    args = parse_args()
+    workers_list = args.workers or default_workers()
+    url = "http://127.0.0.1:8000/mcp"
+    config = LoadConfig(concurrency=args.concurrency, duration_s=args.duration, warmup_s=args.warmup)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        corpus_path = os.path.join(directory, "corpus.jsonl")
+        index_path = os.path.join(directory, "index.bin")
+        queries = generate_corpus(corpus_path, args.documents, args.words)
+        send = make_send(url, queries, args.top_k)
+
+        for workers in workers_list:
+            process = start_server(args.server, workers, corpus_path, index_path)
+            try:
+                wait_until_ready(url)
+                run = asyncio.run(run_load(send, config))
+            finally:
+                stop_server(process)
+            report = build_report(run, config)
+            rows.append({"workers": workers, **{k: report[k] for k in ("throughput_rps", "latency_ms", "errors")}})
+            print(f"workers={workers}: {report['throughput_rps']:.1f} req/s", file=sys.stderr)
+            if not args.no_history:
+                save_run(
+                    f"mcp_workers:{workers}",
+                    [s.latency_ms for s in run.samples if s.error is None],
+                    {"workers": workers, "documents": args.documents, "concurrency": args.concurrency},
+                )
+        index_bytes = os.path.getsize(index_path)
+
+    print(format_results(rows, args.documents, index_bytes))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+        print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+ツールの実行結果のプロジェクション（フィールド単位の秘匿）のコスト計測
+
+Response Interceptor の projections.py を読み込み、retrieve_doc の結果のドキュメント数（ペイロードサイズ）を
+変えながら、以下の処理時間を計測する。
+
+- compiled : (role, tool) 毎にコンパイルした変換関数（structuredContent のみ）
+- generic  : 比較用。ルール毎に結果全体を再帰的に走査する汎用的な実装
+- result   : project_result 全体（structuredContent の変換 + text の content の再生成）
+- dumps    : 参考。structuredContent の json.dumps のみ（text の再生成の下限）
+
+使い方:
+    uv run python benchmark_projections.py
+    uv run python benchmark_projections.py --sizes 10 100 1000 --iterations 200 --output projections.json
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+from local_pipeline import load_module
+
+RESPONSE_LAMBDA_DIR = Path(__file__).resolve().parent.parent / "cdk-agentcore-gw-interceptors" / "lambda" / "response"
+
+projections = load_module("projections", RESPONSE_LAMBDA_DIR / "projections.py")
+
+
+def build_result(documents: int, content_chars: int) -> dict:
+    """retrieve_doc と同じ形式の結果を作成する（3 件に 1 件は秘匿対象のドキュメント）"""
+    sensitive = sorted(projections.SENSITIVE_DOC_IDS) or ["doc-003"]
+    structured = {
+        "documents": [
+            {
+                "id": sensitive[0] if i % 3 == 2 else f"doc-{i:06d}",
+                "content": "社内ドキュメントの本文" * (content_chars // 10),
+                "metadata": {"source": "s3://bucket/docs", "score": 0.5},
+            }
+            for i in range(documents)
+        ],
+        "total": documents,
+    }
+    return {
+        "content": [{"type": "text", "text": json.dumps(structured, ensure_ascii=False, indent=2)}],
+        "structuredContent": structured,
+        "isError": False,
+    }
+
+
+def generic_project(value, rules: list):
+    """比較用: ルール毎に結果全体を再帰的に走査し、パスが一致するフィールドを変換する"""
+
+    def walk(node, path: str, rule):
+        if isinstance(node, dict):
+            copied = {}
+            for key, child in node.items():
+                child_path = f"{path}.{key}" if path else key
+                copied[key] = walk(child, child_path, rule)
+            parent, _, leaf = rule.path.rpartition(".")
+            if path == parent:
+                rule.apply(copied, leaf)
+            return copied
+        if isinstance(node, list):
+            return [walk(item, f"{path}[]", rule) for item in node]
+        return node
+
+    for rule in rules:
+        value = walk(value, "", rule)
+    return value
+
+
+def measure(func, iterations: int) -> float:
+    """1 回あたりの平均処理時間 (us)"""
+    func()  # ウォームアップ（コンパイル・キャッシュ）
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def run(sizes: list[int], content_chars: int, iterations: int, role: str) -> list[dict]:
+    rules = projections.PROJECTION_RULES["retrieve_doc"].get(role) or projections.PROJECTION_RULES["retrieve_doc"]["*"]
+    rows = []
+    for documents in sizes:
+        result = build_result(documents, content_chars)
+        structured = result["structuredContent"]
+        projector = projections.get_projector(role, "retrieve_doc")
+        assert projector(structured) == generic_project(structured, rules)
+        # 反復回数はペイロードサイズに応じて減らす
+        n = max(iterations * 10 // max(documents, 10), 3)
+        rows.append(
+            {
+                "documents": documents,
+                "payload_bytes": len(result["content"][0]["text"].encode()),
+                "compiled_us": measure(lambda: projector(structured), n),
+                "generic_us": measure(lambda: generic_project(structured, rules), n),
+                "result_us": measure(lambda: projections.project_result(role, "retrieve_doc", result), n),
+                "dumps_us": measure(lambda: json.dumps(structured, ensure_ascii=False, indent=2), n),
+            }
+        )
+    return rows
+
+
+def format_rows(rows: list[dict], role: str) -> str:
+    lines = [
+        "=" * 88,
+        f"=== プロジェクションのコスト (retrieve_doc, role={role}) ===",
+        "=" * 88,
+        f"{'documents':>10}{'payload':>12}{'compiled':>12}{'generic':>12}{'result':>12}{'dumps':>12}{'MB/s':>10}",
+    ]
+    for row in rows:
+        throughput = row["payload_bytes"] / row["result_us"] if row["result_us"] else 0.0
+        lines.append(
+            f"{row['documents']:>10}{row['payload_bytes'] / 1024:>10.1f}KB"
+            f"{row['compiled_us']:>10.1f}us{row['generic_us']:>10.1f}us"
+            f"{row['result_us']:>10.1f}us{row['dumps_us']:>10.1f}us{throughput:>10.1f}"
+        )
+    lines.append("=" * 88)
+    lines.append("MB/s は project_result 全体のスループット（text の再生成を含む）")
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="プロジェクションのコスト計測")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 5000], help="ドキュメント数")
+    parser.add_argument("--content-chars", type=int, default=200, help="ドキュメント 1 件の本文の文字数")
+    parser.add_argument("--iterations", type=int, default=1000, help="ドキュメント 10 件あたりの反復回数")
+    parser.add_argument("--role", default="user", help="ロール")
+    parser.add_argument("--output", help="結果 JSON の保存先")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rows = run(args.sizes, args.content_chars, args.iterations, args.role)
+    print(format_rows(rows, args.role))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+        print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
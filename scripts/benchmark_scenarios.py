@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+シナリオベンチマーク
+
+シナリオファイル (scenarios/*.json) に定義した MCP リクエスト
+（initialize / tools/list / 許可・拒否される tools/call）を admin・user トークンで混在させ、
+3 つのアクセス制御方式の Gateway に対して同じ負荷をかけて、ステップ毎のレイテンシー分布を比較する。
+
+使い方:
+    uv run python benchmark_scenarios.py scenarios/mixed_methods.json \\
+        --variant inbound-auth=../.env.inbound-auth \\
+        --variant policy=../.env.policy \\
+        --variant interceptors=../.env.interceptors \\
+        --concurrency 5 --duration 60 --output comparison.json
+
+各 .env ファイルには、対応する CDK プロジェクトのデプロイ出力
+（CLIENT_ID, GATEWAY_URL, COGNITO_DOMAIN, MCP_TARGET_NAME）を設定する。
+"""
+
+import argparse
+import asyncio
+import json
+from dataclasses import dataclass
+
+from gateway_auth import GatewayConfig, get_tokens
+from loadgen import LoadConfig, RequestResult, build_report, run_load
+
+ALLOWED = "allowed"
+DENIED = "denied"
+
+
+@dataclass(frozen=True)
+class Step:
+    """シナリオの 1 ステップ"""
+
+    name: str
+    user: str
+    method: str
+    params: dict
+    weight: int
+    expect: str
+
+
+def load_scenario(path: str) -> dict:
+    """シナリオファイルを読み込む"""
+    with open(path, encoding="utf-8") as f:
+        scenario = json.load(f)
+    if not scenario.get("steps"):
+        raise ValueError(f"{path}: no steps defined")
+    return scenario
+
+
+def resolve_steps(scenario: dict, variant: str, target_name: str) -> list[Step]:
+    """シナリオのステップを方式（variant）向けに展開する
+
+    - params 内の "{target}" を Gateway Target 名に置換
+    - expect が方式別の辞書の場合は該当方式（なければ "default"）の値を使用
+    """
+    steps = []
+    for raw in scenario["steps"]:
+        expect = raw.get("expect", ALLOWED)
+        if isinstance(expect, dict):
+            expect = expect.get(variant, expect.get("default", ALLOWED))
+        params = json.loads(json.dumps(raw.get("params", {})).replace("{target}", target_name))
+        steps.append(
+            Step(
+                name=raw["name"],
+                user=raw["user"],
+                method=raw["method"],
+                params=params,
+                weight=int(raw.get("weight", 1)),
+                expect=expect,
+            )
+        )
+    return steps
+
+
+def build_schedule(steps: list[Step]) -> list[Step]:
+    """重みに従ってステップを並べた送信順序を作成する（重み付きラウンドロビン）"""
+    schedule = []
+    remaining = {step.name: step.weight for step in steps}
+    while any(remaining.values()):
+        for step in steps:
+            if remaining[step.name] > 0:
+                schedule.append(step)
+                remaining[step.name] -= 1
+    return schedule
+
+
+def is_denied(status_code: int, body) -> bool:
+    """レスポンスが拒否（HTTP エラー、JSON-RPC エラー、isError の結果）かどうか"""
+    if status_code >= 400:
+        return True
+    if not isinstance(body, dict):
+        return False
+    if "error" in body:
+        return True
+    return bool((body.get("result") or {}).get("isError"))
+
+
+def make_scenario_sender(config: GatewayConfig, tokens: dict[str, str], schedule: list[Step]):
+    """シナリオの送信順序に従ってリクエストを送信する非同期関数を作成する"""
+
+    async def send(client, seq: int) -> RequestResult:
+        step = schedule[seq % len(schedule)]
+        response = await client.post(
+            config.gateway_url,
+            headers={
+                "Authorization": f"Bearer {tokens[step.user]}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "jsonrpc": "2.0",
+                "id": seq,
+                "method": step.method,
+                "params": step.params,
+            },
+        )
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+
+        denied = is_denied(response.status_code, body)
+        if step.expect == DENIED:
+            # 拒否されることが期待されるステップは、拒否されれば成功
+            error = None if denied else "unexpected_allow"
+        elif denied:
+            error = "unexpected_deny" if body is not None else f"http_{response.status_code}"
+        else:
+            error = None
+        return RequestResult(label=step.name, error=error)
+
+    return send
+
+
+def login_users(config: GatewayConfig, users: dict[str, str], variant: str) -> dict[str, str]:
+    """シナリオで使用するユーザー毎にアクセストークンを取得する（キャッシュがなければログイン）"""
+    tokens = {}
+    for user, email in users.items():
+        print(f"\n[{variant}] Login as {user} ({email})")
+        tokens[user] = get_tokens(config, email)["access_token"]
+        print(f"✓ [{variant}] Token obtained for {user}")
+    return tokens
+
+
+def run_variant(variant: str, config: GatewayConfig, scenario: dict, load_config: LoadConfig) -> dict:
+    """1 つの方式に対してシナリオを実行する"""
+    steps = resolve_steps(scenario, variant, config.target_name)
+    users = {step.user: scenario.get("users", {}).get(step.user, step.user) for step in steps}
+    tokens = login_users(config, users, variant)
+
+    print(f"\n=== [{variant}] シナリオ実行: {scenario.get('name', '')} ===")
+    send = make_scenario_sender(config, tokens, build_schedule(steps))
+    run = asyncio.run(run_load(send, load_config))
+    report = build_report(run, load_config)
+    report["gateway_url"] = config.gateway_url
+    return report
+
+
+def build_comparison(reports: dict[str, dict]) -> dict:
+    """方式毎のレポートからステップ毎の比較表を作成する"""
+    labels = []
+    for report in reports.values():
+        for label in report["by_label"]:
+            if label not in labels:
+                labels.append(label)
+
+    comparison = {}
+    for label in labels:
+        comparison[label] = {
+            variant: report["by_label"].get(label, {"requests": 0, "errors": 0, "latency_ms": {"count": 0}})
+            for variant, report in reports.items()
+        }
+    return comparison
+
+
+def format_comparison(comparison: dict, variants: list[str]) -> str:
+    """比較表を人間向けのテキストに整形する（p50 / p99 / エラー数）"""
+    name_width = max([len(label) for label in comparison] + [10]) + 2
+    col_width = 26
+    header = "step".ljust(name_width) + "".join(v.ljust(col_width) for v in variants)
+    lines = [
+        "=" * len(header),
+        "=== シナリオ比較 (p50 / p99 ms, errors) ===",
+        "=" * len(header),
+        header,
+        "-" * len(header),
+    ]
+    for label, by_variant in comparison.items():
+        row = label.ljust(name_width)
+        for variant in variants:
+            entry = by_variant[variant]
+            latency = entry["latency_ms"]
+            if latency.get("count"):
+                cell = f"{latency['p50']:.1f} / {latency['p99']:.1f}, {entry['errors']}"
+            else:
+                cell = f"-, {entry['errors']}"
+            row += cell.ljust(col_width)
+        lines.append(row)
+    lines.append("=" * len(header))
+    return "\n".join(lines)
+
+
+def parse_variant(value: str) -> tuple[str, str]:
+    name, sep, path = value.partition("=")
+    if not sep or not name or not path:
+        raise argparse.ArgumentTypeError("variant must be NAME=ENV_FILE")
+    return name, path
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AgentCore Gateway シナリオベンチマーク")
+    parser.add_argument("scenario", help="シナリオファイル (JSON)")
+    parser.add_argument(
+        "--variant",
+        type=parse_variant,
+        action="append",
+        help="方式名と .env ファイル (例: policy=../.env.policy)。複数指定可。省略時は ../.env",
+    )
+    parser.add_argument("--concurrency", type=int, default=5, help="最大並行数")
+    parser.add_argument("--rps", type=float, default=None, help="目標 RPS（指定時は open-loop）")
+    parser.add_argument("--duration", type=float, default=60.0, help="方式毎の計測時間（秒）")
+    parser.add_argument("--warmup", type=float, default=5.0, help="ウォームアップ時間（秒）")
+    parser.add_argument("--timeout", type=float, default=30.0, help="リクエストタイムアウト（秒）")
+    parser.add_argument("--output", help="比較結果 JSON の保存先")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenario = load_scenario(args.scenario)
+    variants = args.variant or [("default", "../.env")]
+    load_config = LoadConfig(
+        concurrency=args.concurrency,
+        rps=args.rps,
+        duration_s=args.duration,
+        warmup_s=args.warmup,
+        timeout_s=args.timeout,
+    )
+
+    # 方式同士が干渉しないよう、方式毎に順番に実行する
+    reports = {}
+    for name, env_file in variants:
+        reports[name] = run_variant(name, GatewayConfig.from_env_file(env_file), scenario, load_config)
+
+    comparison = build_comparison(reports)
+    print("\n" + format_comparison(comparison, list(reports)))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {"scenario": scenario.get("name"), "variants": reports, "comparison": comparison},
+                f,
+                indent=2,
+                ensure_ascii=False,
+            )
+        print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
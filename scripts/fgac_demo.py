@@ -6,18 +6,29 @@ Interceptor Lambda によるユーザー毎の Tool 制御をデモ
 
 import asyncio
 import base64
+import hashlib
 import json
 import logging
 import os
+import queue
+import threading
+import time
 import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import requests
 import streamlit as st
 from dotenv import load_dotenv
 from mcp.client.streamable_http import streamablehttp_client
+from mcp.types import Tool
 from strands import Agent
+from strands.agent.conversation_manager import (
+    ConversationManager,
+    SlidingWindowConversationManager,
+    SummarizingConversationManager,
+)
 from strands.models import BedrockModel
-from strands.tools.mcp import MCPClient
+from strands.tools.mcp import MCPAgentTool, MCPClient
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +51,28 @@ AUTH_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/oauth2/aut
 TOKEN_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/oauth2/token"
 LOGOUT_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/logout"
 
+# この秒数使われなかった MCP セッションはプールから破棄する
+MCP_POOL_IDLE_SECONDS = int(os.getenv("MCP_POOL_IDLE_SECONDS", "600"))
+
+# ツール一覧のキャッシュ有効期間（秒）。期限切れ後は古い一覧を返しつつバックグラウンドで更新する
+TOOL_CATALOG_TTL_SECONDS = int(os.getenv("TOOL_CATALOG_TTL_SECONDS", "300"))
+# ツール一覧の版を受け渡す _meta のキー（Response Interceptor と同じ）
+CATALOG_VERSION_KEY = "catalogVersion"
+NOT_MODIFIED_KEY = "notModified"
+
+# ストリーミング表示の更新間隔（秒）と、間隔内でも更新する未表示の文字数
+RENDER_INTERVAL_SECONDS = float(os.getenv("RENDER_INTERVAL_SECONDS", "0.1"))
+RENDER_MAX_PENDING_CHARS = int(os.getenv("RENDER_MAX_PENDING_CHARS", "500"))
+# 応答の下に描画回数・描画時間を表示する
+SHOW_RENDER_STATS = os.getenv("SHOW_RENDER_STATS", "false").lower() == "true"
+
+# モデルに送る会話履歴の管理方式（sliding: 古いメッセージを削除 / summarizing: 古いメッセージを要約）
+CONVERSATION_MANAGER = os.getenv("CONVERSATION_MANAGER", "sliding")
+# モデルに送る会話履歴の最大メッセージ数
+CONVERSATION_WINDOW_SIZE = int(os.getenv("CONVERSATION_WINDOW_SIZE", "20"))
+# チャット画面に常に表示するメッセージ数（それより古いものはトグルで表示）
+CHAT_HISTORY_RENDER_LIMIT = int(os.getenv("CHAT_HISTORY_RENDER_LIMIT", "20"))
+
 
 # =============================================================================
 # OAuth Functions
@@ -105,6 +138,256 @@ def create_mcp_client(access_token: str) -> MCPClient:
     return MCPClient(lambda: streamablehttp_client(GATEWAY_URL, headers=headers, timeout=300))
 
 
+# =============================================================================
+# Background Event Loop / MCP Session Pool (shared across Streamlit sessions)
+# =============================================================================
+_DONE = object()
+
+
+class BackgroundEventLoop:
+    """プロセス全体で共有する常駐イベントループ（専用スレッドで実行）
+
+    メッセージ毎にイベントループを作成・破棄せず、同じループ上で Agent のストリーミングを実行する。
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="fgac-event-loop", daemon=True)
+        self.thread.start()
+
+    def iterate(self, async_iterable):
+        """非同期イテレーターをループ上で実行し、呼び出し元スレッドで要素を逐次受け取る
+
+        Streamlit の描画は呼び出し元（スクリプト）スレッドで行う必要があるため、
+        ループ上で取得した要素をキュー経由で受け渡す。
+        """
+        items: queue.Queue = queue.Queue()
+
+        async def pump():
+            try:
+                async for item in async_iterable:
+                    items.put(item)
+            except BaseException as e:  # 呼び出し元スレッドで再送出する
+                items.put(e)
+            finally:
+                items.put(_DONE)
+
+        future = asyncio.run_coroutine_threadsafe(pump(), self.loop)
+        try:
+            while (item := items.get()) is not _DONE:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            # 再実行（rerun）等で途中で打ち切られた場合はループ上の処理も止める
+            future.cancel()
+
+
+class MCPSessionPool:
+    """アクセストークン毎に MCP クライアント（初期化済みセッション）を共有するプール
+
+    同じトークンを使う Streamlit セッション間で、接続と initialize ハンドシェイクを再利用する。
+    一定時間使われなかったクライアントは、次回の取得時に停止・破棄する。
+    """
+
+    def __init__(self, idle_timeout: float = MCP_POOL_IDLE_SECONDS):
+        self.idle_timeout = idle_timeout
+        self._entries: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._creating: dict[str, threading.Lock] = {}
+
+    @staticmethod
+    def _key(access_token: str) -> str:
+        return hashlib.sha256(access_token.encode()).hexdigest()
+
+    def acquire(self, access_token: str) -> MCPClient:
+        """トークンに対応する MCP クライアントを取得する（なければ作成）"""
+        self.evict_idle()
+        key = self._key(access_token)
+        with self._lock:
+            if entry := self._entries.get(key):
+                entry["last_used"] = time.monotonic()
+                return entry["client"]
+            creating = self._creating.setdefault(key, threading.Lock())
+
+        # 接続・初期化は時間がかかるため、プール全体のロック外で行う
+        # （同じトークンの作成はキー毎のロックで直列化し、先に作成されたものを使う）
+        with creating:
+            with self._lock:
+                if entry := self._entries.get(key):
+                    entry["last_used"] = time.monotonic()
+                    return entry["client"]
+            client = create_mcp_client(access_token)
+            client.start()
+            with self._lock:
+                self._entries[key] = {"client": client, "last_used": time.monotonic()}
+                self._creating.pop(key, None)
+        logger.info("MCP session created (pool size: %d)", len(self._entries))
+        return client
+
+    def release(self, access_token: str):
+        """トークンに対応する MCP クライアントを停止・破棄する（ログアウト時）"""
+        with self._lock:
+            entry = self._entries.pop(self._key(access_token), None)
+        if entry:
+            self._stop(entry["client"])
+
+    def evict_idle(self):
+        """一定時間使われていないクライアントを停止・破棄する"""
+        now = time.monotonic()
+        with self._lock:
+            idle_keys = [k for k, e in self._entries.items() if now - e["last_used"] > self.idle_timeout]
+            idle = [self._entries.pop(k) for k in idle_keys]
+        for entry in idle:
+            self._stop(entry["client"])
+        if idle:
+            logger.info("MCP sessions evicted: %d (pool size: %d)", len(idle), len(self._entries))
+
+    @staticmethod
+    def _stop(client: MCPClient):
+        try:
+            client.stop(None, None, None)
+        except Exception:
+            logger.debug("MCP client close failed", exc_info=True)
+
+
+# =============================================================================
+# Tool Catalog Cache (shared across Streamlit sessions)
+# =============================================================================
+def catalog_key(access_token: str) -> tuple:
+    """ツール一覧のキャッシュキー（Gateway とロール）
+
+    Pre Token Lambda はロールをカスタムクレーム role にのみ付与し（scope・cognito:groups は全ユーザーで同じ）、
+    Interceptor はこの role でツールを絞り込むため、同じ Gateway・同じロールのユーザーは同じツール一覧になる。
+    """
+    return GATEWAY_URL, decode_token(access_token).get("role", "guest")
+
+
+def fetch_tool_pages(access_token: str, previous: dict = None) -> tuple[dict, bool]:
+    """tools/list を JSON-RPC で直接呼び出してツール定義をページ毎に取得する（MCP セッション不要）
+
+    previous（前回取得したページ）があれば、ページ毎の版を params._meta で送信する。
+    Interceptor が変更なしと応答したページは、前回解析したツール定義をそのまま使う。
+
+    Returns:
+        ({カーソル: {"version", "tools", "next_cursor"}}, 前回から変更があったか)
+    """
+    previous = previous or {}
+    pages = {}
+    changed = False
+    cursor = None
+    while True:
+        cached = previous.get(cursor)
+        params = {"cursor": cursor} if cursor else {}
+        if cached and cached["version"]:
+            params["_meta"] = {CATALOG_VERSION_KEY: cached["version"]}
+        response = requests.post(
+            GATEWAY_URL,
+            headers={"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"},
+            json={"jsonrpc": "2.0", "id": 1, "method": "tools/list", "params": params},
+            timeout=30,
+        )
+        response.raise_for_status()
+        result = response.json().get("result", {})
+        meta = result.get("_meta") or {}
+        if cached and meta.get(NOT_MODIFIED_KEY):
+            page = cached
+        else:
+            page = {
+                "version": meta.get(CATALOG_VERSION_KEY),
+                "tools": [Tool.model_validate(tool) for tool in result.get("tools", [])],
+                "next_cursor": result.get("nextCursor"),
+            }
+            changed = True
+        pages[cursor] = page
+        if not (cursor := page["next_cursor"]):
+            return pages, changed or pages.keys() != previous.keys()
+
+
+class ToolCatalogCache:
+    """ロール毎のツール一覧を TTL 付きでキャッシュする
+
+    期限切れのエントリは古い一覧をそのまま返し、バックグラウンドで取得し直す（stale-while-revalidate）。
+    取得し直す際は前回の版を送信し、変更がなければ版（get の戻り値）を更新しない（セッション側で Agent を作り直さない）。
+    ツール定義 (mcp.types.Tool) のみを保持し、MCP クライアントへの紐付けはセッション毎に行う。
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, ttl: float = TOOL_CATALOG_TTL_SECONDS):
+        self.executor = executor
+        self.ttl = ttl
+        self._entries: dict[tuple, dict] = {}
+        self._refreshing: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, access_token: str) -> tuple[list[Tool], float]:
+        """ツール一覧とその版（一覧が変わった時刻）を返す"""
+        key = catalog_key(access_token)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            # 未取得（プリフェッチ中ならその完了を待つ）
+            self.prefetch(access_token).result()
+            with self._lock:
+                entry = self._entries[key]
+        elif time.monotonic() - entry["checked_at"] > self.ttl:
+            self.prefetch(access_token)
+        return entry["tools"], entry["version"]
+
+    def prefetch(self, access_token: str) -> Future:
+        """バックグラウンドで取得を開始する（同じキーの取得が進行中ならそれを返す）"""
+        key = catalog_key(access_token)
+        with self._lock:
+            if future := self._refreshing.get(key):
+                return future
+            future = self.executor.submit(self._fetch, key, access_token)
+            self._refreshing[key] = future
+        return future
+
+    def _fetch(self, key: tuple, access_token: str):
+        try:
+            with self._lock:
+                entry = self._entries.get(key)
+            pages, changed = fetch_tool_pages(access_token, entry and entry["pages"])
+            now = time.monotonic()
+            with self._lock:
+                if changed or entry is None:
+                    tools = [tool for page in pages.values() for tool in page["tools"]]
+                    self._entries[key] = {"pages": pages, "tools": tools, "version": now, "checked_at": now}
+                else:
+                    entry["checked_at"] = now
+            if changed or entry is None:
+                logger.info("Tool catalog fetched: %d tools", len(tools))
+            else:
+                logger.info("Tool catalog not modified")
+        finally:
+            with self._lock:
+                self._refreshing.pop(key, None)
+
+
+@st.cache_resource
+def get_executor() -> ThreadPoolExecutor:
+    """Process-wide executor for prefetching"""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="fgac-prefetch")
+
+
+@st.cache_resource
+def get_tool_catalog() -> ToolCatalogCache:
+    """Process-wide tool catalog cache"""
+    return ToolCatalogCache(get_executor())
+
+
+@st.cache_resource
+def get_event_loop() -> BackgroundEventLoop:
+    """Process-wide background event loop"""
+    return BackgroundEventLoop()
+
+
+@st.cache_resource
+def get_mcp_session_pool() -> MCPSessionPool:
+    """Process-wide MCP session pool"""
+    return MCPSessionPool()
+
+
 def extract_response_text(result) -> str:
     """Extract text content from Agent result"""
     if hasattr(result, "message") and result.message:
@@ -136,35 +419,129 @@ def extract_text(chunk) -> str:
     return ""
 
 
-async def stream_response(agent: Agent, question: str, container) -> str:
-    """Stream agent response with tool execution display"""
-    text_holder = container.empty()
-    buffer = ""
-
-    async for chunk in agent.stream_async(question):
+class ThrottledRenderer:
+    """ストリーミングテキストの描画をまとめて行う
+
+    チャンク毎に描画すると、伸び続けるバッファ全体を毎回ブラウザへ送るため応答長の 2 乗のコストになる。
+    一定時間または一定文字数の未表示テキストが溜まった時のみ描画し、最後に全文を描画する。
+    """
+
+    def __init__(
+        self,
+        placeholder,
+        interval: float = RENDER_INTERVAL_SECONDS,
+        max_pending_chars: int = RENDER_MAX_PENDING_CHARS,
+    ):
+        self.placeholder = placeholder
+        self.interval = interval
+        self.max_pending_chars = max_pending_chars
+        self.text = ""
+        self.updates = 0  # 描画回数
+        self.render_time = 0.0  # 描画にかかった合計時間（秒）
+        self._rendered_len = 0
+        self._last_render = 0.0
+
+    def append(self, text: str):
+        self.text += text
+        pending = len(self.text) - self._rendered_len
+        if pending >= self.max_pending_chars or time.perf_counter() - self._last_render >= self.interval:
+            self._render(self.text + "▌")
+
+    def finish(self) -> str:
+        """未表示分を含めた全文を描画する（カーソルなし）"""
+        if self.text:
+            self._render(self.text)
+        return self.text
+
+    def _render(self, body: str):
+        start = time.perf_counter()
+        self.placeholder.markdown(body)
+        self._last_render = time.perf_counter()
+        self.render_time += self._last_render - start
+        self.updates += 1
+        self._rendered_len = len(self.text)
+
+
+def stream_response(agent: Agent, question: str, container) -> list[dict]:
+    """Stream agent response with tool execution display
+
+    Returns:
+        表示履歴に追加するエントリ（テキスト {"text": ...} とツール実行 {"tool": ...} の並び）
+    """
+    renderer = ThrottledRenderer(container.empty())
+    entries = []
+    chunks = updates = 0
+    render_time = 0.0
+
+    for chunk in get_event_loop().iterate(agent.stream_async(question)):
         if isinstance(chunk, dict):
             # Detect and display tool execution
             tool_id, tool_name = extract_tool_info(chunk)
             if tool_id and tool_name:
-                if buffer:
-                    text_holder.markdown(buffer)
-                    buffer = ""
+                if text := renderer.finish():
+                    entries.append({"role": "assistant", "text": text})
+                updates += renderer.updates
+                render_time += renderer.render_time
                 # Format tool name for display
                 display_name = tool_name.split("___")[-1] if "___" in tool_name else tool_name
                 tool_text = f"🔧 **{display_name}** ツールを実行中..."
                 container.info(tool_text)
-                text_holder = container.empty()
+                entries.append({"role": "assistant", "tool": display_name})
+                renderer = ThrottledRenderer(container.empty())
 
             # Extract and display text
             if text := extract_text(chunk):
-                buffer += text
-                text_holder.markdown(buffer + "▌")
+                chunks += 1
+                renderer.append(text)
 
     # Final display
-    if buffer:
-        text_holder.markdown(buffer)
+    if text := renderer.finish():
+        entries.append({"role": "assistant", "text": text})
+    updates += renderer.updates
+    render_time += renderer.render_time
+
+    logger.info("Rendered %d chunks in %d updates (%.1f ms)", chunks, updates, render_time * 1000)
+    if SHOW_RENDER_STATS:
+        container.caption(f"render: {chunks} chunks / {updates} updates / {render_time * 1000:.1f} ms")
+
+    return entries
+
+
+# =============================================================================
+# Conversation Window
+# =============================================================================
+class WindowedSummarizingConversationManager(SummarizingConversationManager):
+    """会話履歴が window_size を超えたら、古いメッセージを要約に置き換える
 
-    return buffer
+    標準の SummarizingConversationManager はコンテキスト超過エラー時のみ要約するため、
+    ターン終了毎に履歴の長さを確認して、次のターンでモデルに送る前に要約する。
+    """
+
+    def __init__(self, window_size: int, **kwargs):
+        super().__init__(**kwargs)
+        self.window_size = window_size
+
+    def apply_management(self, agent: Agent, **kwargs):
+        if len(agent.messages) <= self.window_size:
+            return
+        try:
+            self.reduce_context(agent)
+        except Exception:
+            # 要約に失敗しても会話は継続する（コンテキスト超過時は標準の処理で再度要約される）
+            logger.warning("Conversation summarization failed", exc_info=True)
+
+
+def create_conversation_manager(model: BedrockModel) -> ConversationManager:
+    """Create conversation manager from CONVERSATION_MANAGER / CONVERSATION_WINDOW_SIZE"""
+    if CONVERSATION_MANAGER == "summarizing":
+        # 実行中の Agent を要約に使うと呼び出しが入れ子になるため、ツールなしの要約用 Agent を使う
+        summarizer = Agent(model=model, callback_handler=None)
+        return WindowedSummarizingConversationManager(
+            window_size=CONVERSATION_WINDOW_SIZE,
+            preserve_recent_messages=max(2, CONVERSATION_WINDOW_SIZE // 2),
+            summarization_agent=summarizer,
+        )
+    return SlidingWindowConversationManager(window_size=CONVERSATION_WINDOW_SIZE)
 
 
 # =============================================================================
@@ -181,17 +558,18 @@ def reset_session_state():
     st.session_state.access_token = None
     st.session_state.user_info = None
     st.session_state.tools = []
+    st.session_state.tools_version = None
     st.session_state.mcp_client = None
+    st.session_state.model = None
     st.session_state.agent = None
+    # 画面表示用の会話履歴（モデルに送る agent.messages とは別に、ターン毎に追記する）
+    st.session_state.transcript = []
 
 
 def close_mcp_client():
-    """Close MCP client if exists"""
-    if st.session_state.mcp_client:
-        try:
-            st.session_state.mcp_client.__exit__(None, None, None)
-        except Exception:
-            logger.debug("MCP client close failed", exc_info=True)
+    """Release pooled MCP client if exists"""
+    if st.session_state.mcp_client and st.session_state.access_token:
+        get_mcp_session_pool().release(st.session_state.access_token)
 
 
 # =============================================================================
@@ -221,6 +599,12 @@ def handle_oauth_callback():
             "scope": access_claims.get("scope"),
         }
 
+        # ツール一覧の取得と MCP セッションの確立をバックグラウンドで開始し、
+        # その間に Bedrock モデルを準備する
+        get_tool_catalog().prefetch(tokens["access_token"])
+        get_executor().submit(get_mcp_session_pool().acquire, tokens["access_token"])
+        st.session_state.model = BedrockModel(model_id=MODEL_ID)
+
         # Clear query params and rerun
         st.query_params.clear()
         st.rerun()
@@ -230,21 +614,33 @@ def handle_oauth_callback():
 
 
 def initialize_mcp():
-    """Ensure MCP client and tools are initialized"""
-    if st.session_state.mcp_client is None:
-        st.session_state.mcp_client = create_mcp_client(st.session_state.access_token)
-        st.session_state.mcp_client.__enter__()
-        st.session_state.tools = st.session_state.mcp_client.list_tools_sync()
+    """Ensure MCP client and tools are acquired from the session pool and catalog cache
+
+    毎回プールから取得して最終利用時刻を更新する。アイドル破棄等でクライアントが
+    入れ替わった場合やツール一覧が更新された場合は、会話履歴を引き継いで Agent を作り直す。
+    """
+    specs, version = get_tool_catalog().get(st.session_state.access_token)
+    client = get_mcp_session_pool().acquire(st.session_state.access_token)
+    if client is not st.session_state.mcp_client or version != st.session_state.tools_version:
+        st.session_state.mcp_client = client
+        st.session_state.tools = [MCPAgentTool(spec, client) for spec in specs]
+        st.session_state.tools_version = version
+        if st.session_state.agent is not None:
+            st.session_state.previous_messages = st.session_state.agent.messages
+            st.session_state.agent = None
 
 
 def initialize_agent():
     """Ensure agent is initialized (requires tools to be initialized first)"""
     if st.session_state.agent is None:
-        model = BedrockModel(model_id=MODEL_ID)
+        if st.session_state.model is None:
+            st.session_state.model = BedrockModel(model_id=MODEL_ID)
         st.session_state.agent = Agent(
-            model=model,
+            model=st.session_state.model,
+            messages=st.session_state.pop("previous_messages", None),
             system_prompt=SYSTEM_PROMPT,
             tools=st.session_state.tools,
+            conversation_manager=create_conversation_manager(st.session_state.model),
             callback_handler=None,
         )
 
@@ -294,17 +690,26 @@ def render_logout_button():
         redirect_to(get_logout_url())
 
 
-def render_chat_history(messages):
-    """Render chat message history"""
+def render_chat_history(transcript: list[dict]):
+    """Render chat message history
+
+    直近 CHAT_HISTORY_RENDER_LIMIT 件のみ描画し、それより古いエントリはトグルを有効にした時のみ描画する。
+    """
     st.markdown("### 💬 Chat with Agent")
-    for message in messages:
-        last_block = message["content"][-1]
-        if "toolUse" in last_block:
-            tool_name = last_block["toolUse"]["name"].split("___")[-1]
-            st.info(f"🔧 **{tool_name}** ツールを実行中...")
-        elif "text" in last_block:
-            with st.chat_message(message["role"]):
-                st.markdown(last_block["text"])
+    older_count = max(0, len(transcript) - CHAT_HISTORY_RENDER_LIMIT)
+    if older_count and st.toggle(f"以前のメッセージを表示 ({older_count} 件)", key="show_older_messages"):
+        render_transcript_entries(transcript[:older_count])
+    render_transcript_entries(transcript[older_count:])
+
+
+def render_transcript_entries(entries: list[dict]):
+    """Render transcript entries"""
+    for entry in entries:
+        if "tool" in entry:
+            st.info(f"🔧 **{entry['tool']}** ツールを実行中...")
+        else:
+            with st.chat_message(entry["role"]):
+                st.markdown(entry["text"])
 
 
 def handle_chat_input():
@@ -312,15 +717,15 @@ def handle_chat_input():
     if prompt := st.chat_input("メッセージを入力..."):
         with st.chat_message("user"):
             st.markdown(prompt)
+        st.session_state.transcript.append({"role": "user", "text": prompt})
 
         # Get and display agent response with streaming
         with st.chat_message("assistant"):
             try:
                 container = st.container()
-                # Run async streaming
-                loop = asyncio.new_event_loop()
-                loop.run_until_complete(stream_response(st.session_state.agent, prompt, container))
-                loop.close()
+                # Run async streaming on the shared background event loop
+                entries = stream_response(st.session_state.agent, prompt, container)
+                st.session_state.transcript.extend(entries)
             except Exception as e:
                 error_msg = f"Error: {e}"
                 st.error(error_msg)
@@ -340,7 +745,7 @@ def app():
 
     # Render components
     render_sidebar()
-    render_chat_history(st.session_state.agent.messages)
+    render_chat_history(st.session_state.transcript)
     handle_chat_input()
 
 
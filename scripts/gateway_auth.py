@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Gateway 認証ヘルパー
+
+複数の CDK プロジェクト（Inbound Authorization / AgentCore Policy / Gateway Interceptors）の
+Gateway を同一スクリプトから扱えるよう、OAuth 設定を .env ファイル単位で読み込み、
+3LO (Three-Legged OAuth) でトークンを取得する。
+
+長時間のベンチマーク・soak 計測向けに、トークンをユーザー毎にローカルへキャッシュし、
+有効期限内は再利用、期限切れ前にはリフレッシュトークンで更新する（ブラウザ再ログイン不要）。
+"""
+
+import base64
+import json
+import os
+import threading
+import time
+import urllib.parse
+import webbrowser
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+
+import requests
+from dotenv import dotenv_values
+
+
+@dataclass(frozen=True)
+class GatewayConfig:
+    """Gateway と Cognito の接続設定（CDK デプロイの出力値）"""
+
+    client_id: str
+    gateway_url: str
+    cognito_domain: str
+    target_name: str
+    region: str = "us-east-1"
+    redirect_uri: str = "http://localhost:8080/callback"
+
+    @classmethod
+    def from_env_file(cls, path: str) -> "GatewayConfig":
+        """.env 形式のファイルから設定を読み込む"""
+        values = dotenv_values(path)
+        missing = [k for k in ("CLIENT_ID", "GATEWAY_URL", "COGNITO_DOMAIN", "MCP_TARGET_NAME") if not values.get(k)]
+        if missing:
+            raise ValueError(f"{path}: missing {', '.join(missing)}")
+        return cls(
+            client_id=values["CLIENT_ID"],
+            gateway_url=values["GATEWAY_URL"],
+            cognito_domain=values["COGNITO_DOMAIN"],
+            target_name=values["MCP_TARGET_NAME"],
+            region=values.get("REGION") or "us-east-1",
+            redirect_uri=values.get("REDIRECT_URI") or "http://localhost:8080/callback",
+        )
+
+    @property
+    def auth_url(self) -> str:
+        return f"https://{self.cognito_domain}.auth.{self.region}.amazoncognito.com/oauth2/authorize"
+
+    @property
+    def token_url(self) -> str:
+        return f"https://{self.cognito_domain}.auth.{self.region}.amazoncognito.com/oauth2/token"
+
+    @property
+    def logout_url(self) -> str:
+        return f"https://{self.cognito_domain}.auth.{self.region}.amazoncognito.com/logout"
+
+
+class CallbackHandler(BaseHTTPRequestHandler):
+    """Handle OAuth callback"""
+
+    auth_code = None
+
+    def do_GET(self):
+        query = urllib.parse.urlparse(self.path).query
+        params = urllib.parse.parse_qs(query)
+
+        if "code" in params:
+            type(self).auth_code = params["code"][0]
+            self.send_response(200)
+            self.send_header("Content-type", "text/html")
+            self.end_headers()
+            self.wfile.write(
+                b"<html><body><h1>Login successful!</h1><p>You can close this window.</p></body></html>"
+            )
+        else:
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(b"Error: No code received")
+
+    def log_message(self, format, *args):
+        pass  # Suppress logs
+
+
+def decode_token(token: str) -> dict:
+    """Decode JWT token payload (without verification)"""
+    payload = token.split(".")[1]
+    payload += "=" * (4 - len(payload) % 4)
+    return json.loads(base64.b64decode(payload))
+
+
+def get_auth_url(config: GatewayConfig, force_login: bool = False) -> str:
+    """Build authorization URL (no custom scopes - server decides)"""
+    params = {
+        "response_type": "code",
+        "client_id": config.client_id,
+        "redirect_uri": config.redirect_uri,
+        "scope": "openid email",  # 基本スコープのみ、カスタムスコープはPre Token Lambdaが付与
+    }
+    if force_login:
+        # 既存の Cognito セッションを使わず、ログイン画面を表示する（ユーザー切り替え用）
+        params["prompt"] = "login"
+    return f"{config.auth_url}?{urllib.parse.urlencode(params)}"
+
+
+def exchange_code_for_tokens(config: GatewayConfig, code: str) -> dict:
+    """Exchange authorization code for tokens"""
+    response = requests.post(
+        config.token_url,
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        data={
+            "grant_type": "authorization_code",
+            "client_id": config.client_id,
+            "code": code,
+            "redirect_uri": config.redirect_uri,
+        },
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def login_with_browser(config: GatewayConfig, user_hint: str = None) -> dict:
+    """Open browser for login and get tokens
+
+    Args:
+        config: Gateway の接続設定
+        user_hint: ログインすべきユーザー（表示のみ。指定時は既存のセッションを使わずにログイン画面を表示）
+
+    Returns:
+        Cognito のトークンレスポンス（access_token, id_token, refresh_token, expires_in）
+    """
+    CallbackHandler.auth_code = None
+
+    # Start local server
+    redirect = urllib.parse.urlparse(config.redirect_uri)
+    server = HTTPServer((redirect.hostname, redirect.port), CallbackHandler)
+
+    # Open browser
+    auth_url = get_auth_url(config, force_login=user_hint is not None)
+    if user_hint:
+        print(f"Please log in as {user_hint}")
+    print("Opening browser for login...")
+    print(f"URL: {auth_url}")
+    webbrowser.open(auth_url)
+
+    # Wait for callback (handle multiple requests until we get the code)
+    print("Waiting for login callback...")
+    try:
+        while CallbackHandler.auth_code is None:
+            server.handle_request()
+    finally:
+        server.server_close()
+
+    # Exchange code for token
+    print("Exchanging code for token...")
+    return exchange_code_for_tokens(config, CallbackHandler.auth_code)
+
+
+# =============================================================================
+# Token Cache
+# =============================================================================
+# キャッシュファイルの保存先（リフレッシュトークンを含むため、所有者のみ読み書き可能にする）
+TOKEN_CACHE_PATH = Path(os.getenv("TOKEN_CACHE_PATH", Path.home() / ".cache" / "agentcore-gateway" / "tokens.json"))
+
+# 有効期限のこの秒数前になったら期限切れとみなして更新する
+TOKEN_EXPIRY_MARGIN_SECONDS = 300
+
+
+def refresh_tokens(config: GatewayConfig, refresh_token: str) -> dict:
+    """Refresh tokens with the refresh-token grant"""
+    response = requests.post(
+        config.token_url,
+        headers={"Content-Type": "application/x-www-form-urlencoded"},
+        data={
+            "grant_type": "refresh_token",
+            "client_id": config.client_id,
+            "refresh_token": refresh_token,
+        },
+    )
+    response.raise_for_status()
+    tokens = response.json()
+    # Cognito はリフレッシュ時に refresh_token を返さない（ローテーション無効時）ため引き継ぐ
+    tokens.setdefault("refresh_token", refresh_token)
+    return tokens
+
+
+class TokenCache:
+    """ユーザー毎のトークンを JSON ファイルに保存するキャッシュ
+
+    キーは "<client_id>:<user>"。別の Gateway（Cognito App Client）のトークンとは混在しない。
+    """
+
+    def __init__(self, path: Path = TOKEN_CACHE_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _load_all(self) -> dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, config: GatewayConfig, user: str) -> dict | None:
+        with self._lock:
+            return self._load_all().get(f"{config.client_id}:{user}")
+
+    def put(self, config: GatewayConfig, user: str, tokens: dict):
+        entry = dict(tokens)
+        entry["expires_at"] = time.time() + int(tokens.get("expires_in", 3600))
+        with self._lock:
+            entries = self._load_all()
+            entries[f"{config.client_id}:{user}"] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(entries, indent=2), encoding="utf-8")
+            tmp_path.chmod(0o600)
+            tmp_path.replace(self.path)
+
+    def delete(self, config: GatewayConfig, user: str = None):
+        """キャッシュを削除する（user 省略時は該当 Gateway の全ユーザー）"""
+        with self._lock:
+            entries = self._load_all()
+            prefix = f"{config.client_id}:"
+            for key in list(entries):
+                if key == f"{prefix}{user}" or (user is None and key.startswith(prefix)):
+                    del entries[key]
+            if self.path.exists():
+                self.path.write_text(json.dumps(entries, indent=2), encoding="utf-8")
+
+
+def is_expiring(tokens: dict, margin: float = TOKEN_EXPIRY_MARGIN_SECONDS) -> bool:
+    return tokens.get("expires_at", 0) - margin <= time.time()
+
+
+def token_identity(tokens: dict) -> str | None:
+    """トークンのユーザー（ID トークンの email、なければアクセストークンの username）"""
+    if tokens.get("id_token"):
+        email = decode_token(tokens["id_token"]).get("email")
+        if email:
+            return email
+    return decode_token(tokens["access_token"]).get("username") if tokens.get("access_token") else None
+
+
+def describe_identity(tokens: dict) -> str:
+    """トークンのユーザーとロールの表示用の文字列"""
+    claims = decode_token(tokens["access_token"])
+    return f"{token_identity(tokens)} (role={claims.get('role', 'guest')}, sub={claims.get('sub')})"
+
+
+def is_same_user(tokens: dict, user: str) -> bool:
+    identity = token_identity(tokens)
+    return identity is None or identity.lower() == user.lower()
+
+
+def get_tokens(config: GatewayConfig, user: str, cache: TokenCache = None) -> dict:
+    """キャッシュ → リフレッシュ → ブラウザログインの順でトークンを取得する
+
+    キャッシュのトークンは、クレームのユーザーが user と一致する場合のみ使用する。
+    ブラウザログインでは既存の Cognito セッションを使わずにログイン画面を表示し、
+    別のユーザーでログインした場合はキャッシュに保存せずにエラーにする。
+
+    Args:
+        config: Gateway の接続設定
+        user: ログインするユーザー（メールアドレス）。キャッシュのキーにも使用
+        cache: トークンキャッシュ（省略時は TOKEN_CACHE_PATH）
+
+    Raises:
+        ValueError: user と異なるユーザーでログインした場合
+    """
+    cache = cache or TokenCache()
+    cached = cache.get(config, user)
+    if cached and not is_same_user(cached, user):
+        print(f"Ignoring cached token for {token_identity(cached)} (expected {user})")
+        cached = None
+
+    if cached and not is_expiring(cached):
+        print(f"✓ Using cached token: {describe_identity(cached)}")
+        return cached
+
+    if cached and cached.get("refresh_token"):
+        try:
+            print(f"Refreshing token ({user})...")
+            tokens = refresh_tokens(config, cached["refresh_token"])
+            cache.put(config, user, tokens)
+            tokens = cache.get(config, user)
+            print(f"✓ Using refreshed token: {describe_identity(tokens)}")
+            return tokens
+        except requests.HTTPError as e:
+            # リフレッシュトークンの期限切れ等はブラウザログインにフォールバック
+            print(f"Token refresh failed: {e}")
+
+    tokens = login_with_browser(config, user_hint=user)
+    if not is_same_user(tokens, user):
+        raise ValueError(f"Logged in as {token_identity(tokens)}, but {user} was requested")
+    cache.put(config, user, tokens)
+    tokens = cache.get(config, user)
+    print(f"✓ Logged in: {describe_identity(tokens)}")
+    return tokens
+
+
+class TokenManager:
+    """アクセストークンをバックグラウンドで更新し続ける（長時間実行向け）
+
+    access_token プロパティは常に有効期限内のトークンを返す。
+    更新に失敗した場合は一定時間後に再試行する（その間は既存トークンを返す）。
+    """
+
+    RETRY_INTERVAL_SECONDS = 30
+
+    def __init__(self, config: GatewayConfig, user: str, cache: TokenCache = None):
+        self.config = config
+        self.user = user
+        self.cache = cache or TokenCache()
+        self._tokens = get_tokens(config, user, self.cache)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._refresh_loop, name=f"token-refresh-{user}", daemon=True)
+        self.refresh_count = 0
+
+    @property
+    def access_token(self) -> str:
+        with self._lock:
+            return self._tokens["access_token"]
+
+    def start(self) -> "TokenManager":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def __enter__(self) -> "TokenManager":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _refresh_loop(self):
+        while True:
+            with self._lock:
+                wait = self._tokens.get("expires_at", 0) - TOKEN_EXPIRY_MARGIN_SECONDS - time.time()
+            if self._stop.wait(max(wait, 0)):
+                return
+            try:
+                with self._lock:
+                    refresh_token = self._tokens["refresh_token"]
+                tokens = refresh_tokens(self.config, refresh_token)
+                self.cache.put(self.config, self.user, tokens)
+                with self._lock:
+                    self._tokens = self.cache.get(self.config, self.user)
+                self.refresh_count += 1
+                print(f"✓ Token refreshed in background ({self.user})")
+            except (requests.RequestException, KeyError) as e:
+                print(f"✗ Background token refresh failed ({self.user}): {e}")
+                if self._stop.wait(self.RETRY_INTERVAL_SECONDS):
+                    return
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+HTTP リクエストのフェーズ毎のタイミング計測
+
+requests / httpx はリクエスト全体の時間しか返さないため、名前解決・TCP 接続・TLS ハンドシェイクを
+socket / ssl で個別に実行して計測し、確立した接続を http.client に渡してリクエストを送信する。
+
+フェーズ:
+    dns       : 名前解決（getaddrinfo）
+    connect   : TCP 接続（SYN から確立まで。おおよそ 1 RTT で、リージョンとの距離の目安になる）
+    tls       : TLS ハンドシェイク
+    ttfb      : リクエストの送信開始からレスポンスヘッダーの受信まで（Gateway・Interceptor・ツールの処理時間を含む）
+    transfer  : レスポンスボディの受信
+
+keep-alive の接続では、2 回目以降のリクエストの dns / connect / tls は 0 になる（reused=True）。
+レスポンスに Server-Timing ヘッダー（Interceptor のステージ毎の処理時間）があれば、ttfb の内訳として記録する。
+HTTP(S)_PROXY の設定は使用しない（プロキシ経由の環境では接続先がプロキシになるため計測できない）。
+"""
+
+import http.client
+import socket
+import ssl
+import time
+import urllib.parse
+from dataclasses import asdict, dataclass, field
+
+from loadgen import summarize
+
+# 集計・表示するフェーズ（順序はリクエストの流れ）
+PHASES = ("dns", "connect", "tls", "ttfb", "transfer")
+
+
+@dataclass
+class PhaseTiming:
+    """1 リクエストのフェーズ毎の時間 (ms)"""
+
+    dns: float = 0.0
+    connect: float = 0.0
+    tls: float = 0.0
+    ttfb: float = 0.0
+    transfer: float = 0.0
+    reused: bool = False  # keep-alive で既存の接続を再利用したか
+    address: str = ""  # 接続先の IP アドレス
+    status: int = 0
+    server: dict[str, float] = field(default_factory=dict)  # Server-Timing（メトリクス名: ms）
+
+    @property
+    def total(self) -> float:
+        return sum(getattr(self, phase) for phase in PHASES)
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "total": self.total}
+
+
+def parse_server_timing(value: str) -> dict[str, float]:
+    """Server-Timing ヘッダーの値を {メトリクス名: dur (ms)} に変換する（dur のないメトリクスは除く）"""
+    timings = {}
+    for entry in value.split(","):
+        name, *params = (part.strip() for part in entry.split(";"))
+        for param in params:
+            key, _, duration = param.partition("=")
+            if name and key.strip() == "dur":
+                try:
+                    timings[name] = float(duration.strip('" '))
+                except ValueError:
+                    pass
+    return timings
+
+
+def _elapsed_ms(start: float) -> float:
+    return (time.perf_counter() - start) * 1000
+
+
+class TimedConnection:
+    """接続の確立をフェーズ毎に計測する HTTP(S) 接続
+
+    keep_alive=False の場合はリクエスト毎に接続を閉じ、毎回名前解決から行う（コールドな接続）。
+    keep_alive=True の場合は、サーバーが接続を閉じない限り同じ接続を再利用する。
+    """
+
+    def __init__(self, url: str, keep_alive: bool = True, timeout: float = 30.0):
+        parsed = urllib.parse.urlparse(url)
+        self.scheme = parsed.scheme
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.path = parsed.path or "/"
+        if parsed.query:
+            self.path += f"?{parsed.query}"
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self._ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        self._connection: http.client.HTTPConnection | None = None
+
+    def _open(self, timing: PhaseTiming) -> http.client.HTTPConnection:
+        start = time.perf_counter()
+        addresses = socket.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+        timing.dns = _elapsed_ms(start)
+
+        # socket.create_connection と同様に、接続できるアドレスが見つかるまで順に試す
+        error = None
+        for family, socktype, proto, _, address in addresses:
+            sock = socket.socket(family, socktype, proto)
+            sock.settimeout(self.timeout)
+            start = time.perf_counter()
+            try:
+                sock.connect(address)
+            except OSError as e:
+                sock.close()
+                error = e
+                continue
+            timing.connect = _elapsed_ms(start)
+            timing.address = address[0]
+            break
+        else:
+            raise error or OSError(f"getaddrinfo returned no addresses: {self.host}")
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        if self._ssl_context is not None:
+            start = time.perf_counter()
+            try:
+                sock = self._ssl_context.wrap_socket(sock, server_hostname=self.host)
+            except (OSError, ssl.SSLError):
+                sock.close()
+                raise
+            timing.tls = _elapsed_ms(start)
+            connection = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        # 確立済みのソケットを渡す（http.client に接続させない）
+        connection.sock = sock
+        return connection
+
+    def request(self, method: str, headers: dict, body: bytes = None) -> tuple[bytes, PhaseTiming]:
+        """リクエストを送信し、(レスポンスボディ, フェーズ毎の時間) を返す"""
+        timing = PhaseTiming()
+        if self._connection is None:
+            self._connection = self._open(timing)
+        else:
+            timing.reused = True
+            timing.address = self._connection.sock.getpeername()[0]
+
+        try:
+            start = time.perf_counter()
+            self._connection.request(method, self.path, body=body, headers=headers)
+            response = self._connection.getresponse()
+            timing.ttfb = _elapsed_ms(start)
+            timing.status = response.status
+            timing.server = parse_server_timing(response.getheader("Server-Timing", ""))
+
+            start = time.perf_counter()
+            data = response.read()
+            timing.transfer = _elapsed_ms(start)
+        except Exception:
+            self.close()
+            raise
+
+        if not self.keep_alive or response.will_close:
+            self.close()
+        return data, timing
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self) -> "TimedConnection":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def summarize_phases(timings: list[PhaseTiming]) -> dict:
+    """フェーズ毎の平均・p50・p99 (ms) を集計する"""
+    summary = {}
+    for phase in (*PHASES, "total"):
+        values = [getattr(t, phase) for t in timings]
+        stats = summarize(values)
+        summary[phase] = {k: stats[k] for k in ("mean", "p50", "p99")} if values else {}
+    server_names = dict.fromkeys(name for t in timings for name in t.server)
+    if server_names:
+        summary["server"] = {
+            name: summarize([t.server[name] for t in timings if name in t.server])["mean"] for name in server_names
+        }
+    summary["reused"] = sum(t.reused for t in timings)
+    summary["count"] = len(timings)
+    return summary
+
+
+def format_comparison(summaries: dict[str, dict]) -> str:
+    """接続方式（cold / keep-alive 等）毎のフェーズ別の集計を横並びで表示する"""
+    names = list(summaries)
+    width = 22
+    lines = [
+        f"{'phase':<10}" + "".join(f"{name:>{width}}" for name in names),
+        f"{'':<10}" + "".join(f"{'mean / p50 / p99 ms':>{width}}" for _ in names),
+    ]
+    for phase in (*PHASES, "total"):
+        cells = []
+        for name in names:
+            stats = summaries[name].get(phase) or {}
+            cells.append(
+                f"{stats.get('mean', 0):>6.1f} / {stats.get('p50', 0):>5.1f} / {stats.get('p99', 0):>5.1f}".rjust(width)
+            )
+        lines.append(f"{phase:<10}" + "".join(cells))
+    lines.append(
+        f"{'reused':<10}"
+        + "".join(f"{summaries[name]['reused']}/{summaries[name]['count']}".rjust(width) for name in names)
+    )
+    return "\n".join(lines)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+非同期ロードジェネレーター
+
+AgentCore Gateway へ並行リクエストを送信し、スループットとテールレイテンシーを計測する。
+
+- closed-loop: 指定した並行数のワーカーが応答を待ってから次のリクエストを送信
+- open-loop: 目標 RPS に従って送信時刻を決め、応答を待たずに送信
+  （Coordinated Omission 補正のため、レイテンシーは「予定送信時刻」から計測）
+- ウォームアップ期間中のリクエストは集計から除外
+- soak: 長時間実行し、一定時間のウィンドウ毎に集計（レイテンシーの推移・エラー率を追跡）
+- httpx.AsyncClient でコネクションを再利用
+"""
+
+import asyncio
+import math
+import statistics
+import time
+from collections import Counter
+from collections.abc import Awaitable, Callable
+from dataclasses import asdict, dataclass
+
+import httpx
+
+# 集計するパーセンタイル
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+# ヒストグラムの 1 桁（10 倍）あたりのバケット数
+HISTOGRAM_BUCKETS_PER_DECADE = 10
+
+
+@dataclass
+class LoadConfig:
+    """ロード設定"""
+
+    concurrency: int = 10
+    rps: float | None = None  # None の場合は closed-loop
+    duration_s: float = 30.0
+    warmup_s: float = 5.0
+    timeout_s: float = 30.0
+
+
+@dataclass
+class RequestResult:
+    """1 リクエストの結果（send 関数が返す）"""
+
+    label: str
+    error: str | None = None  # None なら成功。エラー種別を文字列で返す
+
+
+@dataclass
+class Sample:
+    """1 リクエストの計測値"""
+
+    label: str
+    intended_start: float  # 予定送信時刻 (perf_counter)
+    start: float  # 実送信時刻
+    end: float
+    error: str | None
+
+    @property
+    def latency_ms(self) -> float:
+        """予定送信時刻からのレイテンシー（Coordinated Omission 補正済み）"""
+        return (self.end - self.intended_start) * 1000
+
+    @property
+    def service_time_ms(self) -> float:
+        """実送信時刻からのレイテンシー"""
+        return (self.end - self.start) * 1000
+
+
+SendFn = Callable[[httpx.AsyncClient, int], Awaitable[RequestResult]]
+RecordFn = Callable[[Sample], None]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """線形補間でパーセンタイルを計算する（sorted_values はソート済みであること）"""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (q / 100) * (len(sorted_values) - 1)
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    if lower == upper:
+        return sorted_values[lower]
+    weight = rank - lower
+    return sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+
+def summarize(values: list[float]) -> dict:
+    """レイテンシー (ms) の統計量を計算する"""
+    if not values:
+        return {"count": 0}
+    sorted_values = sorted(values)
+    summary = {
+        "count": len(sorted_values),
+        "mean": statistics.fmean(sorted_values),
+        "stdev": statistics.stdev(sorted_values) if len(sorted_values) > 1 else 0.0,
+        "min": sorted_values[0],
+        "max": sorted_values[-1],
+    }
+    for q in PERCENTILES:
+        summary[f"p{q:g}"] = percentile(sorted_values, q)
+    return summary
+
+
+def histogram(values: list[float]) -> list[dict]:
+    """対数スケールのバケットでヒストグラムを作成する
+
+    Returns:
+        [{"le": バケット上限 (ms), "count": 件数}, ...]（件数 0 のバケットは省略）
+    """
+    counts: Counter[int] = Counter()
+    for value in values:
+        # 0.1ms 未満は最小バケットにまとめる
+        index = math.ceil(math.log10(max(value, 0.1)) * HISTOGRAM_BUCKETS_PER_DECADE)
+        counts[index] += 1
+    return [
+        {"le": round(10 ** (index / HISTOGRAM_BUCKETS_PER_DECADE), 3), "count": counts[index]}
+        for index in sorted(counts)
+    ]
+
+
+def classify_exception(e: Exception) -> str:
+    """例外をエラー種別に変換する"""
+    return type(e).__name__
+
+
+def classify_response(response: httpx.Response) -> str | None:
+    """HTTP / JSON-RPC レスポンスをエラー種別に変換する（成功なら None）"""
+    if response.status_code != 200:
+        return f"http_{response.status_code}"
+    try:
+        body = response.json()
+    except ValueError:
+        return "invalid_json"
+    if isinstance(body, dict) and "error" in body:
+        return f"jsonrpc_{body['error'].get('code')}"
+    return None
+
+
+@dataclass
+class LoadRun:
+    """ロード実行結果（ウォームアップ後の計測値のみ）"""
+
+    samples: list[Sample]
+    measure_start: float
+
+
+def _new_client(config: LoadConfig) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.concurrency,
+        max_keepalive_connections=config.concurrency,
+    )
+    return httpx.AsyncClient(limits=limits, timeout=config.timeout_s)
+
+
+async def _run(
+    client: httpx.AsyncClient, send: SendFn, config: LoadConfig, t0: float, record: RecordFn
+) -> None:
+    if config.rps:
+        await _run_open_loop(client, send, config, t0, record)
+    else:
+        await _run_closed_loop(client, send, config, t0, record)
+
+
+async def run_load(send: SendFn, config: LoadConfig) -> LoadRun:
+    """ロードを実行し、ウォームアップ後の計測値を返す"""
+    samples: list[Sample] = []
+    async with _new_client(config) as client:
+        t0 = time.perf_counter()
+        await _run(client, send, config, t0, samples.append)
+
+    measure_start = t0 + config.warmup_s
+    measured = [s for s in samples if s.intended_start >= measure_start]
+    return LoadRun(samples=measured, measure_start=measure_start)
+
+
+async def run_soak(
+    send: SendFn, config: LoadConfig, window_s: float, on_window: Callable[[int, LoadRun], None]
+) -> None:
+    """長時間のロードを実行し、window_s 秒毎の計測値を on_window に渡す
+
+    計測値はウィンドウ毎に破棄するため、数時間の実行でもメモリ使用量は一定。
+    """
+    window: list[Sample] = []
+    measure_start = window_start = 0.0
+    index = 0
+
+    def record(sample: Sample):
+        if sample.intended_start >= measure_start:
+            window.append(sample)
+
+    def flush():
+        nonlocal window, window_start, index
+        samples, window = window, []
+        run = LoadRun(samples=samples, measure_start=window_start)
+        window_start = time.perf_counter()
+        on_window(index, run)
+        index += 1
+
+    async def reporter():
+        while True:
+            await asyncio.sleep(max(0.0, window_start + window_s - time.perf_counter()))
+            flush()
+
+    async with _new_client(config) as client:
+        t0 = time.perf_counter()
+        measure_start = window_start = t0 + config.warmup_s
+        report_task = asyncio.create_task(reporter())
+        try:
+            await _run(client, send, config, t0, record)
+        finally:
+            report_task.cancel()
+    # 最後のウィンドウ（送信終了後に完了したリクエストを含む）
+    if window:
+        flush()
+
+
+async def _execute(
+    client: httpx.AsyncClient, send: SendFn, seq: int, intended_start: float
+) -> Sample:
+    start = time.perf_counter()
+    try:
+        result = await send(client, seq)
+        label, error = result.label, result.error
+    except Exception as e:
+        label, error = "unknown", classify_exception(e)
+    return Sample(label, intended_start, start, time.perf_counter(), error)
+
+
+async def _run_closed_loop(
+    client: httpx.AsyncClient, send: SendFn, config: LoadConfig, t0: float, record: RecordFn
+) -> None:
+    """並行数分のワーカーが応答を待ってから次を送信する"""
+    end = t0 + config.warmup_s + config.duration_s
+    seq = 0
+
+    async def worker():
+        nonlocal seq
+        while (now := time.perf_counter()) < end:
+            seq += 1
+            record(await _execute(client, send, seq, now))
+
+    await asyncio.gather(*(worker() for _ in range(config.concurrency)))
+
+
+async def _run_open_loop(
+    client: httpx.AsyncClient, send: SendFn, config: LoadConfig, t0: float, record: RecordFn
+) -> None:
+    """目標 RPS の予定時刻に従って送信する（応答を待たない）
+
+    並行数の上限に達した場合はセマフォで待機するが、レイテンシーは予定送信時刻から
+    計測するため、待ち時間も含めたユーザー視点の値になる（Coordinated Omission 補正）。
+    """
+    semaphore = asyncio.Semaphore(config.concurrency)
+    interval = 1 / config.rps
+    end = t0 + config.warmup_s + config.duration_s
+
+    async def limited(seq: int, intended_start: float):
+        async with semaphore:
+            record(await _execute(client, send, seq, intended_start))
+
+    pending: set[asyncio.Task] = set()
+    seq = 0
+    while (intended_start := t0 + seq * interval) < end:
+        delay = intended_start - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(limited(seq, intended_start))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+        seq += 1
+    if pending:
+        await asyncio.gather(*pending)
+
+
+def build_report(run: LoadRun, config: LoadConfig) -> dict:
+    """計測値から JSON 出力用のレポートを作成する"""
+    samples = run.samples
+    succeeded = [s for s in samples if s.error is None]
+    errors = Counter(s.error for s in samples if s.error is not None)
+    elapsed_s = max((s.end for s in samples), default=run.measure_start) - run.measure_start
+
+    by_label: dict[str, dict] = {}
+    for label in sorted({s.label for s in samples}):
+        label_samples = [s for s in samples if s.label == label]
+        by_label[label] = {
+            "requests": len(label_samples),
+            "errors": sum(1 for s in label_samples if s.error is not None),
+            "latency_ms": summarize([s.latency_ms for s in label_samples if s.error is None]),
+        }
+
+    report = {
+        "mode": "open-loop" if config.rps else "closed-loop",
+        "config": asdict(config),
+        "requests": len(samples),
+        "successes": len(succeeded),
+        "errors": len(samples) - len(succeeded),
+        "elapsed_s": elapsed_s,
+        "throughput_rps": len(samples) / elapsed_s if elapsed_s > 0 else 0.0,
+        "latency_ms": summarize([s.latency_ms for s in succeeded]),
+        "histogram_ms": histogram([s.latency_ms for s in succeeded]),
+        "errors_by_kind": dict(errors.most_common()),
+        "by_label": by_label,
+    }
+    if config.rps:
+        # 補正なし（実送信時刻から）の値も併記して、キューイングの影響を確認できるようにする
+        report["service_time_ms"] = summarize([s.service_time_ms for s in succeeded])
+    return report
+
+
+def format_report(report: dict) -> str:
+    """レポートを人間向けのテキストに整形する"""
+    latency = report["latency_ms"]
+    lines = [
+        "=" * 60,
+        f"=== ロード計測結果 ({report['mode']}) ===",
+        "=" * 60,
+        f"リクエスト数:   {report['requests']} 件 (エラー {report['errors']} 件)",
+        f"スループット:   {report['throughput_rps']:.2f} req/s",
+    ]
+    if latency.get("count"):
+        lines += [
+            f"平均:           {latency['mean']:.2f} ms",
+            *(f"{f'p{q:g}:':<16}{latency[f'p{q:g}']:.2f} ms" for q in PERCENTILES),
+            f"最大値:         {latency['max']:.2f} ms",
+        ]
+    for kind, count in report["errors_by_kind"].items():
+        lines.append(f"  エラー {kind}: {count} 件")
+    lines.append("=" * 60)
+    return "\n".join(lines)
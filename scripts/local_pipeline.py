@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+ローカル E2E パイプラインハーネス
+
+デプロイせずに、Gateway Interceptors 方式でツール呼び出しが通る経路全体をプロセス内で実行・計測する。
+
+    Request Interceptor (lambda/request/index.py)
+      → MCP サーバーのツール (mcp_server/src/mcp_server.py の FastMCP)
+      → Response Interceptor (lambda/response/index.py)
+
+- JWT は偽の Cognito 発行者（ローカル RSA 鍵 + ローカル HTTP サーバーで配信する JWKS）で署名
+- ロール等のカスタムクレームは Pre Token Lambda (lambda/pre_token/index.py) の擬似 DB から取得
+- リクエストはシナリオファイル (scenarios/*.json) から生成し、期待する認可結果も検証
+- ステージ毎のレイテンシーと、並行実行時のスループットを出力
+- Interceptor が返す Server-Timing ヘッダーから、Interceptor 内のステージ（JWKS・JWT 検証・認可等）の内訳も集計
+
+使い方:
+    uv run python local_pipeline.py scenarios/mixed_methods.json --concurrency 8 --requests 2000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+import sync_cedar_policies
+from benchmark_history import save_run
+from benchmark_scenarios import DENIED, build_schedule, is_denied, load_scenario, resolve_steps
+from http_timing import parse_server_timing
+from loadgen import summarize
+
+INTERCEPTORS_DIR = Path(__file__).resolve().parent.parent / "cdk-agentcore-gw-interceptors"
+
+LOCAL_TARGET_NAME = "mcp-target-local"
+LOCAL_CLIENT_ID = "local-pipeline-client"
+
+STAGES = ("request_interceptor", "mcp_server", "response_interceptor", "total")
+
+
+# =============================================================================
+# Fake Cognito Issuer
+# =============================================================================
+class FakeCognitoIssuer:
+    """ローカル RSA 鍵でアクセストークンを署名し、JWKS をローカル HTTP サーバーで配信する"""
+
+    def __init__(self, client_id: str = LOCAL_CLIENT_ID):
+        self.client_id = client_id
+        self.kid = f"local-{uuid.uuid4().hex[:8]}"
+        self._private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+        jwk = json.loads(RSAAlgorithm.to_jwk(self._private_key.public_key()))
+        jwk.update({"kid": self.kid, "alg": "RS256", "use": "sig"})
+        jwks = json.dumps({"keys": [jwk]}).encode()
+
+        class JWKSHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(jwks)))
+                self.end_headers()
+                self.wfile.write(jwks)
+
+            def log_message(self, format, *args):
+                pass  # Suppress logs
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), JWKSHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def issuer(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def jwks_url(self) -> str:
+        return f"{self.issuer}/.well-known/jwks.json"
+
+    def issue_token(self, custom_claims: dict, username: str, expires_in: int = 3600) -> str:
+        """Cognito のアクセストークンと同じ形式のクレームで JWT を発行する"""
+        now = int(time.time())
+        claims = {
+            "sub": str(uuid.uuid5(uuid.NAMESPACE_URL, username)),
+            "iss": self.issuer,
+            "client_id": self.client_id,
+            "token_use": "access",
+            "scope": "openid email",
+            "username": username,
+            "iat": now,
+            "exp": now + expires_in,
+            **custom_claims,
+        }
+        return jwt.encode(claims, self._private_key, algorithm="RS256", headers={"kid": self.kid})
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# =============================================================================
+# Pipeline
+# =============================================================================
+def load_module(name: str, path: Path, layers: tuple[Path, ...] = ()):
+    """ファイルパスからモジュールを読み込む（Lambda はいずれも index.py のため名前を付け替える）
+
+    Lambda と同様に、同じディレクトリと Lambda レイヤー（layers）のモジュールを import できるようにする。
+    Request / Response で同名のモジュールがあるため、読み込んだ同ディレクトリ・レイヤーのモジュールは
+    sys.modules から外して Lambda 毎に別々に読み込まれるようにする。
+    """
+    directories = [str(path.parent), *(str(layer) for layer in layers)]
+    before = set(sys.modules)
+    sys.path[:0] = directories
+    try:
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    finally:
+        for directory in directories:
+            sys.path.remove(directory)
+    for added in set(sys.modules) - before - {name}:
+        file = getattr(sys.modules[added], "__file__", None) or ""
+        if any(file.startswith(directory + os.sep) for directory in directories):
+            del sys.modules[added]
+    return module
+
+
+class LocalPipeline:
+    """Request Interceptor → MCP サーバー → Response Interceptor をプロセス内で実行する"""
+
+    def __init__(
+        self,
+        issuer: FakeCognitoIssuer,
+        target_name: str = LOCAL_TARGET_NAME,
+        rate_limit: bool = False,
+        response_cache: bool = False,
+        authorization_mode: str = "role",
+        trace_output: str = None,
+        audit_output: str = None,
+    ):
+        self.issuer = issuer
+        self.target_name = target_name
+
+        # Cedar ポリシーは AgentCore Policy 方式と同じものを評価するため、生成元と異なれば計測しない
+        if authorization_mode == "cedar" and not sync_cedar_policies.is_up_to_date():
+            raise RuntimeError("policies.cedar is out of date. Run: uv run python sync_cedar_policies.py")
+
+        # Lambda はモジュール読み込み時に環境変数を参照するため、先に設定する
+        os.environ.update(
+            {
+                "TARGET_NAME": target_name,
+                "JWKS_URL": issuer.jwks_url,
+                "CLIENT_ID": issuer.client_id,
+                # 同じユーザーで高頻度に呼び出すため、レート制限は既定で無効にする
+                "RATE_LIMIT_ENABLED": str(rate_limit).lower(),
+                # ターゲットの処理時間を計測するため、レスポンスキャッシュは既定で無効にする
+                "RESPONSE_CACHE_ENABLED": str(response_cache).lower(),
+                "AUTHORIZATION_MODE": authorization_mode,
+                # 指定時は全イベントをトレースとして記録する（replay_trace.py で再生）
+                "TRACE_SAMPLE_RATE": "1" if trace_output else "0",
+                "TRACE_OUTPUT": trace_output or "stdout",
+                # 監査ログは書き込みスレッドが非同期に出力するため、指定がなければ標準出力ではなくメモリに書き込む
+                "AUDIT_SINK": f"file:{audit_output}" if audit_output else "memory",
+            }
+        )
+        lambda_dir = INTERCEPTORS_DIR / "lambda"
+        # Request / Response Interceptor の共通モジュール（デプロイ環境では Lambda レイヤーの /opt/python）
+        layers = (lambda_dir / "layer" / "python",)
+        self.pre_token = load_module("pre_token_lambda", lambda_dir / "pre_token" / "index.py")
+        self.request_interceptor = load_module(
+            "request_interceptor_lambda", lambda_dir / "request" / "index.py", layers
+        )
+        self.response_interceptor = load_module(
+            "response_interceptor_lambda", lambda_dir / "response" / "index.py", layers
+        )
+        # デプロイ環境の共有キャッシュ（DynamoDB）の代わりに、同じインスタンスを両方の Interceptor で使う
+        self.response_interceptor.response_cache = self.request_interceptor.response_cache
+        self.mcp = load_module("mcp_server", INTERCEPTORS_DIR / "mcp_server" / "src" / "mcp_server.py").mcp
+
+    def issue_token(self, email: str) -> str:
+        """Pre Token Lambda と同じカスタムクレームでトークンを発行する"""
+        return self.issuer.issue_token(self.pre_token.get_user_claims(email), username=email)
+
+    async def call(self, token: str, method: str, params: dict, request_id: int) -> tuple[int, dict, dict]:
+        """1 リクエストをパイプラインに通す
+
+        Returns:
+            (ステータスコード, クライアントへ返るボディ, ステージ毎の処理時間 ms)
+            ステージ毎の処理時間には、Server-Timing の Interceptor 内のステージ（"req-jwt" 等）も含む
+        """
+        timings = {}
+        headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+        body = {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        started = time.perf_counter()
+
+        # 1. Request Interceptor（Lambda ハンドラーは同期関数のためスレッドで実行）
+        stage_start = time.perf_counter()
+        request_output = await asyncio.to_thread(
+            self.request_interceptor.lambda_handler,
+            {"interceptorInputVersion": "1.0", "mcp": {"gatewayRequest": {"headers": headers, "body": body}}},
+            None,
+        )
+        timings["request_interceptor"] = (time.perf_counter() - stage_start) * 1000
+
+        # Request Interceptor が直接レスポンスを返した場合（拒否等）はターゲットを呼び出さない
+        if response := request_output["mcp"].get("transformedGatewayResponse"):
+            timings["total"] = (time.perf_counter() - started) * 1000
+            timings.update(parse_server_timing(response.get("headers", {}).get("Server-Timing", "")))
+            return response.get("statusCode", 200), response["body"], timings
+        forwarded = request_output["mcp"]["transformedGatewayRequest"]["body"]
+        # Request Interceptor が付与したヘッダー（Server-Timing）を Response Interceptor に引き継ぐ
+        forwarded_headers = {**headers, **request_output["mcp"]["transformedGatewayRequest"].get("headers", {})}
+
+        # 2. MCP サーバー（FastMCP のツールを直接呼び出す）
+        stage_start = time.perf_counter()
+        target_body = await self.dispatch(forwarded)
+        timings["mcp_server"] = (time.perf_counter() - stage_start) * 1000
+
+        # 3. Response Interceptor
+        stage_start = time.perf_counter()
+        response_output = await asyncio.to_thread(
+            self.response_interceptor.lambda_handler,
+            {
+                "interceptorInputVersion": "1.0",
+                "mcp": {
+                    "gatewayRequest": {"headers": forwarded_headers, "body": forwarded},
+                    "gatewayResponse": {"statusCode": 200, "headers": headers, "body": target_body},
+                },
+            },
+            None,
+        )
+        timings["response_interceptor"] = (time.perf_counter() - stage_start) * 1000
+        timings["total"] = (time.perf_counter() - started) * 1000
+
+        response = response_output["mcp"]["transformedGatewayResponse"]
+        timings.update(parse_server_timing(response.get("headers", {}).get("Server-Timing", "")))
+        return response.get("statusCode", 200), response["body"], timings
+
+    async def dispatch(self, body: dict) -> dict:
+        """Gateway が Target に転送する JSON-RPC リクエストを FastMCP で処理する"""
+        method = body.get("method")
+        params = body.get("params") or {}
+        prefix = f"{self.target_name}___"
+
+        if method == "initialize":
+            result = {
+                "protocolVersion": params.get("protocolVersion", "2025-03-26"),
+                "capabilities": {"tools": {"listChanged": False}},
+                "serverInfo": {"name": self.mcp.name, "version": "local"},
+            }
+        elif method == "tools/list":
+            tools = await self.mcp.list_tools()
+            result = {
+                "tools": [
+                    {**tool.model_dump(by_alias=True, exclude_none=True), "name": f"{prefix}{tool.name}"}
+                    for tool in tools
+                ]
+            }
+        elif method == "tools/call" and params.get("name", "").startswith(prefix):
+            result = await self.call_tool(params["name"].removeprefix(prefix), params.get("arguments") or {})
+        else:
+            return {
+                "jsonrpc": "2.0",
+                "id": body.get("id"),
+                "error": {"code": -32601, "message": f"Method not available locally: {method}"},
+            }
+        return {"jsonrpc": "2.0", "id": body.get("id"), "result": result}
+
+    async def call_tool(self, name: str, arguments: dict) -> dict:
+        try:
+            converted = await self.mcp.call_tool(name, arguments)
+        except Exception as e:
+            return {"content": [{"type": "text", "text": str(e)}], "isError": True}
+
+        # 出力スキーマを持つツールは (content, structuredContent) のタプルを返す
+        if isinstance(converted, tuple):
+            content, structured = converted
+        else:
+            content, structured = converted, None
+        result = {
+            "content": [block.model_dump(by_alias=True, exclude_none=True) for block in content],
+            "isError": False,
+        }
+        if structured is not None:
+            result["structuredContent"] = structured
+        return result
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+async def run_benchmark(
+    pipeline: LocalPipeline, scenario: dict, concurrency: int, num_requests: int, warmup: int
+) -> dict:
+    """シナリオに従ってパイプラインを並行実行し、ステージ毎のレイテンシーを集計する"""
+    steps = resolve_steps(scenario, "interceptors", pipeline.target_name)
+    schedule = build_schedule(steps)
+    users = scenario.get("users", {})
+    tokens = {step.user: pipeline.issue_token(users.get(step.user, step.user)) for step in steps}
+
+    records: list[tuple[str, dict, str | None]] = []
+    next_seq = 0
+
+    async def worker():
+        nonlocal next_seq
+        while next_seq < warmup + num_requests:
+            seq = next_seq
+            next_seq += 1
+            step = schedule[seq % len(schedule)]
+            status, body, timings = await pipeline.call(tokens[step.user], step.method, step.params, seq)
+            denied = is_denied(status, body)
+            error = None
+            if step.expect == DENIED and not denied:
+                error = "unexpected_allow"
+            elif step.expect != DENIED and denied:
+                error = "unexpected_deny"
+            if seq >= warmup:
+                records.append((step.name, timings, error))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed_s = time.perf_counter() - started
+
+    def stage_summary(selected):
+        return {stage: summarize([t[stage] for _, t, _ in selected if stage in t]) for stage in STAGES}
+
+    # Server-Timing の Interceptor 内のステージ（Request Interceptor → Response Interceptor の順、それぞれ出現順）
+    interceptor_stages = sorted(
+        dict.fromkeys(name for _, t, _ in records for name in t if name not in STAGES),
+        key=lambda name: not name.startswith("req-"),
+    )
+
+    errors: dict[str, int] = {}
+    for _, _, error in records:
+        if error:
+            errors[error] = errors.get(error, 0) + 1
+
+    return {
+        "scenario": scenario.get("name"),
+        "concurrency": concurrency,
+        "latencies_ms": [t["total"] for _, t, _ in records],
+        "requests": len(records),
+        "elapsed_s": elapsed_s,
+        "throughput_rps": (warmup + num_requests) / elapsed_s,
+        "stages_ms": stage_summary(records),
+        "interceptor_stages_ms": {
+            stage: summarize([t[stage] for _, t, _ in records if stage in t]) for stage in interceptor_stages
+        },
+        "by_step": {
+            step.name: stage_summary([r for r in records if r[0] == step.name]) for step in steps
+        },
+        "errors_by_kind": errors,
+    }
+
+
+def format_benchmark(report: dict) -> str:
+    """ステージ毎のレイテンシーを人間向けのテキストに整形する"""
+    lines = [
+        "=" * 72,
+        f"=== ローカルパイプライン計測結果 (並行数 {report['concurrency']}) ===",
+        "=" * 72,
+        f"リクエスト数: {report['requests']} 件 / スループット: {report['throughput_rps']:.1f} req/s",
+        f"{'stage':<24}{'mean':>10}{'p50':>10}{'p90':>10}{'p99':>10}{'count':>8}",
+    ]
+    for stage, summary in report["stages_ms"].items():
+        if summary.get("count"):
+            lines.append(
+                f"{stage:<24}{summary['mean']:>10.3f}{summary['p50']:>10.3f}"
+                f"{summary['p90']:>10.3f}{summary['p99']:>10.3f}{summary['count']:>8}"
+            )
+    if report.get("interceptor_stages_ms"):
+        lines.append("-" * 72)
+        lines.append("Interceptor 内のステージ (Server-Timing)")
+        for stage, summary in report["interceptor_stages_ms"].items():
+            lines.append(
+                f"  {stage:<22}{summary['mean']:>10.3f}{summary['p50']:>10.3f}"
+                f"{summary['p90']:>10.3f}{summary['p99']:>10.3f}{summary['count']:>8}"
+            )
+    for kind, count in report["errors_by_kind"].items():
+        lines.append(f"  エラー {kind}: {count} 件")
+    lines.append("=" * 72)
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Interceptor → MCP サーバー → Interceptor のローカル計測")
+    parser.add_argument("scenario", nargs="?", default="scenarios/mixed_methods.json", help="シナリオファイル (JSON)")
+    parser.add_argument("--concurrency", type=int, default=8, help="並行数")
+    parser.add_argument("--requests", type=int, default=1000, help="計測するリクエスト数")
+    parser.add_argument("--warmup", type=int, default=50, help="集計から除外する最初のリクエスト数")
+    parser.add_argument("--rate-limit", action="store_true", help="Request Interceptor のレート制限を有効にする")
+    parser.add_argument(
+        "--authorization-mode",
+        choices=["role", "cedar"],
+        default="role",
+        help="Interceptor の認可方式（cedar: AgentCore Policy と同じ Cedar ポリシーを評価）",
+    )
+    parser.add_argument(
+        "--response-cache", action="store_true", help="冪等なツールのレスポンスキャッシュを有効にする"
+    )
+    parser.add_argument("--record", metavar="TRACE_PATH", help="Interceptor のイベントをトレースとして記録する")
+    parser.add_argument("--audit", metavar="AUDIT_PATH", help="認可の判断の監査ログを JSONL に出力する")
+    parser.add_argument("--show-logs", action="store_true", help="Lambda の print 出力を表示する")
+    parser.add_argument("--output", help="結果 JSON の保存先")
+    parser.add_argument("--no-history", action="store_true", help="計測結果を履歴に保存しない")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenario = load_scenario(args.scenario)
+    issuer = FakeCognitoIssuer()
+    try:
+        pipeline = LocalPipeline(
+            issuer,
+            rate_limit=args.rate_limit,
+            response_cache=args.response_cache,
+            authorization_mode=args.authorization_mode,
+            trace_output=args.record,
+            audit_output=args.audit,
+        )
+        # Lambda のデバッグ出力は計測結果を読みにくくするため、既定では捨てる
+        with contextlib.ExitStack() as stack:
+            if not args.show_logs:
+                devnull = stack.enter_context(open(os.devnull, "w"))
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            report = asyncio.run(run_benchmark(pipeline, scenario, args.concurrency, args.requests, args.warmup))
+    finally:
+        issuer.close()
+
+    latencies_ms = report.pop("latencies_ms")
+    print(format_benchmark(report))
+    if not args.no_history:
+        path = save_run(
+            "local_pipeline",
+            latencies_ms,
+            {"scenario": report["scenario"], "concurrency": args.concurrency, "requests": args.requests},
+        )
+        print(f"履歴を保存しました: {path}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"結果を保存しました: {args.output}")
+    if args.audit:
+        # 残りのレコードはプロセスの終了時に書き込まれる
+        print(f"監査ログの出力先: {args.audit}")
+
+
+if __name__ == "__main__":
+    main()
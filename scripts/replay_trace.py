@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Interceptor トレースの再生
+
+Interceptor が記録したトレース（lambda/layer/python/recorder.py、TRACE_SAMPLE_RATE で有効化）を読み込み、
+ローカルの Request / Response Interceptor ハンドラーに元のタイミング（または N 倍速）で再生して、
+イベントの種類（ステージ・メソッド・ツール）毎のレイテンシーを集計する。
+
+- トークンのプレースホルダーは、記録したクレームでローカルの偽 Cognito 発行者が署名し直す
+- CloudWatch Logs から取得した "[TRACE] {...}" 形式の行もそのまま読み込める
+- 権限はターゲット毎に定義するため、ローカルのターゲット名はトレースのツール名（<target>___<tool>）から決める
+  （--target-name で指定も可）
+
+使い方:
+    uv run python replay_trace.py trace.jsonl --speed 10 --concurrency 16
+    uv run python replay_trace.py trace.jsonl --speed 0   # 待機せずに最大速度で再生
+"""
+
+import argparse
+import asyncio
+import contextlib
+import copy
+import json
+import os
+import time
+from collections import Counter
+
+from benchmark_history import save_run
+from loadgen import summarize
+from local_pipeline import LOCAL_TARGET_NAME, FakeCognitoIssuer, LocalPipeline
+
+TOKEN_PLACEHOLDER = "Bearer {{token}}"
+
+
+def load_trace(path: str) -> list[dict]:
+    """トレースファイルを読み込み、記録時刻順に並べる（JSON でない行は無視）"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            start = line.find("{")
+            if start < 0:
+                continue
+            try:
+                record = json.loads(line[start:])
+            except ValueError:
+                continue
+            if isinstance(record, dict) and record.get("stage") in ("request", "response"):
+                records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def trace_target_name(records: list[dict]) -> str:
+    """トレースのツール名（tools/call の name、tools/list の結果）のターゲット部分のうち最も多いもの"""
+    targets = Counter()
+    for record in records:
+        mcp = record["event"].get("mcp", {})
+        body = (mcp.get("gatewayRequest") or {}).get("body") or {}
+        names = [(body.get("params") or {}).get("name")]
+        result = ((mcp.get("gatewayResponse") or {}).get("body") or {}).get("result")
+        if isinstance(result, dict) and isinstance(result.get("tools"), list):
+            names += [tool.get("name") for tool in result["tools"] if isinstance(tool, dict)]
+        targets.update(name.split("___")[0] for name in names if isinstance(name, str) and "___" in name)
+    return targets.most_common(1)[0][0] if targets else LOCAL_TARGET_NAME
+
+
+def event_class(record: dict) -> str:
+    """集計単位: "<stage>:<method>[:<tool>]"（ツール名のターゲット部分は除く）"""
+    mcp = record["event"].get("mcp", {})
+    body = (mcp.get("gatewayRequest") or {}).get("body") or {}
+    method = body.get("method", "unknown")
+    name = (body.get("params") or {}).get("name", "")
+    if method == "tools/call" and name:
+        return f"{record['stage']}:{method}:{name.split('___')[-1]}"
+    return f"{record['stage']}:{method}"
+
+
+class TokenSigner:
+    """記録したクレームでトークンを発行し直す（同じクレームは同じトークンを再利用）"""
+
+    def __init__(self, pipeline: LocalPipeline):
+        self.pipeline = pipeline
+        self._tokens: dict[str, str] = {}
+
+    def sign(self, claims: dict) -> str:
+        key = json.dumps(claims, sort_keys=True)
+        if key not in self._tokens:
+            custom = {k: v for k, v in claims.items() if k not in ("username", "token_use")}
+            username = claims.get("username", "replay-user")
+            self._tokens[key] = self.pipeline.issuer.issue_token(custom, username=username)
+        return self._tokens[key]
+
+
+def materialize(record: dict, signer: TokenSigner) -> dict:
+    """記録したイベントのトークンのプレースホルダーを、署名し直したトークンに置き換える"""
+    event = copy.deepcopy(record["event"])
+    claims = record.get("claims")
+    for message in event.get("mcp", {}).values():
+        headers = message.get("headers") or {}
+        if headers.get("Authorization") == TOKEN_PLACEHOLDER:
+            headers["Authorization"] = f"Bearer {signer.sign(claims)}" if claims else ""
+    return event
+
+
+def outcome(output: dict) -> str:
+    """ハンドラーの出力の種類（転送 / 直接応答のステータスコード）"""
+    mcp = output.get("mcp", {})
+    if "transformedGatewayRequest" in mcp:
+        return "forwarded"
+    return f"status_{mcp.get('transformedGatewayResponse', {}).get('statusCode', 200)}"
+
+
+async def replay(pipeline: LocalPipeline, records: list[dict], speed: float, concurrency: int) -> dict:
+    """トレースを再生し、イベントの種類毎のレイテンシーを集計する
+
+    Args:
+        speed: 再生速度（1.0 で記録時と同じ間隔、0 で待機なし）
+    """
+    signer = TokenSigner(pipeline)
+    handlers = {
+        "request": pipeline.request_interceptor.lambda_handler,
+        "response": pipeline.response_interceptor.lambda_handler,
+    }
+    events = [(record, materialize(record, signer)) for record in records]
+    semaphore = asyncio.Semaphore(concurrency)
+    results: list[tuple[str, float, float, str]] = []
+
+    async def run(record: dict, event: dict, intended: float):
+        async with semaphore:
+            start = time.perf_counter()
+            output = await asyncio.to_thread(handlers[record["stage"]], event, None)
+            end = time.perf_counter()
+        results.append((event_class(record), (end - start) * 1000, (start - intended) * 1000, outcome(output)))
+
+    t0 = records[0]["ts"]
+    started = time.perf_counter()
+    tasks = []
+    for record, event in events:
+        intended = started + (record["ts"] - t0) / speed if speed > 0 else started
+        if (delay := intended - time.perf_counter()) > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run(record, event, intended)))
+    await asyncio.gather(*tasks)
+    elapsed_s = time.perf_counter() - started
+
+    by_class = {}
+    for name in sorted({r[0] for r in results}):
+        selected = [r for r in results if r[0] == name]
+        outcomes: dict[str, int] = {}
+        for r in selected:
+            outcomes[r[3]] = outcomes.get(r[3], 0) + 1
+        by_class[name] = {"latency_ms": summarize([r[1] for r in selected]), "outcomes": outcomes}
+
+    return {
+        "events": len(results),
+        "speed": speed,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed_s,
+        "trace_span_s": records[-1]["ts"] - t0,
+        "throughput_eps": len(results) / elapsed_s if elapsed_s > 0 else 0.0,
+        # 予定時刻からの開始遅れ（並行数不足・処理遅延で再生が追いつかない場合に大きくなる）
+        "schedule_lag_ms": summarize([max(0.0, r[2]) for r in results]),
+        "latencies_ms": [r[1] for r in results],
+        "by_class": by_class,
+    }
+
+
+def format_replay(report: dict) -> str:
+    """イベントの種類毎のレイテンシーを人間向けのテキストに整形する"""
+    lag = report["schedule_lag_ms"]
+    speed = f"{report['speed']:g}x" if report["speed"] > 0 else "最大速度"
+    lines = [
+        "=" * 96,
+        f"=== トレース再生結果 ({speed}, 並行数 {report['concurrency']}) ===",
+        "=" * 96,
+        f"イベント数: {report['events']} 件 / 再生時間: {report['elapsed_s']:.2f} s"
+        f" (記録 {report['trace_span_s']:.2f} s) / {report['throughput_eps']:.1f} events/s",
+        f"開始遅れ: p50 {lag.get('p50', 0):.2f} ms / p99 {lag.get('p99', 0):.2f} ms",
+        f"{'class':<40}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'count':>7}  outcomes",
+    ]
+    for name, entry in report["by_class"].items():
+        s = entry["latency_ms"]
+        outcomes = ", ".join(f"{k}={v}" for k, v in entry["outcomes"].items())
+        lines.append(
+            f"{name:<40}{s['mean']:>9.3f}{s['p50']:>9.3f}{s['p90']:>9.3f}{s['p99']:>9.3f}{s['count']:>7}  {outcomes}"
+        )
+    lines.append("=" * 96)
+    return "\n".join(lines)
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Interceptor トレースの再生")
+    parser.add_argument("trace", help="トレースファイル (JSONL)")
+    parser.add_argument("--speed", type=float, default=1.0, help="再生速度（1: 記録時と同じ間隔、0: 待機なし）")
+    parser.add_argument("--concurrency", type=int, default=8, help="最大並行数")
+    parser.add_argument("--target-name", help="Interceptor のターゲット名（省略時はトレースのツール名から決める）")
+    parser.add_argument("--authorization-mode", choices=["role", "cedar"], default="role", help="Interceptor の認可方式")
+    parser.add_argument("--rate-limit", action="store_true", help="Request Interceptor のレート制限を有効にする")
+    parser.add_argument("--response-cache", action="store_true", help="レスポンスキャッシュを有効にする")
+    parser.add_argument("--show-logs", action="store_true", help="Lambda の print 出力を表示する")
+    parser.add_argument("--output", help="結果 JSON の保存先")
+    parser.add_argument("--no-history", action="store_true", help="計測結果を履歴に保存しない")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    records = load_trace(args.trace)
+    if not records:
+        raise SystemExit(f"{args.trace}: no trace records")
+
+    target_name = args.target_name or trace_target_name(records)
+    print(f"ターゲット: {target_name}")
+
+    issuer = FakeCognitoIssuer()
+    try:
+        pipeline = LocalPipeline(
+            issuer,
+            target_name=target_name,
+            rate_limit=args.rate_limit,
+            response_cache=args.response_cache,
+            authorization_mode=args.authorization_mode,
+        )
+        with contextlib.ExitStack() as stack:
+            if not args.show_logs:
+                devnull = stack.enter_context(open(os.devnull, "w"))
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+            report = asyncio.run(replay(pipeline, records, args.speed, args.concurrency))
+    finally:
+        issuer.close()
+
+    latencies_ms = report.pop("latencies_ms")
+    print(format_replay(report))
+    if not args.no_history:
+        path = save_run(
+            f"replay:{os.path.basename(args.trace)}",
+            latencies_ms,
+            {"trace": args.trace, "speed": args.speed, "concurrency": args.concurrency},
+        )
+        print(f"履歴を保存しました: {path}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"結果を保存しました: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Interceptor の Cedar ポリシー（policies.cedar）の生成・差分チェック
+
+Gateway Interceptors 方式の Cedar 評価モードは、AgentCore Policy 方式
+（cdk-agentcore-policy/lib/constructs/agentcore-policy.ts）と同じポリシーを Lambda レイヤーの
+policies.cedar から読み込む。policies.cedar は agentcore-policy.ts の cedarStatement から生成し、
+手で編集しない。
+
+- ${targetName} / ${gatewayArn} は Interceptor の読み込み時に置換する {{targetName}} / {{gatewayArn}} に変換する
+- 各ポリシーの前には description をコメントとして出力する
+
+使い方:
+    uv run python sync_cedar_policies.py          # policies.cedar を生成
+    uv run python sync_cedar_policies.py --check  # 差分があれば終了コード 1
+"""
+
+import argparse
+import difflib
+import re
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+SOURCE = ROOT_DIR / "cdk-agentcore-policy" / "lib" / "constructs" / "agentcore-policy.ts"
+OUTPUT = ROOT_DIR / "cdk-agentcore-gw-interceptors" / "lambda" / "layer" / "python" / "policies.cedar"
+
+HEADER = """\
+// cdk-agentcore-policy/lib/constructs/agentcore-policy.ts から生成（scripts/sync_cedar_policies.py。手で編集しない）
+// {{targetName}} / {{gatewayArn}} は Interceptor の読み込み時に置換する
+"""
+
+POLICY_PATTERN = re.compile(r'description:\s*"(?P<description>[^"]*)",.*?cedarStatement:\s*`(?P<statement>[^`]*)`', re.DOTALL)
+VARIABLE_PATTERN = re.compile(r"\$\{(targetName|gatewayArn)\}")
+
+
+def render(source: str) -> str:
+    """agentcore-policy.ts のポリシー定義から policies.cedar の内容を作成する"""
+    policies = list(POLICY_PATTERN.finditer(source))
+    if not policies:
+        raise ValueError(f"{SOURCE}: no cedarStatement found")
+    blocks = []
+    for match in policies:
+        statement = match.group("statement")
+        unknown = set(re.findall(r"\$\{([^}]*)\}", VARIABLE_PATTERN.sub("", statement)))
+        if unknown:
+            raise ValueError(f"{SOURCE}: unsupported variables in cedarStatement: {', '.join(sorted(unknown))}")
+        statement = VARIABLE_PATTERN.sub(lambda m: "{{" + m.group(1) + "}}", statement)
+        blocks.append(f"// {match.group('description')}\n{statement.strip()}\n")
+    return HEADER + "\n" + "\n".join(blocks)
+
+
+def is_up_to_date() -> bool:
+    """policies.cedar が agentcore-policy.ts から生成した内容と一致するか"""
+    expected = render(SOURCE.read_text(encoding="utf-8"))
+    return OUTPUT.exists() and OUTPUT.read_text(encoding="utf-8") == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="policies.cedar を agentcore-policy.ts から生成する")
+    parser.add_argument("--check", action="store_true", help="生成せずに差分を確認する（差分があれば終了コード 1）")
+    args = parser.parse_args()
+
+    expected = render(SOURCE.read_text(encoding="utf-8"))
+    current = OUTPUT.read_text(encoding="utf-8") if OUTPUT.exists() else ""
+    if args.check:
+        if current != expected:
+            sys.stdout.writelines(
+                difflib.unified_diff(
+                    current.splitlines(keepends=True),
+                    expected.splitlines(keepends=True),
+                    fromfile=str(OUTPUT.relative_to(ROOT_DIR)),
+                    tofile="generated",
+                )
+            )
+            print(f"\n{OUTPUT.relative_to(ROOT_DIR)} is out of date. Run: uv run python sync_cedar_policies.py")
+            raise SystemExit(1)
+        print(f"✓ {OUTPUT.relative_to(ROOT_DIR)} is up to date")
+        return
+    OUTPUT.write_text(expected, encoding="utf-8")
+    print(f"生成しました: {OUTPUT.relative_to(ROOT_DIR)}")
+
+
+if __name__ == "__main__":
+    main()
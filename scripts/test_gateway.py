@@ -6,13 +6,13 @@
 
 import json
 import os
-import urllib.parse
 import webbrowser
-from http.server import BaseHTTPRequestHandler, HTTPServer
 
 import requests
 from dotenv import load_dotenv
 
+from gateway_auth import GatewayConfig, TokenCache, decode_token, get_tokens
+
 # Configuration (load from .env)
 load_dotenv(override=True)
 
@@ -22,73 +22,25 @@ COGNITO_DOMAIN = os.getenv("COGNITO_DOMAIN")
 REGION = os.getenv("REGION", "us-east-1")
 MCP_TARGET_NAME = os.getenv("MCP_TARGET_NAME")
 
+# ログインするユーザーのメールアドレス（トークンキャッシュのキー。別のユーザーのトークンを使わないよう必須）
+LOGIN_USER = os.getenv("LOGIN_USER", "")
+
 # OAuth settings
 REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:8080/callback")
-AUTH_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/oauth2/authorize"
-TOKEN_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/oauth2/token"
-LOGOUT_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/logout"
-
-# Global to store auth code
-auth_code = None
-
-
-class CallbackHandler(BaseHTTPRequestHandler):
-    """Handle OAuth callback"""
-
-    def do_GET(self):
-        global auth_code
-        query = urllib.parse.urlparse(self.path).query
-        params = urllib.parse.parse_qs(query)
-
-        if "code" in params:
-            auth_code = params["code"][0]
-            self.send_response(200)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            self.wfile.write(
-                b"<html><body><h1>Login successful!</h1><p>You can close this window.</p></body></html>"
-            )
-        else:
-            self.send_response(400)
-            self.end_headers()
-            self.wfile.write(b"Error: No code received")
-
-    def log_message(self, format, *args):
-        pass  # Suppress logs
-
-
-def get_auth_url() -> str:
-    """Build authorization URL (no custom scopes - server decides)"""
-    params = {
-        "response_type": "code",
-        "client_id": CLIENT_ID,
-        "redirect_uri": REDIRECT_URI,
-        "scope": "openid email",  # 基本スコープのみ、カスタムスコープはPre Token Lambdaが付与
-    }
-    return f"{AUTH_URL}?{urllib.parse.urlencode(params)}"
-
-
-def exchange_code_for_token(code: str) -> str:
-    """Exchange authorization code for access token"""
-    response = requests.post(
-        TOKEN_URL,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data={
-            "grant_type": "authorization_code",
-            "client_id": CLIENT_ID,
-            "code": code,
-            "redirect_uri": REDIRECT_URI,
-        },
-    )
-    response.raise_for_status()
-    token = response.json()["access_token"]
-
-    # Decode and show token claims for debugging
-    import base64
-
-    payload = token.split(".")[1]
-    payload += "=" * (4 - len(payload) % 4)  # padding
-    claims = json.loads(base64.b64decode(payload))
+GATEWAY_CONFIG = GatewayConfig(
+    client_id=CLIENT_ID,
+    gateway_url=GATEWAY_URL,
+    cognito_domain=COGNITO_DOMAIN,
+    target_name=MCP_TARGET_NAME,
+    region=REGION,
+    redirect_uri=REDIRECT_URI,
+)
+LOGOUT_URL = GATEWAY_CONFIG.logout_url
+
+
+def print_token_claims(token: str):
+    """Decode and show token claims for debugging"""
+    claims = decode_token(token)
     print("\n=== Token Claims ===")
     print(f"sub: {claims.get('sub')}")
     print(f"scope: {claims.get('scope')}")
@@ -98,32 +50,12 @@ def exchange_code_for_token(code: str) -> str:
     print(json.dumps(claims, indent=2, ensure_ascii=False))
     print("====================\n")
 
-    return token
 
-
-def login_with_browser() -> str:
-    """Open browser for login and get access token"""
-    global auth_code
-    auth_code = None
-
-    # Start local server
-    server = HTTPServer(("localhost", 8080), CallbackHandler)
-
-    # Open browser
-    auth_url = get_auth_url()
-    print("Opening browser for login...")
-    print(f"URL: {auth_url}")
-    webbrowser.open(auth_url)
-
-    # Wait for callback (handle multiple requests until we get the code)
-    print("Waiting for login callback...")
-    while auth_code is None:
-        server.handle_request()
-    server.server_close()
-
-    # Exchange code for token
-    print("Exchanging code for token...")
-    return exchange_code_for_token(auth_code)
+def get_access_token(user: str = LOGIN_USER) -> str:
+    """Get access token (cached token → refresh token → browser login)"""
+    token = get_tokens(GATEWAY_CONFIG, user)["access_token"]
+    print_token_claims(token)
+    return token
 
 
 def call_gateway(token: str, method: str, params: dict = None) -> dict:
@@ -152,7 +84,7 @@ def test_gateway(test_name: str):
     print(f"{'=' * 60}")
 
     try:
-        token = login_with_browser()
+        token = get_access_token()
         print("✓ Token obtained")
 
         # Test 1: List tools
@@ -227,7 +159,8 @@ def test_gateway(test_name: str):
 
 
 def logout():
-    """Open browser to logout from Cognito"""
+    """Open browser to logout from Cognito (and clear cached tokens)"""
+    TokenCache().delete(GATEWAY_CONFIG)
     logout_url = f"{LOGOUT_URL}?client_id={CLIENT_ID}&logout_uri={REDIRECT_URI}"
     print(f"Opening logout URL: {logout_url}")
     webbrowser.open(logout_url)
@@ -240,6 +173,9 @@ if __name__ == "__main__":
         logout()
         sys.exit(0)
 
+    if not LOGIN_USER:
+        sys.exit("Set LOGIN_USER to the email of the user to log in as (e.g. LOGIN_USER=admin@example.com)")
+
     # Test: Login as admin or user to see different behavior
     # Scopes are determined server-side by Pre Token Lambda based on user email
     # admin (admin@example.com): all tools work (retrieve_doc, get_query_log, sync_data_source, delete_data_source)
@@ -6,19 +6,48 @@
 レイテンシー計測機能:
 - list_tools の処理時間を50回計測
 - 平均実行時間 (ms) と標準偏差を出力
+
+ロード計測機能 (load サブコマンド):
+- 並行数・目標 RPS（open-loop）・計測時間・ウォームアップを指定して非同期に負荷をかける
+- p50/p90/p99/p99.9、ヒストグラム、エラー内訳を JSON で出力
+
+計測結果は benchmark_results/ に履歴として保存され、benchmark_history.py で
+ベースライン比較（性能劣化の検出）と推移の確認ができる。
+
+soak 計測機能 (soak サブコマンド):
+- 数時間単位で負荷をかけ続け、ウィンドウ毎のレイテンシー推移（ドリフト）とエラー率を記録
+- アクセストークンはバックグラウンドでリフレッシュするため、再ログイン不要
+
+フェーズ別計測機能 (phases サブコマンド):
+- リクエスト毎に DNS・TCP 接続・TLS ハンドシェイク・TTFB・ボディ受信の時間を記録
+- 毎回新しい接続（cold）と keep-alive（接続の再利用）を交互に計測し、横並びで比較
 """
 
+import argparse
+import asyncio
 import json
 import os
 import statistics
 import time
 import urllib.parse
 import webbrowser
-from http.server import BaseHTTPRequestHandler, HTTPServer
 
 import requests
 from dotenv import load_dotenv
 
+from benchmark_history import save_run
+from gateway_auth import GatewayConfig, TokenCache, TokenManager, decode_token, get_tokens
+from http_timing import PhaseTiming, TimedConnection, format_comparison, summarize_phases
+from loadgen import (
+    LoadConfig,
+    RequestResult,
+    build_report,
+    classify_response,
+    format_report,
+    run_load,
+    run_soak,
+)
+
 # レイテンシー計測設定
 NUM_TRIALS = 50
 
@@ -31,73 +60,25 @@ COGNITO_DOMAIN = os.getenv("COGNITO_DOMAIN")
 REGION = os.getenv("REGION", "us-east-1")
 MCP_TARGET_NAME = os.getenv("MCP_TARGET_NAME")
 
+# ログインするユーザーのメールアドレス（トークンキャッシュのキー。別のユーザーのトークンを使わないよう必須）
+LOGIN_USER = os.getenv("LOGIN_USER", "")
+
 # OAuth settings
 REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:8080/callback")
-AUTH_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/oauth2/authorize"
-TOKEN_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/oauth2/token"
-LOGOUT_URL = f"https://{COGNITO_DOMAIN}.auth.{REGION}.amazoncognito.com/logout"
-
-# Global to store auth code
-auth_code = None
-
-
-class CallbackHandler(BaseHTTPRequestHandler):
-    """Handle OAuth callback"""
-
-    def do_GET(self):
-        global auth_code
-        query = urllib.parse.urlparse(self.path).query
-        params = urllib.parse.parse_qs(query)
-
-        if "code" in params:
-            auth_code = params["code"][0]
-            self.send_response(200)
-            self.send_header("Content-type", "text/html")
-            self.end_headers()
-            self.wfile.write(
-                b"<html><body><h1>Login successful!</h1><p>You can close this window.</p></body></html>"
-            )
-        else:
-            self.send_response(400)
-            self.end_headers()
-            self.wfile.write(b"Error: No code received")
-
-    def log_message(self, format, *args):
-        pass  # Suppress logs
-
-
-def get_auth_url() -> str:
-    """Build authorization URL (no custom scopes - server decides)"""
-    params = {
-        "response_type": "code",
-        "client_id": CLIENT_ID,
-        "redirect_uri": REDIRECT_URI,
-        "scope": "openid email",  # 基本スコープのみ、カスタムスコープはPre Token Lambdaが付与
-    }
-    return f"{AUTH_URL}?{urllib.parse.urlencode(params)}"
-
-
-def exchange_code_for_token(code: str) -> str:
-    """Exchange authorization code for access token"""
-    response = requests.post(
-        TOKEN_URL,
-        headers={"Content-Type": "application/x-www-form-urlencoded"},
-        data={
-            "grant_type": "authorization_code",
-            "client_id": CLIENT_ID,
-            "code": code,
-            "redirect_uri": REDIRECT_URI,
-        },
-    )
-    response.raise_for_status()
-    token = response.json()["access_token"]
-
-    # Decode and show token claims for debugging
-    import base64
-
-    payload = token.split(".")[1]
-    payload += "=" * (4 - len(payload) % 4)  # padding
-    claims = json.loads(base64.b64decode(payload))
+GATEWAY_CONFIG = GatewayConfig(
+    client_id=CLIENT_ID,
+    gateway_url=GATEWAY_URL,
+    cognito_domain=COGNITO_DOMAIN,
+    target_name=MCP_TARGET_NAME,
+    region=REGION,
+    redirect_uri=REDIRECT_URI,
+)
+LOGOUT_URL = GATEWAY_CONFIG.logout_url
+
+
+def print_token_claims(token: str):
+    """Decode and show token claims for debugging"""
+    claims = decode_token(token)
     print("\n=== Token Claims ===")
     print(f"sub: {claims.get('sub')}")
     print(f"scope: {claims.get('scope')}")
@@ -107,32 +88,12 @@ def exchange_code_for_token(code: str) -> str:
     print(json.dumps(claims, indent=2, ensure_ascii=False))
     print("====================\n")
 
-    return token
-
 
-def login_with_browser() -> str:
-    """Open browser for login and get access token"""
-    global auth_code
-    auth_code = None
-
-    # Start local server
-    server = HTTPServer(("localhost", 8080), CallbackHandler)
-
-    # Open browser
-    auth_url = get_auth_url()
-    print("Opening browser for login...")
-    print(f"URL: {auth_url}")
-    webbrowser.open(auth_url)
-
-    # Wait for callback (handle multiple requests until we get the code)
-    print("Waiting for login callback...")
-    while auth_code is None:
-        server.handle_request()
-    server.server_close()
-
-    # Exchange code for token
-    print("Exchanging code for token...")
-    return exchange_code_for_token(auth_code)
+def get_access_token(user: str = LOGIN_USER) -> str:
+    """Get access token (cached token → refresh token → browser login)"""
+    token = get_tokens(GATEWAY_CONFIG, user)["access_token"]
+    print_token_claims(token)
+    return token
 
 
 def call_gateway(token: str, method: str, params: dict = None) -> dict:
@@ -153,6 +114,107 @@ def call_gateway(token: str, method: str, params: dict = None) -> dict:
     return response.json()
 
 
+def call_gateway_timed(
+    connection: TimedConnection, token: str, method: str, params: dict = None
+) -> tuple[dict, PhaseTiming]:
+    """call_gateway と同じリクエストを送信し、フェーズ毎の時間も返す"""
+    body, timing = connection.request(
+        "POST",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        },
+        body=json.dumps(
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": method,
+                "params": params or {},
+            }
+        ).encode(),
+    )
+    return json.loads(body), timing
+
+
+def measure_phases(token: str, num_trials: int = NUM_TRIALS, method: str = "tools/list") -> dict[str, list[PhaseTiming]]:
+    """
+    cold（毎回新しい接続）と keep-alive（接続を再利用）のフェーズ毎の時間を計測する
+
+    時間帯による Gateway 側の変動が片方に偏らないよう、cold と keep-alive を交互に送信する。
+    keep-alive の 1 回目は接続の確立を含むため、集計から除外する。
+
+    Returns:
+        {"cold": [PhaseTiming, ...], "keep-alive": [PhaseTiming, ...]}
+    """
+    timings: dict[str, list[PhaseTiming]] = {"cold": [], "keep-alive": []}
+
+    print(f"\n=== {method} フェーズ別計測 (cold / keep-alive 各 {num_trials} 回) ===")
+
+    with TimedConnection(GATEWAY_URL, keep_alive=False) as cold, TimedConnection(GATEWAY_URL) as warm:
+        call_gateway_timed(warm, token, method)
+        for i in range(num_trials):
+            for name, connection in (("cold", cold), ("keep-alive", warm)):
+                _, timing = call_gateway_timed(connection, token, method)
+                timings[name].append(timing)
+
+            if (i + 1) % 10 == 0:
+                print(f"  進捗: {i + 1}/{num_trials} 完了")
+
+    return timings
+
+
+def phases_test(num_trials: int, method: str, output: str = None, save_history: bool = True):
+    """ログイン後にフェーズ別計測を実行し、cold と keep-alive の比較を表示・保存する"""
+    try:
+        token = get_access_token()
+        print("✓ Token obtained")
+
+        timings = measure_phases(token, num_trials, method)
+        summaries = {name: summarize_phases(values) for name, values in timings.items()}
+        addresses = sorted({t.address for values in timings.values() for t in values})
+
+        print("\n" + "=" * 76)
+        print(f"=== {method} フェーズ別レイテンシー (cold / keep-alive) ===")
+        print("=" * 76)
+        print(f"接続先: {urllib.parse.urlparse(GATEWAY_URL).hostname} ({', '.join(addresses)}), リージョン: {REGION}")
+        print(format_comparison(summaries))
+        saved = summaries["cold"]["total"]["mean"] - summaries["keep-alive"]["total"]["mean"]
+        print(f"接続の再利用による短縮: {saved:.1f} ms/リクエスト（平均）")
+        server = summaries["keep-alive"].get("server")
+        if server:
+            # ttfb のうち Interceptor が処理した時間（Gateway が Server-Timing を返す場合のみ）
+            print("Server-Timing (keep-alive, mean ms): " + ", ".join(f"{k} {v:.2f}" for k, v in server.items()))
+        print("=" * 76)
+
+        if save_history:
+            for name, values in timings.items():
+                path = save_run(
+                    f"phases_{name}:{method}",
+                    [t.total for t in values],
+                    {"num_trials": num_trials, "connection": name, "phases_ms": summaries[name]},
+                    history_environment(),
+                )
+                print(f"履歴を保存しました: {path}")
+
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "method": method,
+                        "addresses": addresses,
+                        "summary": summaries,
+                        "requests": {name: [t.to_dict() for t in values] for name, values in timings.items()},
+                    },
+                    f,
+                    indent=2,
+                    ensure_ascii=False,
+                )
+            print(f"結果を保存しました: {output}")
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+
+
 def measure_list_tools_latency(token: str, num_trials: int = NUM_TRIALS) -> dict:
     """
     list_tools のレイテンシーを計測する
@@ -196,7 +258,146 @@ def measure_list_tools_latency(token: str, num_trials: int = NUM_TRIALS) -> dict
     }
 
 
-def test_gateway(test_name: str):
+def make_gateway_sender(get_token, method: str, params: dict = None):
+    """ロード計測用に、Gateway へ MCP リクエストを送信する非同期関数を作成する
+
+    get_token はリクエスト毎に呼び出すため、長時間実行中に更新されたトークンも使用される。
+    """
+
+    async def send(client, seq: int) -> RequestResult:
+        response = await client.post(
+            GATEWAY_URL,
+            headers={
+                "Authorization": f"Bearer {get_token()}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "jsonrpc": "2.0",
+                "id": seq,
+                "method": method,
+                "params": params or {},
+            },
+        )
+        return RequestResult(label=method, error=classify_response(response))
+
+    return send
+
+
+def measure_load(token: str, config: LoadConfig, method: str = "tools/list") -> tuple[dict, list[float]]:
+    """
+    並行リクエストでスループットとテールレイテンシーを計測する
+
+    Args:
+        token: アクセストークン
+        config: ロード設定（並行数、目標 RPS、計測時間、ウォームアップ）
+        method: 呼び出す MCP メソッド
+
+    Returns:
+        計測結果のレポート（パーセンタイル、ヒストグラム、エラー内訳）と、成功したリクエストのレイテンシー
+    """
+    mode = f"open-loop {config.rps} req/s" if config.rps else "closed-loop"
+    print(f"\n=== {method} ロード計測 ({mode}, 並行数 {config.concurrency}) ===")
+    print(f"  ウォームアップ {config.warmup_s} 秒 + 計測 {config.duration_s} 秒")
+
+    run = asyncio.run(run_load(make_gateway_sender(lambda: token, method), config))
+    return build_report(run, config), [s.latency_ms for s in run.samples if s.error is None]
+
+
+def history_environment() -> dict:
+    """履歴に保存する計測対象の情報"""
+    return {"gateway_url": GATEWAY_URL, "region": REGION, "target_name": MCP_TARGET_NAME}
+
+
+def load_test(config: LoadConfig, method: str, output: str = None, save_history: bool = True):
+    """ログイン後にロード計測を実行し、結果を表示・保存する"""
+    try:
+        token = get_access_token()
+        print("✓ Token obtained")
+
+        report, latencies_ms = measure_load(token, config, method)
+        print("\n" + format_report(report))
+
+        if save_history:
+            path = save_run(
+                f"load:{method}",
+                latencies_ms,
+                {**report["config"], "mode": report["mode"]},
+                history_environment(),
+            )
+            print(f"履歴を保存しました: {path}")
+
+        if output:
+            with open(output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"結果を保存しました: {output}")
+        else:
+            print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+
+
+def summarize_window(index: int, report: dict, baseline_p50: float | None) -> dict:
+    """soak 計測のウィンドウ毎の集計値を作成する"""
+    latency = report["latency_ms"]
+    p50 = latency.get("p50")
+    return {
+        "window": index,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "requests": report["requests"],
+        "errors": report["errors"],
+        "error_rate": report["errors"] / report["requests"] if report["requests"] else 0.0,
+        "throughput_rps": report["throughput_rps"],
+        "latency_ms": {k: v for k, v in latency.items() if k != "count"},
+        "p50_drift_pct": (p50 / baseline_p50 - 1) * 100 if p50 and baseline_p50 else 0.0,
+        "errors_by_kind": report["errors_by_kind"],
+    }
+
+
+def soak_test(config: LoadConfig, window_s: float, method: str, output: str = None):
+    """長時間のロードを実行し、ウィンドウ毎のレイテンシー推移とエラー率を記録する
+
+    Args:
+        config: ロード設定（duration_s は soak 全体の計測時間）
+        window_s: 集計ウィンドウの長さ（秒）
+        method: 呼び出す MCP メソッド
+        output: ウィンドウ毎の集計値を追記する JSONL ファイル
+    """
+    try:
+        with TokenManager(GATEWAY_CONFIG, LOGIN_USER) as tokens:
+            print("✓ Token obtained (background refresh enabled)")
+            mode = f"open-loop {config.rps} req/s" if config.rps else "closed-loop"
+            print(f"\n=== {method} soak 計測 ({mode}, 並行数 {config.concurrency}) ===")
+            print(f"  計測 {config.duration_s / 3600:.2f} 時間、{window_s:.0f} 秒毎に集計")
+
+            baseline_p50 = None
+
+            def on_window(index, run):
+                nonlocal baseline_p50
+                row = summarize_window(index, build_report(run, config), baseline_p50)
+                row["token_refreshes"] = tokens.refresh_count
+                if baseline_p50 is None:
+                    baseline_p50 = row["latency_ms"].get("p50")
+
+                latency = row["latency_ms"]
+                p50, p99 = latency.get("p50", 0.0), latency.get("p99", 0.0)
+                print(
+                    f"  [{row['timestamp']}] #{index}: {row['requests']} req, "
+                    f"{row['throughput_rps']:.2f} req/s, p50 {p50:.2f} ms ({row['p50_drift_pct']:+.1f}%), "
+                    f"p99 {p99:.2f} ms, エラー率 {row['error_rate'] * 100:.2f}%"
+                )
+                if output:
+                    with open(output, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+            send = make_gateway_sender(lambda: tokens.access_token, method)
+            asyncio.run(run_soak(send, config, window_s, on_window))
+
+    except Exception as e:
+        print(f"✗ Error: {e}")
+
+
+def test_gateway(test_name: str, save_history: bool = True):
     """Test Gateway access with 3LO authentication"""
     print(f"\n{'=' * 60}")
     print(f"Testing: {test_name}")
@@ -204,7 +405,7 @@ def test_gateway(test_name: str):
     print(f"{'=' * 60}")
 
     try:
-        token = login_with_browser()
+        token = get_access_token()
         print("✓ Token obtained")
 
         # Test 1: List tools（初回確認）
@@ -227,26 +428,118 @@ def test_gateway(test_name: str):
         print(f"最大値:       {latency_result['max_ms']:.2f} ms")
         print("=" * 60)
 
+        if save_history:
+            path = save_run(
+                "list_tools_sequential",
+                latency_result["latencies_ms"],
+                {"num_trials": latency_result["num_trials"]},
+                history_environment(),
+            )
+            print(f"履歴を保存しました: {path}")
+
     except Exception as e:
         print(f"✗ Error: {e}")
 
 
 def logout():
-    """Open browser to logout from Cognito"""
+    """Open browser to logout from Cognito (and clear cached tokens)"""
+    TokenCache().delete(GATEWAY_CONFIG)
     logout_url = f"{LOGOUT_URL}?client_id={CLIENT_ID}&logout_uri={REDIRECT_URI}"
     print(f"Opening logout URL: {logout_url}")
     webbrowser.open(logout_url)
 
 
+def parse_duration(value: str) -> float:
+    """"90s" / "30m" / "4h" 形式（単位省略時は秒）の時間を秒に変換する"""
+    units = {"s": 1, "m": 60, "h": 3600}
+    try:
+        if value[-1] in units:
+            return float(value[:-1]) * units[value[-1]]
+        return float(value)
+    except (ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"invalid duration: {value}") from None
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="AgentCore Gateway レイテンシー計測")
+    parser.add_argument("--no-history", action="store_true", help="計測結果を履歴に保存しない")
+    subparsers = parser.add_subparsers(dest="command")
+
+    subparsers.add_parser("logout", help="Cognito からログアウト")
+
+    load = subparsers.add_parser("load", help="並行リクエストによるロード計測")
+    load.add_argument("--method", default="tools/list", help="呼び出す MCP メソッド")
+    load.add_argument("--concurrency", type=int, default=10, help="最大並行数")
+    load.add_argument("--rps", type=float, default=None, help="目標 RPS（指定時は open-loop）")
+    load.add_argument("--duration", type=float, default=30.0, help="計測時間（秒）")
+    load.add_argument("--warmup", type=float, default=5.0, help="ウォームアップ時間（秒）")
+    load.add_argument("--timeout", type=float, default=30.0, help="リクエストタイムアウト（秒）")
+    load.add_argument("--output", help="結果 JSON の保存先（省略時は標準出力）")
+
+    soak = subparsers.add_parser("soak", help="長時間のロード計測（レイテンシー推移・エラー率）")
+    soak.add_argument("--method", default="tools/list", help="呼び出す MCP メソッド")
+    soak.add_argument("--concurrency", type=int, default=5, help="最大並行数")
+    soak.add_argument("--rps", type=float, default=None, help="目標 RPS（指定時は open-loop）")
+    soak.add_argument("--duration", type=parse_duration, default="1h", help="計測時間（例: 90s, 30m, 4h）")
+    soak.add_argument("--window", type=parse_duration, default="5m", help="集計ウィンドウ（例: 1m, 5m）")
+    soak.add_argument("--warmup", type=parse_duration, default="30s", help="ウォームアップ時間")
+    soak.add_argument("--timeout", type=float, default=30.0, help="リクエストタイムアウト（秒）")
+    soak.add_argument("--output", help="ウィンドウ毎の集計値を追記する JSONL ファイル")
+
+    phases = subparsers.add_parser("phases", help="DNS・接続・TLS・TTFB・受信のフェーズ別計測（cold / keep-alive）")
+    phases.add_argument("--method", default="tools/list", help="呼び出す MCP メソッド")
+    phases.add_argument("--trials", type=int, default=NUM_TRIALS, help="接続方式毎の試行回数")
+    phases.add_argument("--output", help="リクエスト毎のフェーズの時間を含む結果 JSON の保存先")
+
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    import sys
+    args = parse_args()
 
-    if len(sys.argv) > 1 and sys.argv[1] == "logout":
+    if args.command == "logout":
         logout()
-        sys.exit(0)
+        raise SystemExit(0)
+
+    if not LOGIN_USER:
+        raise SystemExit("Set LOGIN_USER to the email of the user to log in as (e.g. LOGIN_USER=admin@example.com)")
+
+    if args.command == "load":
+        load_test(
+            LoadConfig(
+                concurrency=args.concurrency,
+                rps=args.rps,
+                duration_s=args.duration,
+                warmup_s=args.warmup,
+                timeout_s=args.timeout,
+            ),
+            method=args.method,
+            output=args.output,
+            save_history=not args.no_history,
+        )
+        raise SystemExit(0)
+
+    if args.command == "soak":
+        soak_test(
+            LoadConfig(
+                concurrency=args.concurrency,
+                rps=args.rps,
+                duration_s=args.duration,
+                warmup_s=args.warmup,
+                timeout_s=args.timeout,
+            ),
+            window_s=args.window,
+            method=args.method,
+            output=args.output,
+        )
+        raise SystemExit(0)
+
+    if args.command == "phases":
+        phases_test(args.trials, args.method, output=args.output, save_history=not args.no_history)
+        raise SystemExit(0)
 
     # Test: Login as admin or user to see different behavior
     # Scopes are determined server-side by Pre Token Lambda based on user email
     # admin (admin@example.com): all tools work (retrieve_doc, get_query_log, sync_data_source, delete_data_source)
     # user (user@example.com): only retrieve_doc works
-    test_gateway("RAG Operations Test (admin, user)")
+    test_gateway("RAG Operations Test (admin, user)", save_history=not args.no_history)